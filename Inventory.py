@@ -1,5 +1,6 @@
+import os
 import sys
-import sqlite3
+import logging
 from PyQt5 import QtCore
 from PyQt5.QtWidgets import (
     QApplication,
@@ -24,29 +25,40 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QRegExp, QAbstractTableModel, QModelIndex, QVariant
 from PyQt5.QtGui import QFont, QIcon, QColor, QRegExpValidator, QValidator
 
+# Shared helpers live next to the main store apps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Store main code"))
+import conflicts
+import profiling
+import watchdog
+from background import LoadTimer, RowLoader
+from store_core import ConflictError, StoreError, catalog, storage
+from store_core.db import create_schema
+
 DATABASE_PATH = "store.db"
 
 class InventoryApp(QWidget):
+    # Slots timed by the UI stall watchdog (watchdog.py)
+    TIMED_SLOTS = (
+        "_add_item",
+        "_delete_item",
+        "_edit_item",
+        "_search_items",
+        "_open_add_many_dialog",
+        "_update_item",
+        "_on_items_chunk",
+    )
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Clothing Store Inventory Management")
         self.setWindowIcon(QIcon("store.png"))  # Replace "store.png" with your icon file
+        self.load_timer = LoadTimer("Inventory")
+        self._loader = None
         self._create_database()
         self._init_ui()
 
     def _create_database(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                price REAL NOT NULL,
-                quantity INTEGER NOT NULL
-            )
-        """)
-        conn.commit()
-        conn.close()
+        create_schema(DATABASE_PATH)
 
     def _init_ui(self):
         # Fonts
@@ -93,6 +105,7 @@ class InventoryApp(QWidget):
         self.item_table.setFont(font_table)
         self.item_table.setAlternatingRowColors(True)  # Alternate row colors
         self.item_table.setSelectionBehavior(QAbstractItemView.SelectRows)  # Select whole rows
+        self.item_table.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Shift/Ctrl-click to delete many at once
         self.item_table.cellChanged.connect(self._update_item)
 
         # Layouts
@@ -141,76 +154,114 @@ class InventoryApp(QWidget):
         self._load_items()
 
     def _load_items(self):
+        """Reloads the table, streaming rows in from a worker thread."""
+        self._cancel_load()
         self.item_table.setRowCount(0)
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM items ORDER BY id")
-        items = cursor.fetchall()
-        conn.close()
-
-        if items:
-            for row_number, item in enumerate(items):
-                self.item_table.insertRow(row_number)
-                for column_number, data in enumerate(item):
-                    self.item_table.setItem(
-                        row_number, column_number, QTableWidgetItem(str(data))
-                    )
-        else:
-            self.item_table.setRowCount(1)
-            self.item_table.setItem(
-                0, 0, QTableWidgetItem("No items found. Start adding items!")
-            )
-            self.item_table.item(0, 0).setTextAlignment(Qt.AlignCenter)
-
-    def _add_item(self):
-        name = self.name_entry.text()
-        price = self.price_entry.text()
-        quantity = self.quantity_entry.text()
-
-        if not all([name, price, quantity]):
-            QMessageBox.warning(self, "Error", "Please fill all fields.")
+        self._loader = RowLoader(DATABASE_PATH, "SELECT * FROM items ORDER BY id", parent=self)
+        self._loader.chunk.connect(self._on_items_chunk)
+        self._loader.done.connect(self._on_items_loaded)
+        self._loader.error.connect(self._on_items_failed)
+        self._loader.start()
+
+    def _cancel_load(self):
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+    def _on_items_chunk(self, items):
+        if self.sender() is not self._loader:
+            return  # Chunk from a load that has been superseded
+        self._append_rows(items)
+        self.load_timer.mark_first_paint()
+
+    def _on_items_loaded(self, count):
+        if self.sender() is not self._loader:
             return
+        self._loader = None
+        if not count:
+            self._show_empty_message()
+        self.load_timer.mark_interactive(count)
 
-        try:
-            price = float(price)
-            if price <= 0:
-                raise ValueError
-            quantity = int(quantity)
-            if quantity <= 0:
-                raise ValueError
-        except ValueError:
-            QMessageBox.warning(
-                self, "Error", "Invalid price or quantity format. Must be positive."
-            )
+    def _on_items_failed(self, message):
+        if self.sender() is not self._loader:
             return
+        self._loader = None
+        QMessageBox.warning(self, "Error", f"Could not load the items: {message}")
+
+    def _show_empty_message(self):
+        self.item_table.blockSignals(True)
+        self.item_table.setRowCount(1)
+        self.item_table.setItem(
+            0, 0, QTableWidgetItem("No items found. Start adding items!")
+        )
+        self.item_table.item(0, 0).setTextAlignment(Qt.AlignCenter)
+        self.item_table.blockSignals(False)
+
+    def _append_rows(self, items):
+        # cellChanged is meant for user edits; filling the table must not
+        # write every cell straight back to the database.
+        self.item_table.blockSignals(True)
+        first_row = self.item_table.rowCount()
+        self.item_table.setRowCount(first_row + len(items))
+        for row_number, item in enumerate(items, first_row):
+            for column_number, data in enumerate(item[:4]):
+                self.item_table.setItem(
+                    row_number, column_number, QTableWidgetItem(str(data))
+                )
+            # The version the row was loaded at, for conflict checks on save
+            self.item_table.item(row_number, 0).setData(Qt.UserRole, item[4])
+        self.item_table.blockSignals(False)
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+    def _add_item(self):
         try:
-            cursor.execute(
-                "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
-                (name, price, quantity),
+            catalog.add_item(
+                DATABASE_PATH,
+                self.name_entry.text(),
+                self.price_entry.text(),
+                self.quantity_entry.text(),
             )
-            conn.commit()
-            self._clear_input_fields()
-            self._load_items()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Error", "An item with that name already exists.")
-        conn.close()
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
+        self._clear_input_fields()
+        self._load_items()
 
     def _delete_item(self):
-        selected_row = self.item_table.currentRow()
-        if selected_row >= 0:
-            item_id = self.item_table.item(selected_row, 0).text()
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-            conn.commit()
-            conn.close()
-            self.item_table.removeRow(selected_row)
-            self._renumber_ids()
-        else:
+        """Deletes every selected item and removes their rows in place."""
+        rows = sorted(
+            index.row()
+            for index in self.item_table.selectionModel().selectedRows()
+            # The "No items found" row has no item behind it
+            if self.item_table.item(index.row(), 0).data(Qt.UserRole) is not None
+        )
+        if not rows:
             QMessageBox.warning(self, "Error", "Please select an item to delete.")
+            return
+        if len(rows) > 1:
+            answer = QMessageBox.question(self, "Delete Items", f"Delete {len(rows)} items?")
+            if answer != QMessageBox.Yes:
+                return
+        try:
+            catalog.delete_items(DATABASE_PATH, [self.item_table.item(row, 0).text() for row in rows])
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
+        self._remove_rows(rows)
+
+    def _remove_rows(self, rows):
+        """Removes sorted ``rows``, one call per run of adjacent rows."""
+        runs = []
+        for row in rows:
+            if runs and runs[-1][0] + runs[-1][1] == row:
+                runs[-1][1] += 1
+            else:
+                runs.append([row, 1])
+        self.item_table.blockSignals(True)
+        for first_row, count in reversed(runs):
+            self.item_table.model().removeRows(first_row, count)
+        self.item_table.blockSignals(False)
+        if not self.item_table.rowCount():
+            self._show_empty_message()
 
     def _edit_item(self):
         selected_row = self.item_table.currentRow()
@@ -219,8 +270,9 @@ class InventoryApp(QWidget):
             name = self.item_table.item(selected_row, 1).text()
             price = self.item_table.item(selected_row, 2).text()
             quantity = self.item_table.item(selected_row, 3).text()
+            version = self.item_table.item(selected_row, 0).data(Qt.UserRole)
 
-            dialog = EditItemDialog(self, item_id, name, price, quantity)
+            dialog = EditItemDialog(self, item_id, name, price, quantity, version)
             if dialog.exec_() == QDialog.Accepted:
                 self._load_items()
         else:
@@ -232,22 +284,11 @@ class InventoryApp(QWidget):
             self._load_items()
             return
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM items WHERE name LIKE ? OR id = ?",
-            (f"%{search_term}%", search_term),
-        )
-        items = cursor.fetchall()
-        conn.close()
+        items = catalog.search_items(DATABASE_PATH, search_term)
 
+        self._cancel_load()
         self.item_table.setRowCount(0)
-        for row_number, item in enumerate(items):
-            self.item_table.insertRow(row_number)
-            for column_number, data in enumerate(item):
-                self.item_table.setItem(
-                    row_number, column_number, QTableWidgetItem(str(data))
-                )
+        self._append_rows(items)
 
     def _clear_input_fields(self):
         self.name_entry.clear()
@@ -265,69 +306,26 @@ class InventoryApp(QWidget):
 
         item_id = self.item_table.item(row, 0).text()
         new_value = self.item_table.item(row, column).text()
+        column_name = ("id", "name", "price", "quantity")[column]
+        version = self.item_table.item(row, 0).data(Qt.UserRole)
 
-        try:
-            if column == 2:  # Price
-                new_value = float(new_value)
-            elif column == 3:  # Quantity
-                new_value = int(new_value)
-        except ValueError:
-            QMessageBox.warning(self, "Error", "Invalid data format.")
-            return
-
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        if column == 1:  # Name
+        while True:
             try:
-                cursor.execute(
-                    "UPDATE items SET name = ? WHERE id = ?", (new_value, item_id)
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                QMessageBox.warning(
-                    self, "Error", "An item with that name already exists."
-                )
-                conn.rollback()
-                self._load_items()  # Reload to revert changes
-        elif column == 2:  # Price
-            cursor.execute(
-                "UPDATE items SET price = ? WHERE id = ?", (new_value, item_id)
-            )
-            conn.commit()
-        elif column == 3:  # Quantity
-            cursor.execute(
-                "UPDATE items SET quantity = ? WHERE id = ?", (new_value, item_id)
-            )
-            conn.commit()
-
-        conn.close()
-
-    def _renumber_ids(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM items ORDER BY id")
-        ids = cursor.fetchall()
-
-        if ids:
-            for i, (id,) in enumerate(ids):
-                if i + 1 != id:
-                    cursor.execute("UPDATE items SET id = ? WHERE id = ?", (i + 1, id))
-            conn.commit()
-            self._load_items()
-            self._reset_autoincrement()
-
-        conn.close()
-
-    def _reset_autoincrement(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(id) FROM items")
-        max_id = cursor.fetchone()[0]
-        if max_id is not None:
-            cursor.execute("UPDATE sqlite_sequence SET seq = ?", (max_id,))
-        conn.commit()
-        conn.close()
+                version = catalog.update_field(DATABASE_PATH, item_id, column_name, new_value, version)
+                break
+            except ConflictError as exc:
+                if not conflicts.ask_to_overwrite(self, exc, {column_name: new_value}):
+                    self._load_items()  # Show what is stored now
+                    return
+                version = exc.current[4]
+            except StoreError as exc:
+                QMessageBox.warning(self, "Error", str(exc))
+                if column == 1:
+                    self._load_items()  # Reload to revert changes
+                return
+        self.item_table.blockSignals(True)
+        self.item_table.item(row, 0).setData(Qt.UserRole, version)
+        self.item_table.blockSignals(False)
 
 class AddManyItemsDialog(QDialog):
     def __init__(self, parent=None):
@@ -375,8 +373,7 @@ class AddManyItemsDialog(QDialog):
         self.grid_layout.addWidget(quantity_entry, row_count, 5)
 
     def _save_items(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        items = []
         existing_names = set()
 
         for row in range(self.grid_layout.rowCount()):
@@ -388,61 +385,44 @@ class AddManyItemsDialog(QDialog):
             price = price_entry.text()
             quantity = quantity_entry.text()
 
-            if all([name, price, quantity]):
-                try:
-                    price = float(price)
-                    if price <= 0:
-                        raise ValueError
-                    quantity = int(quantity)
-                    if quantity <= 0:
-                        raise ValueError
-                    if name in existing_names:
-                        QMessageBox.warning(
-                            self,
-                            "Error",
-                            f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
-                        )
-                        continue  # Skip this row if name already exists
-                    else:
-                        existing_names.add(name)
-                        cursor.execute(
-                            "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
-                            (name, price, quantity),
-                        )
-                except ValueError:
-                    QMessageBox.warning(
-                        self,
-                        "Error",
-                        f"Invalid data for row {row + 1}. Skipping.",
-                    )
-                    conn.rollback()
-                    return
-                except sqlite3.IntegrityError:
-                    QMessageBox.warning(
-                        self,
-                        "Error",
-                        f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
-                    )
-                    conn.rollback()
-                    return
-            else:
+            if not all([name, price, quantity]):
                 QMessageBox.warning(
                     self, "Error", f"Incomplete data for row {row + 1}. Skipping."
                 )
-                conn.rollback()
                 return
+            if name in existing_names:
+                QMessageBox.warning(
+                    self,
+                    "Error",
+                    f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
+                )
+                continue  # Skip this row if name already exists
+            try:
+                items.append(catalog.validate_item(name, price, quantity))
+            except StoreError:
+                QMessageBox.warning(
+                    self,
+                    "Error",
+                    f"Invalid data for row {row + 1}. Skipping.",
+                )
+                return
+            existing_names.add(name)
 
-        conn.commit()
-        conn.close()
+        try:
+            catalog.add_items(DATABASE_PATH, items)
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
         self.accept()
 
 class EditItemDialog(QDialog):
-    def __init__(self, parent=None, item_id=None, name=None, price=None, quantity=None):
+    def __init__(self, parent=None, item_id=None, name=None, price=None, quantity=None, version=None):
         super().__init__(parent)
         self.setWindowTitle("Edit Item")
         self.setWindowIcon(QIcon("store.png"))
 
         self.item_id = item_id
+        self.version = version
         self.layout = QFormLayout()
 
         self.name_entry = QLineEdit(name)
@@ -463,41 +443,40 @@ class EditItemDialog(QDialog):
         self.setLayout(self.layout)
 
     def _save_changes(self):
-        name = self.name_entry.text()
-        price = self.price_entry.text()
-        quantity = self.quantity_entry.text()
-
-        if not all([name, price, quantity]):
-            QMessageBox.warning(self, "Error", "Please fill all fields.")
-            return
-
-        try:
-            price = float(price)
-            if price <= 0:
-                raise ValueError
-            quantity = int(quantity)
-            if quantity <= 0:
-                raise ValueError
-        except ValueError:
-            QMessageBox.warning(self, "Error", "Invalid price or quantity format. Must be positive.")
-            return
-
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "UPDATE items SET name = ?, price = ?, quantity = ? WHERE id = ?",
-                (name, price, quantity, self.item_id),
-            )
-            conn.commit()
-            self.accept()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(self, "Error", "An item with that name already exists.")
-            conn.rollback()
-        conn.close()
+        mine = {
+            "name": self.name_entry.text(),
+            "price": self.price_entry.text(),
+            "quantity": self.quantity_entry.text(),
+        }
+        while True:
+            try:
+                self.version = catalog.update_item(
+                    DATABASE_PATH,
+                    self.item_id,
+                    mine["name"],
+                    mine["price"],
+                    mine["quantity"],
+                    self.version,
+                )
+                break
+            except ConflictError as exc:
+                if not conflicts.ask_to_overwrite(self, exc, mine):
+                    self.accept()  # The table reloads with what is stored now
+                    return
+                self.version = exc.current[4]
+            except StoreError as exc:
+                QMessageBox.warning(self, "Error", str(exc))
+                return
+        self.accept()
 
-if __name__ == "__main__":
+def main():
+    storage.use_profile("back_office")
     app = QApplication(sys.argv)
+    watchdog.install_from_env(InventoryApp)
     window = InventoryApp()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    return app.exec_()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(profiling.run("inventory", main))
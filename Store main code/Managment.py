@@ -1,6 +1,7 @@
 import sys
-import datetime
+import logging
 import sqlite3
+import time
 from PyQt5.QtWidgets import (
     QApplication,
     QWidget,
@@ -8,8 +9,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QVBoxLayout,
     QComboBox,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QMessageBox,
     QAbstractItemView,
     QGridLayout,
@@ -24,36 +24,72 @@ from PyQt5.QtWidgets import (
     QFormLayout,
     QDialogButtonBox,
     QScrollArea,
+    QProgressBar,
 )
-from PyQt5.QtCore import Qt, QRegExp, QAbstractTableModel, QModelIndex, QVariant
-from PyQt5.QtGui import QFont, QIcon, QColor, QRegExpValidator, QValidator
+from PyQt5.QtCore import QEvent, QObject, Qt, QRegExp, QTimer
+from PyQt5.QtGui import QFont, QIcon, QRegExpValidator
+
+import conflicts
+import profiling
+import watchdog
+from background import BackgroundCall, LoadTimer, RowLoader
+from sales_model import SalesListModel
+from store_core import (
+    ConflictError,
+    StoreError,
+    analytics,
+    backup,
+    branches,
+    catalog,
+    client,
+    forecast,
+    report_cache,
+    snapshot,
+    stock,
+    storage,
+)
+from store_core.db import checkpoint, create_schema
+from store_core.maintenance import Maintainer
 
 DATABASE_PATH = "store.db"  # Path to your SQLite database
+CHECKPOINT_INTERVAL_MS = 60 * 1000  # See store_core.storage
+BACKUP_CHECK_INTERVAL_MS = 15 * 60 * 1000  # See store_core.backup.backup_if_due
+SNAPSHOT_INTERVAL_MS = snapshot.SYNC_INTERVAL * 1000  # See store_core.snapshot
+STOCK_CHECK_INTERVAL_MS = 15 * 60 * 1000  # See store_core.stock.checkpoint_if_due
+MAINTENANCE_CHECK_INTERVAL_MS = 60 * 1000  # See store_core.maintenance.Maintainer
+CLOSE_CHECKPOINT_TIMEOUT_MS = 200  # How long closing waits for busy tills
+CLOSE_WAIT_MS = 1000  # How long closing waits for background jobs in all
+
+# Client mode: with STORE_SERVICE set, the window talks to store_core.service
+# instead of opening store.db (the service then owns checkpoints, backups and
+# maintenance too)
+service = client.from_env()
 
 # --- Inventory App Functions ---
 
 
 class InventoryApp(QWidget):
+    # Slots timed by the UI stall watchdog (watchdog.py)
+    TIMED_SLOTS = (
+        "_add_item",
+        "_delete_item",
+        "_edit_item",
+        "_search_items",
+        "_open_add_many_dialog",
+        "_update_item",
+        "_on_items_chunk",
+    )
+
     def __init__(self):
         super().__init__()
+        self.load_timer = LoadTimer("Inventory")
+        self._loader = None
         self._create_database()
         self._init_ui()
 
     def _create_database(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            price REAL NOT NULL,
-            quantity INTEGER NOT NULL
-        )
-    """
-        )
-        conn.commit()
-        conn.close()
+        if service is None:
+            create_schema(DATABASE_PATH)
 
     def _init_ui(self):
         # Fonts
@@ -102,6 +138,9 @@ class InventoryApp(QWidget):
         self.item_table.setSelectionBehavior(
             QAbstractItemView.SelectRows
         )  # Select whole rows
+        self.item_table.setSelectionMode(
+            QAbstractItemView.ExtendedSelection
+        )  # Shift/Ctrl-click to delete many at once
         self.item_table.cellChanged.connect(self._update_item)
 
         # Layouts
@@ -151,84 +190,148 @@ class InventoryApp(QWidget):
         self._load_items()
 
     def _load_items(self):
+        """Reloads the table, streaming rows in from a worker thread."""
+        self._cancel_load()
         self.item_table.setRowCount(0)
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM items ORDER BY id")
-        items = cursor.fetchall()
-        conn.close()
-
-        if items:
-            for row_number, item in enumerate(items):
-                self.item_table.insertRow(row_number)
-                for column_number, data in enumerate(item):
-                    self.item_table.setItem(
-                        row_number,
-                        column_number,
-                        QTableWidgetItem(str(data)),
-                    )
-        else:
-            self.item_table.setRowCount(1)
-            self.item_table.setItem(
-                0,
-                0,
-                QTableWidgetItem("No items found. Start adding items!"),
+        if service is not None:
+            self._loader = BackgroundCall(service.list_items, parent=self)
+            self._loader.result.connect(self._on_items_fetched)
+            self._loader.error.connect(
+                lambda message: QMessageBox.warning(self, "Error", message)
             )
-            self.item_table.item(0, 0).setTextAlignment(Qt.AlignCenter)
-
-    def _add_item(self):
-        name = self.name_entry.text()
-        price = self.price_entry.text()
-        quantity = self.quantity_entry.text()
-
-        if not all([name, price, quantity]):
-            QMessageBox.warning(self, "Error", "Please fill all fields.")
+            self._loader.start()
             return
+        self._loader = RowLoader(
+            DATABASE_PATH, "SELECT * FROM items ORDER BY id", parent=self
+        )
+        self._loader.chunk.connect(self._on_items_chunk)
+        self._loader.done.connect(self._on_items_loaded)
+        self._loader.error.connect(self._on_items_failed)
+        self._loader.start()
+
+    def _cancel_load(self):
+        if self._loader is not None:
+            if isinstance(self._loader, RowLoader):
+                self._loader.cancel()
+            self._loader = None
+
+    def _on_items_fetched(self, items):
+        """Client mode: the whole item list arrives in one reply."""
+        self._on_items_chunk(items)
+        self._on_items_loaded(len(items))
+
+    def _on_items_chunk(self, items):
+        if self.sender() is not self._loader:
+            return  # Chunk from a load that has been superseded
+        self._append_rows(items)
+        self.load_timer.mark_first_paint()
+
+    def _on_items_loaded(self, count):
+        if self.sender() is not self._loader:
+            return
+        self._loader = None
+        if not count:
+            self._show_empty_message()
+        self.load_timer.mark_interactive(count)
 
-        try:
-            price = float(price)
-            if price <= 0:
-                raise ValueError
-            quantity = int(quantity)
-            if quantity <= 0:
-                raise ValueError
-        except ValueError:
-            QMessageBox.warning(
-                self,
-                "Error",
-                "Invalid price or quantity format. Must be positive.",
-            )
+    def _on_items_failed(self, message):
+        if self.sender() is not self._loader:
             return
+        self._loader = None
+        QMessageBox.warning(self, "Error", f"Could not load the items: {message}")
+
+    def _show_empty_message(self):
+        self.item_table.blockSignals(True)
+        self.item_table.setRowCount(1)
+        self.item_table.setItem(
+            0,
+            0,
+            QTableWidgetItem("No items found. Start adding items!"),
+        )
+        self.item_table.item(0, 0).setTextAlignment(Qt.AlignCenter)
+        self.item_table.blockSignals(False)
+
+    def _append_rows(self, items):
+        # cellChanged is meant for user edits; filling the table must not
+        # write every cell straight back to the database.
+        self.item_table.blockSignals(True)
+        first_row = self.item_table.rowCount()
+        self.item_table.setRowCount(first_row + len(items))
+        for row_number, item in enumerate(items, first_row):
+            for column_number, data in enumerate(item[:4]):
+                self.item_table.setItem(
+                    row_number,
+                    column_number,
+                    QTableWidgetItem(str(data)),
+                )
+            # The version the row was loaded at, for conflict checks on save
+            self.item_table.item(row_number, 0).setData(Qt.UserRole, item[4])
+        self.item_table.blockSignals(False)
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+    def _add_item(self):
         try:
-            cursor.execute(
-                "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
-                (name, price, quantity),
-            )
-            conn.commit()
-            self._clear_input_fields()
-            self._load_items()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(
-                self, "Error", "An item with that name already exists."
-            )
-        conn.close()
+            if service is not None:
+                service.add_item(
+                    self.name_entry.text(),
+                    self.price_entry.text(),
+                    self.quantity_entry.text(),
+                )
+            else:
+                catalog.add_item(
+                    DATABASE_PATH,
+                    self.name_entry.text(),
+                    self.price_entry.text(),
+                    self.quantity_entry.text(),
+                )
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
+        self._clear_input_fields()
+        self._load_items()
 
     def _delete_item(self):
-        selected_row = self.item_table.currentRow()
-        if selected_row >= 0:
-            item_id = self.item_table.item(selected_row, 0).text()
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
-            conn.commit()
-            conn.close()
-            self.item_table.removeRow(selected_row)
-            self._renumber_ids()
-        else:
+        """Deletes every selected item and removes their rows in place."""
+        rows = sorted(
+            index.row()
+            for index in self.item_table.selectionModel().selectedRows()
+            # The "No items found" row has no item behind it
+            if self.item_table.item(index.row(), 0).data(Qt.UserRole)
+            is not None
+        )
+        if not rows:
             QMessageBox.warning(self, "Error", "Please select an item to delete.")
+            return
+        if len(rows) > 1:
+            answer = QMessageBox.question(
+                self, "Delete Items", f"Delete {len(rows)} items?"
+            )
+            if answer != QMessageBox.Yes:
+                return
+        item_ids = [self.item_table.item(row, 0).text() for row in rows]
+        try:
+            if service is not None:
+                service.delete_items(item_ids)
+            else:
+                catalog.delete_items(DATABASE_PATH, item_ids)
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
+        self._remove_rows(rows)
+
+    def _remove_rows(self, rows):
+        """Removes sorted ``rows``, one call per run of adjacent rows."""
+        runs = []
+        for row in rows:
+            if runs and runs[-1][0] + runs[-1][1] == row:
+                runs[-1][1] += 1
+            else:
+                runs.append([row, 1])
+        self.item_table.blockSignals(True)
+        for first_row, count in reversed(runs):
+            self.item_table.model().removeRows(first_row, count)
+        self.item_table.blockSignals(False)
+        if not self.item_table.rowCount():
+            self._show_empty_message()
 
     def _edit_item(self):
         selected_row = self.item_table.currentRow()
@@ -237,8 +340,11 @@ class InventoryApp(QWidget):
             name = self.item_table.item(selected_row, 1).text()
             price = self.item_table.item(selected_row, 2).text()
             quantity = self.item_table.item(selected_row, 3).text()
+            version = self.item_table.item(selected_row, 0).data(Qt.UserRole)
 
-            dialog = EditItemDialog(self, item_id, name, price, quantity)
+            dialog = EditItemDialog(
+                self, item_id, name, price, quantity, version
+            )
             if dialog.exec_() == QDialog.Accepted:
                 self._load_items()
         else:
@@ -250,24 +356,14 @@ class InventoryApp(QWidget):
             self._load_items()
             return
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM items WHERE name LIKE ? OR id = ?",
-            (f"%{search_term}%", search_term),
-        )
-        items = cursor.fetchall()
-        conn.close()
+        if service is not None:
+            items = service.search_items(search_term)
+        else:
+            items = catalog.search_items(DATABASE_PATH, search_term)
 
+        self._cancel_load()
         self.item_table.setRowCount(0)
-        for row_number, item in enumerate(items):
-            self.item_table.insertRow(row_number)
-            for column_number, data in enumerate(item):
-                self.item_table.setItem(
-                    row_number,
-                    column_number,
-                    QTableWidgetItem(str(data)),
-                )
+        self._append_rows(items)
 
     def _clear_input_fields(self):
         self.name_entry.clear()
@@ -285,75 +381,35 @@ class InventoryApp(QWidget):
 
         item_id = self.item_table.item(row, 0).text()
         new_value = self.item_table.item(row, column).text()
+        column_name = ("id", "name", "price", "quantity")[column]
+        version = self.item_table.item(row, 0).data(Qt.UserRole)
 
-        try:
-            if column == 2:  # Price
-                new_value = float(new_value)
-            elif column == 3:  # Quantity
-                new_value = int(new_value)
-        except ValueError:
-            QMessageBox.warning(self, "Error", "Invalid data format.")
-            return
-
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        if column == 1:  # Name
+        while True:
             try:
-                cursor.execute(
-                    "UPDATE items SET name = ? WHERE id = ?",
-                    (new_value, item_id),
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                QMessageBox.warning(
-                    self, "Error", "An item with that name already exists."
-                )
-                conn.rollback()
-                self._load_items()  # Reload to revert changes
-        elif column == 2:  # Price
-            cursor.execute(
-                "UPDATE items SET price = ? WHERE id = ?",
-                (new_value, item_id),
-            )
-            conn.commit()
-        elif column == 3:  # Quantity
-            cursor.execute(
-                "UPDATE items SET quantity = ? WHERE id = ?",
-                (new_value, item_id),
-            )
-            conn.commit()
-
-        conn.close()
-
-    def _renumber_ids(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM items ORDER BY id")
-        ids = cursor.fetchall()
-
-        if ids:
-            for i, (id,) in enumerate(ids):
-                if i + 1 != id:
-                    cursor.execute(
-                        "UPDATE items SET id = ? WHERE id = ?",
-                        (i + 1, id),
+                if service is not None:
+                    version = service.update_field(
+                        item_id, column_name, new_value, version
                     )
-            conn.commit()
-            self._load_items()
-            self._reset_autoincrement()
-
-        conn.close()
-
-    def _reset_autoincrement(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(id) FROM items")
-        max_id = cursor.fetchone()[0]
-        if max_id is not None:
-            cursor.execute("UPDATE sqlite_sequence SET seq = ?", (max_id,))
-        conn.commit()
-        conn.close()
+                else:
+                    version = catalog.update_field(
+                        DATABASE_PATH, item_id, column_name, new_value, version
+                    )
+                break
+            except ConflictError as exc:
+                if not conflicts.ask_to_overwrite(
+                    self, exc, {column_name: new_value}
+                ):
+                    self._load_items()  # Show what is stored now
+                    return
+                version = exc.current[4]
+            except StoreError as exc:
+                QMessageBox.warning(self, "Error", str(exc))
+                if column == 1:
+                    self._load_items()  # Reload to revert changes
+                return
+        self.item_table.blockSignals(True)
+        self.item_table.item(row, 0).setData(Qt.UserRole, version)
+        self.item_table.blockSignals(False)
 
 
 class AddManyItemsDialog(QDialog):
@@ -414,8 +470,7 @@ class AddManyItemsDialog(QDialog):
         self.grid_layout.addWidget(quantity_entry, row_count, 5)
 
     def _save_items(self):
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        items = []
         existing_names = set()
 
         for row in range(self.grid_layout.rowCount()):
@@ -429,54 +484,39 @@ class AddManyItemsDialog(QDialog):
             price = price_entry.text()
             quantity = quantity_entry.text()
 
-            if all([name, price, quantity]):
-                try:
-                    price = float(price)
-                    if price <= 0:
-                        raise ValueError
-                    quantity = int(quantity)
-                    if quantity <= 0:
-                        raise ValueError
-                    if name in existing_names:
-                        QMessageBox.warning(
-                            self,
-                            "Error",
-                            f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
-                        )
-                        continue  # Skip this row if name already exists
-                    else:
-                        existing_names.add(name)
-                        cursor.execute(
-                            "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
-                            (name, price, quantity),
-                        )
-                except ValueError:
-                    QMessageBox.warning(
-                        self,
-                        "Error",
-                        f"Invalid data for row {row + 1}. Skipping.",
-                    )
-                    conn.rollback()
-                    return
-                except sqlite3.IntegrityError:
-                    QMessageBox.warning(
-                        self,
-                        "Error",
-                        f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
-                    )
-                    conn.rollback()
-                    return
-            else:
+            if not all([name, price, quantity]):
                 QMessageBox.warning(
                     self,
                     "Error",
                     f"Incomplete data for row {row + 1}. Skipping.",
                 )
-                conn.rollback()
                 return
+            if name in existing_names:
+                QMessageBox.warning(
+                    self,
+                    "Error",
+                    f"An item with the name '{name}' already exists in the database. Skipping row {row + 1}.",
+                )
+                continue  # Skip this row if name already exists
+            try:
+                items.append(catalog.validate_item(name, price, quantity))
+            except StoreError:
+                QMessageBox.warning(
+                    self,
+                    "Error",
+                    f"Invalid data for row {row + 1}. Skipping.",
+                )
+                return
+            existing_names.add(name)
 
-        conn.commit()
-        conn.close()
+        try:
+            if service is not None:
+                service.add_items(items)
+            else:
+                catalog.add_items(DATABASE_PATH, items)
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
         self.accept()
 
 
@@ -488,12 +528,14 @@ class EditItemDialog(QDialog):
         name=None,
         price=None,
         quantity=None,
+        version=None,
     ):
         super().__init__(parent)
         self.setWindowTitle("Edit Item")
         self.setWindowIcon(QIcon("store.png"))
 
         self.item_id = item_id
+        self.version = version
         self.layout = QFormLayout()
 
         self.name_entry = QLineEdit(name)
@@ -520,119 +562,163 @@ class EditItemDialog(QDialog):
         self.setLayout(self.layout)
 
     def _save_changes(self):
-        name = self.name_entry.text()
-        price = self.price_entry.text()
-        quantity = self.quantity_entry.text()
+        mine = {
+            "name": self.name_entry.text(),
+            "price": self.price_entry.text(),
+            "quantity": self.quantity_entry.text(),
+        }
+        while True:
+            try:
+                if service is not None:
+                    self.version = service.update_item(
+                        self.item_id,
+                        mine["name"],
+                        mine["price"],
+                        mine["quantity"],
+                        self.version,
+                    )
+                else:
+                    self.version = catalog.update_item(
+                        DATABASE_PATH,
+                        self.item_id,
+                        mine["name"],
+                        mine["price"],
+                        mine["quantity"],
+                        self.version,
+                    )
+                break
+            except ConflictError as exc:
+                if not conflicts.ask_to_overwrite(self, exc, mine):
+                    self.accept()  # The table reloads with what is stored now
+                    return
+                self.version = exc.current[4]
+            except StoreError as exc:
+                QMessageBox.warning(self, "Error", str(exc))
+                return
+        self.accept()
 
-        if not all([name, price, quantity]):
-            QMessageBox.warning(self, "Error", "Please fill all fields.")
-            return
 
-        try:
-            price = float(price)
-            if price <= 0:
-                raise ValueError
-            quantity = int(quantity)
-            if quantity <= 0:
-                raise ValueError
-        except ValueError:
-            QMessageBox.warning(
-                self,
-                "Error",
-                "Invalid price or quantity format. Must be positive.",
-            )
-            return
+# --- Sales App Functions ---
 
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "UPDATE items SET name = ?, price = ?, quantity = ? WHERE id = ?",
-                (name, price, quantity, self.item_id),
-            )
-            conn.commit()
-            self.accept()
-        except sqlite3.IntegrityError:
-            QMessageBox.warning(
-                self, "Error", "An item with that name already exists."
-            )
-            conn.rollback()
-        conn.close()
 
+def create_database():
+    """Creates the database tables if they don't exist."""
+    if service is None:
+        create_schema(DATABASE_PATH)
 
-# --- Sales App Functions ---
 
+# --- Replenishment ---
 
-def create_database():
-    """Creates the database table if it doesn't exist."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-CREATE TABLE IF NOT EXISTS sales (
-id INTEGER PRIMARY KEY AUTOINCREMENT,
-timestamp DATETIME NOT NULL,
-items TEXT NOT NULL,
-total REAL NOT NULL
-)
-"""
-    )
-    conn.commit()
-    conn.close()
+
+def load_forecast():
+    """Every item's demand forecast and reorder point; see store_core.forecast."""
+    if service is not None:
+        return service.forecast_items()
+    return forecast.forecast_items(DATABASE_PATH)
 
 
 # --- Sales Data Functions ---
+# Reports read the analytics copy of the database (see store_core.snapshot),
+# so listing and analysing sales never competes with the tills' checkouts.
+# Until the copy has been built they read store.db.
 
 
-def load_sales_data():
-    """Loads sales data from the database."""
-    sales = []
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sales")
-    for row in cursor.fetchall():
-        sales.append(
-            {
-                "id": row[0],
-                "timestamp": datetime.datetime.strptime(
-                    row[1], "%Y-%m-%d %H:%M:%S"
-                ),
-                "items": row[2],
-                "total": row[3],
-            }
+def load_sales_data(year="", month="", day=""):
+    """Loads the sales of a period from the database (or the service in client mode)."""
+    if service is not None:
+        return service.load_sales(year, month, day)
+    return analytics.load_sales(
+        snapshot.reporting_path(DATABASE_PATH), year, month, day
+    )
+
+
+def fetch_sales_page(year, month, day, after, limit, branch=None):
+    """One page of sales rows for SalesListModel; see analytics.fetch_sales_page.
+
+    ``branch`` is the database of another branch (see branches); None is
+    this store.
+    """
+    if branch is not None:
+        return analytics.fetch_sales_page(
+            branch, year, month, day, after, limit
         )
-    conn.close()
-    return sales
+    if service is not None:
+        return service.fetch_sales_page(year, month, day, after, limit)
+    return analytics.fetch_sales_page(
+        snapshot.reporting_path(DATABASE_PATH),
+        year,
+        month,
+        day,
+        after,
+        limit,
+    )
 
 
-def display_sales_data(sales_listbox, sales, year, month, day):
-    """Displays filtered sales data in the listbox."""
-    sales_listbox.clear()  # Clear previous items
+def load_sales_summary(year, month, day, branch=None):
+    """The analysis of a period, from the report cache (or the service)."""
+    if branch is not None:
+        return report_cache.get_report(
+            branch, "summary", year, month, day
+        )
+    if service is not None:
+        return service.sales_summary(year, month, day)
+    return report_cache.get_report(
+        snapshot.reporting_path(DATABASE_PATH, up_to_date=True),
+        "summary",
+        year,
+        month,
+        day,
+    )
+
+
+def load_consolidated_summary(year, month, day):
+    """The analysis of a period across all branches, one process per core."""
+    return branches.consolidate(
+        branches.branches_from_env(), year, month, day
+    )
+
+
+def load_basket_rules(year, month, day, branch=None):
+    """The items most often bought together in a period; see analytics.basket_rules."""
+    if branch is not None:
+        baskets = report_cache.get_report(
+            branch, "baskets", year, month, day
+        )
+    elif service is not None:
+        return service.sales_basket_rules(year, month, day)
+    else:
+        baskets = report_cache.get_report(
+            snapshot.reporting_path(DATABASE_PATH, up_to_date=True),
+            "baskets",
+            year,
+            month,
+            day,
+        )
+    return analytics.basket_rules(baskets)
+
+
+def load_consolidated_basket_rules(year, month, day):
+    """load_basket_rules across all branches."""
+    report = branches.consolidate(
+        branches.branches_from_env(), year, month, day, reports=("baskets",)
+    )
+    return analytics.basket_rules(report["baskets"])
 
-    filtered_sales = []
-    for sale in sales:
-        if year and sale["timestamp"].year != int(year):
-            continue
-        if month and sale["timestamp"].month != int(month):
-            continue
-        if day and sale["timestamp"].day != int(day):
-            continue
 
-        filtered_sales.append(sale)
+def display_sales_data(sales_model, year, month, day, branch=None):
+    """Shows the sales of a period in the list, a page at a time."""
+    sales_model.set_source(
+        lambda after, limit: fetch_sales_page(
+            year, month, day, after, limit, branch
+        )
+    )
 
-    if not filtered_sales:
+    if not sales_model.rowCount():
         QMessageBox.information(
             None,
             "Sales Analysis",
             "No sales data found for the selected period.",
         )
-        return
-
-    for sale in filtered_sales:
-        item = QListWidgetItem(
-            f"{sale['timestamp'].strftime('%Y-%m-%d %H:%M:%S')} - {sale['items']} - EG {sale['total']:.2f}"
-        )
-        sales_listbox.addItem(item)
 
 
 def analyze_sales_data(sales, year, month, day):
@@ -643,18 +729,13 @@ def analyze_sales_data(sales, year, month, day):
         )
         return
 
-    filtered_sales = []
-    for sale in sales:
-        if year and sale["timestamp"].year != int(year):
-            continue
-        if month and sale["timestamp"].month != int(month):
-            continue
-        if day and sale["timestamp"].day != int(day):
-            continue
+    filtered_sales = analytics.filter_sales(sales, year, month, day)
+    show_sales_summary(analytics.summarize_sales(filtered_sales))
 
-        filtered_sales.append(sale)
 
-    if not filtered_sales:
+def show_sales_summary(summary):
+    """Displays an analysis of sales in a message box."""
+    if not summary["count"]:
         QMessageBox.information(
             None,
             "Sales Analysis",
@@ -662,40 +743,144 @@ def analyze_sales_data(sales, year, month, day):
         )
         return
 
-    total_sales = sum([sale["total"] for sale in filtered_sales])
-    avg_sale = (
-        total_sales / len(filtered_sales) if filtered_sales else 0.0
+    QMessageBox.information(
+        None, "Sales Analysis", analytics.format_summary(summary)
     )
 
-    item_counts = {}
-    for sale in filtered_sales:
-        for item in sale["items"].split(", "):
-            item_name, quantity = item.split(" x ")
-            item_counts[item_name] = item_counts.get(
-                item_name, 0
-            ) + int(quantity)
 
-    results_str = f"Total Sales: EG {total_sales:.2f}\nAverage Sale: EG {avg_sale:.2f}\n\nSales per Item:\n"
-    for item, count in item_counts.items():
-        results_str += f"{item}: {count}\n"
+def show_basket_rules(report):
+    """Displays the items bought together in a message box."""
+    if not report["baskets"]:
+        QMessageBox.information(
+            None,
+            "Basket Analysis",
+            "No sales data found for the selected period.",
+        )
+        return
 
-    QMessageBox.information(None, "Sales Analysis", results_str)
+    QMessageBox.information(
+        None, "Basket Analysis", analytics.format_basket_rules(report)
+    )
+
+
+def show_consolidated_summary(report):
+    """Displays the analysis of all branches in a message box."""
+    if not report["summary"]["count"]:
+        QMessageBox.information(
+            None,
+            "Sales Analysis",
+            "No sales data found for the selected period.",
+        )
+        return
+
+    QMessageBox.information(
+        None, "Sales Analysis", branches.format_consolidated(report)
+    )
 
 
 # --- Sales Data Analysis Window ---
 
 
 class SalesDataAnalysis(QWidget):
+    # Slots timed by the UI stall watchdog (watchdog.py)
+    TIMED_SLOTS = (
+        "on_display_clicked",
+        "on_analyze_clicked",
+        "on_baskets_clicked",
+        "on_clear_clicked",
+        "_on_summary_loaded",
+        "_on_consolidated_loaded",
+        "_on_baskets_loaded",
+    )
+
+    # Branch selector entries that are not a branch database
+    THIS_STORE = None
+    ALL_BRANCHES = "*"
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Sales Data Analysis")
 
-        # --- Apply a Modern Style ---
-        QApplication.setStyle(QStyleFactory.create("Fusion"))
-
         create_database()
-        self.sales = load_sales_data()
+        # Nothing is loaded up front: the list pages in the selected period
+        # (see SalesListModel) and Analyze asks the report cache for that
+        # period, which only reads sales it has not summarised before.
+        self._loader = None
+        self.branches = branches.branches_from_env()
         self.initUI()
+        self._set_loading(False)
+
+    def _start_loading(self, year, month, day, branch=None):
+        """Analyses the sales of a period on a worker thread."""
+        if branch == self.ALL_BRANCHES:
+            self._run_loader(
+                self._on_consolidated_loaded,
+                load_consolidated_summary,
+                year,
+                month,
+                day,
+            )
+        else:
+            self._run_loader(
+                self._on_summary_loaded,
+                load_sales_summary,
+                year,
+                month,
+                day,
+                branch,
+            )
+
+    def _start_basket_analysis(self, year, month, day, branch=None):
+        """Finds the items bought together in a period on a worker thread."""
+        if branch == self.ALL_BRANCHES:
+            self._run_loader(
+                self._on_baskets_loaded,
+                load_consolidated_basket_rules,
+                year,
+                month,
+                day,
+            )
+        else:
+            self._run_loader(
+                self._on_baskets_loaded,
+                load_basket_rules,
+                year,
+                month,
+                day,
+                branch,
+            )
+
+    def _run_loader(self, slot, func, *args):
+        self._set_loading(True)
+        self._loader = BackgroundCall(func, *args, parent=self)
+        self._loader.result.connect(slot)
+        self._loader.error.connect(self._on_sales_load_failed)
+        self._loader.start()
+
+    def _set_loading(self, loading):
+        self.loading_label.setText("Loading sales data...")
+        self.loading_label.setVisible(loading)
+        self.loading_bar.setVisible(loading)
+        self.display_button.setEnabled(not loading)
+        self.analyze_button.setEnabled(not loading)
+        self.baskets_button.setEnabled(not loading)
+
+    def _on_summary_loaded(self, summary):
+        self._set_loading(False)
+        show_sales_summary(summary)
+
+    def _on_consolidated_loaded(self, report):
+        self._set_loading(False)
+        show_consolidated_summary(report)
+
+    def _on_baskets_loaded(self, report):
+        self._set_loading(False)
+        show_basket_rules(report)
+
+    def _on_sales_load_failed(self, message):
+        self._set_loading(False)
+        self.loading_label.setText(f"Could not load sales data: {message}")
+        self.loading_label.show()
 
     def initUI(self):
         """Initializes the user interface."""
@@ -721,19 +906,39 @@ class SalesDataAnalysis(QWidget):
         self.day_combo = QComboBox(self)
         self.day_combo.addItems([str(x) for x in range(1, 32)])
 
+        # --- Branch Selection (only with STORE_BRANCHES set) ---
+        self.branch_label = QLabel("Branch:")
+        self.branch_combo = QComboBox(self)
+        self.branch_combo.addItem("This store", self.THIS_STORE)
+        for path in self.branches:
+            self.branch_combo.addItem(branches.branch_name(path), path)
+        self.branch_combo.addItem("All branches", self.ALL_BRANCHES)
+        self.branch_label.setVisible(bool(self.branches))
+        self.branch_combo.setVisible(bool(self.branches))
+
+        # --- Loading State ---
+        self.loading_label = QLabel("Loading sales data...")
+        self.loading_bar = QProgressBar(self)
+        self.loading_bar.setRange(0, 0)  # Busy indicator
+        self.loading_bar.setTextVisible(False)
+
         # --- Sales Data Listbox ---
-        self.sales_listbox = QListWidget(self)
+        # A view over SalesListModel; rows are fetched as it scrolls
+        self.sales_model = SalesListModel(self)
+        self.sales_listbox = QListView(self)
+        self.sales_listbox.setModel(self.sales_model)
+        self.sales_listbox.setUniformItemSizes(True)
         self.sales_listbox.setStyleSheet(
             """
-        QListWidget {
+        QListView {
             border: 1px solid #ccc;
             border-radius: 5px;
             padding: 5px;
         }
-        QListWidget::item {
+        QListView::item {
             padding: 5px;
         }
-        QListWidget::item:selected {
+        QListView::item:selected {
             background-color: #e6f2ff; 
             color: #000; 
         }
@@ -747,6 +952,9 @@ class SalesDataAnalysis(QWidget):
         self.analyze_button = QPushButton("Analyze Sales Data")
         self.analyze_button.clicked.connect(self.on_analyze_clicked)
 
+        self.baskets_button = QPushButton("Basket Analysis")
+        self.baskets_button.clicked.connect(self.on_baskets_clicked)
+
         self.clear_button = QPushButton("Clear Date")
         self.clear_button.clicked.connect(self.on_clear_clicked)
 
@@ -770,6 +978,7 @@ class SalesDataAnalysis(QWidget):
     """
         self.display_button.setStyleSheet(button_style)
         self.analyze_button.setStyleSheet(button_style)
+        self.baskets_button.setStyleSheet(button_style)
         self.clear_button.setStyleSheet(button_style)
 
         # --- Layout ---
@@ -780,14 +989,19 @@ class SalesDataAnalysis(QWidget):
         date_layout.addWidget(self.month_combo)
         date_layout.addWidget(self.day_label)
         date_layout.addWidget(self.day_combo)
+        date_layout.addWidget(self.branch_label)
+        date_layout.addWidget(self.branch_combo)
 
         button_layout = QHBoxLayout()
         button_layout.addWidget(self.display_button)
         button_layout.addWidget(self.analyze_button)
+        button_layout.addWidget(self.baskets_button)
         button_layout.addWidget(self.clear_button)
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(date_layout)
+        main_layout.addWidget(self.loading_label)
+        main_layout.addWidget(self.loading_bar)
         main_layout.addWidget(self.sales_listbox)
         main_layout.addLayout(button_layout)
 
@@ -798,15 +1012,29 @@ class SalesDataAnalysis(QWidget):
         year = self.year_combo.currentText()
         month = self.month_combo.currentText()
         day = self.day_combo.currentText()
-        display_sales_data(
-            self.sales_listbox, self.sales, year, month, day
-        )
+        branch = self.branch_combo.currentData()
+        if branch == self.ALL_BRANCHES:
+            QMessageBox.information(
+                self,
+                "Sales Analysis",
+                "Pick one branch to list its sales; Analyze covers all of them.",
+            )
+            return
+        display_sales_data(self.sales_model, year, month, day, branch)
 
     def on_analyze_clicked(self):
         year = self.year_combo.currentText()
         month = self.month_combo.currentText()
         day = self.day_combo.currentText()
-        analyze_sales_data(self.sales, year, month, day)
+        self._start_loading(year, month, day, self.branch_combo.currentData())
+
+    def on_baskets_clicked(self):
+        year = self.year_combo.currentText()
+        month = self.month_combo.currentText()
+        day = self.day_combo.currentText()
+        self._start_basket_analysis(
+            year, month, day, self.branch_combo.currentData()
+        )
 
     def on_clear_clicked(self):
         self.year_combo.setCurrentIndex(
@@ -818,22 +1046,44 @@ class SalesDataAnalysis(QWidget):
         self.day_combo.setCurrentIndex(
             -1
         )  # Clear day selection
-        self.sales_listbox.clear()  # Clear listbox
+        self.sales_model.clear()  # Clear listbox
 
 
 # --- Main Window Class ---
 
 
+class ActivityFilter(QObject):
+    """Tells the maintainer whenever the user types or clicks anywhere."""
+
+    INPUT_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel)
+
+    def __init__(self, maintainer, parent=None):
+        super().__init__(parent)
+        self.maintainer = maintainer
+
+    def eventFilter(self, watched, event):
+        if event.type() in self.INPUT_EVENTS:
+            self.maintainer.note_activity()
+        return False
+
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Store Management App")
         self.setWindowIcon(QIcon("store.png"))
 
+        # --- Apply a Modern Style ---
+        QApplication.setStyle(QStyleFactory.create("Fusion"))
+
         # --- Create Instances ---
+        # The Sales page is built on first use (see _ensure_sales_app) so
+        # startup does not depend on the size of the sales history.
         self.inventory_app = InventoryApp()
-        self.sales_app = SalesDataAnalysis()
-        self.sales_app.hide()  # Initially hide the Sales app
+        self.sales_app = None
+        self.sales_scroll_area = None
+        self.diagnostics_panel = None
+        self.replenishment_panel = None
 
         # --- Set Current Widget ---
         self.current_widget = self.inventory_app
@@ -843,6 +1093,10 @@ class MainWindow(QWidget):
         self.inventory_button.clicked.connect(self.show_inventory)
         self.sales_button = QPushButton("Sales")
         self.sales_button.clicked.connect(self.show_sales)
+        self.restock_button = QPushButton("Restock")
+        self.restock_button.clicked.connect(self.show_restock)
+        self.diagnostics_button = QPushButton("Diagnostics")
+        self.diagnostics_button.clicked.connect(self.show_diagnostics)
 
         # --- Styling for Navigation Buttons ---
         button_style = """
@@ -864,47 +1118,240 @@ class MainWindow(QWidget):
     """
         self.inventory_button.setStyleSheet(button_style)
         self.sales_button.setStyleSheet(button_style)
+        self.restock_button.setStyleSheet(button_style)
+        self.diagnostics_button.setStyleSheet(button_style)
 
         # --- Layout ---
         navigation_layout = QHBoxLayout()
         navigation_layout.addWidget(self.inventory_button)
         navigation_layout.addWidget(self.sales_button)
+        navigation_layout.addWidget(self.restock_button)
+        navigation_layout.addWidget(self.diagnostics_button)
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(navigation_layout)
         main_layout.addWidget(self.current_widget)
 
-        # --- Add a Scroll Area for the Sales App ---
-        self.sales_scroll_area = QScrollArea()
-        self.sales_scroll_area.setWidget(self.sales_app)
-        self.sales_scroll_area.setWidgetResizable(True)
-        self.sales_scroll_area.hide()  # Initially hide the scroll area
-
         self.setLayout(main_layout)
 
+        # --- WAL Checkpoints ---
+        self._checkpoint_call = None
+        self.checkpoint_timer = QTimer(self)
+        self.checkpoint_timer.timeout.connect(self._checkpoint)
+        if service is None:
+            self.checkpoint_timer.start(CHECKPOINT_INTERVAL_MS)
+
+        # --- Scheduled Backups ---
+        self._backup_call = None
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self._backup)
+        if service is None:
+            self.backup_timer.start(BACKUP_CHECK_INTERVAL_MS)
+            QTimer.singleShot(0, self._backup)
+
+        # --- Stock Ledger Checkpoints ---
+        self._stock_call = None
+        self._unfinished_calls = []  # Background jobs left running by closeEvent
+        self.stock_timer = QTimer(self)
+        self.stock_timer.timeout.connect(self._checkpoint_stock)
+        if service is None:
+            self.stock_timer.start(STOCK_CHECK_INTERVAL_MS)
+            QTimer.singleShot(0, self._checkpoint_stock)
+
+        # --- Analytics Copy ---
+        self._snapshot_call = None
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.timeout.connect(self._refresh_snapshot)
+        if service is None:
+            self.snapshot_timer.start(SNAPSHOT_INTERVAL_MS)
+            QTimer.singleShot(0, self._refresh_snapshot)
+
+        # --- Maintenance While Idle ---
+        self.maintainer = None
+        self._maintenance_call = None
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self._maintain)
+        if service is None:
+            self.maintainer = Maintainer(DATABASE_PATH)
+            self._activity_filter = ActivityFilter(self.maintainer, self)
+            QApplication.instance().installEventFilter(self._activity_filter)
+            self.maintenance_timer.start(MAINTENANCE_CHECK_INTERVAL_MS)
+
+    def _checkpoint(self):
+        """Folds the WAL back into the database without blocking the tills."""
+        if self._checkpoint_call is None or self._checkpoint_call.isFinished():
+            self._checkpoint_call = BackgroundCall(checkpoint, DATABASE_PATH, parent=self)
+            self._checkpoint_call.error.connect(self._on_checkpoint_failed)
+            self._checkpoint_call.start()
+
+    def _backup(self):
+        """Backs up the live database on a worker thread when one is due."""
+        if self._backup_call is None or self._backup_call.isFinished():
+            self._backup_call = BackgroundCall(backup.backup_if_due, DATABASE_PATH, parent=self)
+            self._backup_call.error.connect(self._on_backup_failed)
+            self._backup_call.start()
+
+    def _checkpoint_stock(self):
+        """Checkpoints the stock ledger on a worker thread when one is due."""
+        if self._stock_call is None or self._stock_call.isFinished():
+            self._stock_call = BackgroundCall(stock.checkpoint_if_due, DATABASE_PATH, parent=self)
+            self._stock_call.error.connect(self._on_stock_checkpoint_failed)
+            self._stock_call.start()
+
+    def _refresh_snapshot(self):
+        """Copies new sales and item changes to the analytics copy."""
+        if self._snapshot_call is None or self._snapshot_call.isFinished():
+            self._snapshot_call = BackgroundCall(snapshot.refresh, DATABASE_PATH, parent=self)
+            self._snapshot_call.error.connect(self._on_snapshot_failed)
+            self._snapshot_call.start()
+
+    def _maintain(self):
+        """Analyses and compacts the database on a worker thread once idle."""
+        if self._maintenance_call is None or self._maintenance_call.isFinished():
+            self._maintenance_call = BackgroundCall(self.maintainer.tick, parent=self)
+            self._maintenance_call.error.connect(self._on_maintenance_failed)
+            self._maintenance_call.start()
+
+    def _on_checkpoint_failed(self, message):
+        logging.getLogger("store.storage").warning("checkpoint failed: %s", message)
+
+    def _on_maintenance_failed(self, message):
+        logging.getLogger("store.maintenance").warning("maintenance failed: %s", message)
+
+    def _on_stock_checkpoint_failed(self, message):
+        logging.getLogger("store.stock").warning("stock checkpoint failed: %s", message)
+
+    def _on_snapshot_failed(self, message):
+        logging.getLogger("store.snapshot").warning("analytics copy refresh failed: %s", message)
+
+    def _on_backup_failed(self, message):
+        logging.getLogger("store.backup").error("scheduled backup failed: %s", message)
+        QMessageBox.warning(self, "Backup Failed", message)
+
+    def closeEvent(self, event):
+        self.checkpoint_timer.stop()
+        self.backup_timer.stop()
+        self.maintenance_timer.stop()
+        self.snapshot_timer.stop()
+        self.stock_timer.stop()
+        if self.maintainer is not None:
+            QApplication.instance().removeEventFilter(self._activity_filter)
+            self.maintainer.stop()
+        # Jobs still running after CLOSE_WAIT_MS (a VACUUM, a backup, the
+        # first analytics copy) finish after the window has gone; see main()
+        deadline = time.monotonic() + CLOSE_WAIT_MS / 1000
+        self._unfinished_calls = []
+        for name, call in (
+            ("checkpoint", self._checkpoint_call),
+            ("backup", self._backup_call),
+            ("maintenance", self._maintenance_call),
+            ("analytics copy refresh", self._snapshot_call),
+            ("stock checkpoint", self._stock_call),
+        ):
+            if call is not None and not call.wait(max(0, int((deadline - time.monotonic()) * 1000))):
+                logging.getLogger("store").info("%s still running; finishing it before exiting", name)
+                self._unfinished_calls.append(call)
+        if not self._unfinished_calls:
+            self._close_database()
+        super().closeEvent(event)
+
+    def finish_background_work(self):
+        """Waits for the jobs closeEvent left running, then closes the database."""
+        if not self._unfinished_calls:
+            return
+        for call in self._unfinished_calls:
+            call.wait()
+        self._unfinished_calls = []
+        self._close_database()
+
+    def _close_database(self):
+        if self.maintainer is not None:
+            self.maintainer.close()
+        if service is None:
+            try:
+                checkpoint(DATABASE_PATH, "TRUNCATE", CLOSE_CHECKPOINT_TIMEOUT_MS)
+            except sqlite3.Error as exc:  # The next checkpoint catches up
+                logging.getLogger("store.storage").warning("checkpoint on close failed: %s", exc)
+
+    def _ensure_sales_app(self):
+        """Builds the Sales page and its scroll area on first use."""
+        if self.sales_app is None:
+            self.sales_app = SalesDataAnalysis()
+            self.sales_app.hide()
+
+            # --- Add a Scroll Area for the Sales App ---
+            self.sales_scroll_area = QScrollArea()
+            self.sales_scroll_area.setWidget(self.sales_app)
+            self.sales_scroll_area.setWidgetResizable(True)
+            self.sales_scroll_area.hide()
+        return self.sales_app
+
+    def _ensure_diagnostics_panel(self):
+        """Builds the Diagnostics page on first use."""
+        if self.diagnostics_panel is None:
+            from diagnostics import QueryStatsPanel
+
+            self.diagnostics_panel = QueryStatsPanel()
+            self.diagnostics_panel.hide()
+            self.layout().addWidget(self.diagnostics_panel)
+        return self.diagnostics_panel
+
+    def _ensure_replenishment_panel(self):
+        """Builds the Restock page on first use."""
+        if self.replenishment_panel is None:
+            from replenishment import ReplenishmentPanel
+
+            self.replenishment_panel = ReplenishmentPanel(load_forecast)
+            self.replenishment_panel.hide()
+            self.layout().addWidget(self.replenishment_panel)
+        return self.replenishment_panel
+
     # --- Navigation Functions ---
     def show_inventory(self):
         self.current_widget.hide()
         self.current_widget = self.inventory_app
         self.current_widget.show()
+        self._hide_sales_scroll_area()
 
+    def _hide_sales_scroll_area(self):
         # Remove Sales App from the layout
-        if self.sales_scroll_area.isVisible():
+        if self.sales_scroll_area is not None and self.sales_scroll_area.isVisible():
             self.layout().removeWidget(self.sales_scroll_area)
             self.sales_scroll_area.hide()
 
     def show_sales(self):
         self.current_widget.hide()
-        self.current_widget = self.sales_app
+        self.current_widget = self._ensure_sales_app()
         self.current_widget.show()
 
         # Add Sales App to the layout
         self.layout().addWidget(self.sales_scroll_area)
         self.sales_scroll_area.show()
 
+    def show_restock(self):
+        self.current_widget.hide()
+        self._hide_sales_scroll_area()
+        self.current_widget = self._ensure_replenishment_panel()
+        self.current_widget.show()
 
-if __name__ == "__main__":
+    def show_diagnostics(self):
+        self.current_widget.hide()
+        self._hide_sales_scroll_area()
+        self.current_widget = self._ensure_diagnostics_panel()
+        self.current_widget.show()
+
+
+def main():
+    storage.use_profile("back_office")
     app = QApplication(sys.argv)
+    watchdog.install_from_env(InventoryApp, SalesDataAnalysis)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    status = app.exec_()
+    window.finish_background_work()
+    return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(profiling.run("management", main))
@@ -0,0 +1,121 @@
+"""Helpers for running slow work off the GUI thread."""
+
+import logging
+import sqlite3
+import time
+
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+
+from store_core.db import connect
+
+log = logging.getLogger("store.startup")
+
+
+class BackgroundCall(QThread):
+    """Runs a function on a worker thread and emits its result.
+
+    Connect to ``result`` and ``error`` before calling ``start()``. Both
+    signals are delivered on the GUI thread, so slots may touch widgets.
+    """
+
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+    def __init__(self, func, *args, parent=None):
+        super().__init__(parent)
+        self._func = func
+        self._args = args
+
+    def run(self):
+        try:
+            value = self._func(*self._args)
+        except Exception as exc:  # Reported to the GUI instead of lost
+            self.error.emit(str(exc))
+            return
+        self.result.emit(value)
+
+
+class RowLoader(QThread):
+    """Streams the rows of a query to the GUI thread in chunks.
+
+    ``chunk`` is emitted with a list of up to ``chunk_size`` rows and
+    ``done`` with the total row count once the query is exhausted. A
+    cancelled loader stops emitting, but chunks already queued may still
+    arrive, so slots should ignore loaders they no longer own.
+    """
+
+    chunk = pyqtSignal(list)
+    done = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, database_path, query, params=(), chunk_size=500, parent=None):
+        super().__init__(parent)
+        self._database_path = database_path
+        self._query = query
+        self._params = params
+        self._chunk_size = chunk_size
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        count = 0
+        try:
+            conn = connect(self._database_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(self._query, self._params)
+                while not self._cancelled:
+                    rows = cursor.fetchmany(self._chunk_size)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    self.chunk.emit(rows)
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            self.error.emit(str(exc))
+            return
+        if not self._cancelled:
+            self.done.emit(count)
+
+
+class LoadTimer:
+    """Reports time-to-first-paint and time-to-interactive for a window.
+
+    Create it when the window starts building. ``first_paint`` is the time
+    until the first rows of data were painted and ``interactive`` the time
+    until the view holds the whole data set.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.first_paint = None
+        self.interactive = None
+
+    def mark_first_paint(self):
+        if self.first_paint is None:
+            # Measured once the event loop has had a chance to paint
+            QTimer.singleShot(0, self._record_first_paint)
+
+    def _record_first_paint(self):
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter() - self.started
+            log.info("%s: time to first paint %.1f ms", self.name, self.first_paint * 1000)
+
+    def mark_interactive(self, rows):
+        if self.interactive is None:
+            self.mark_first_paint()
+            QTimer.singleShot(0, lambda: self._record_interactive(rows))
+
+    def _record_interactive(self, rows):
+        if self.interactive is None:
+            self.interactive = time.perf_counter() - self.started
+            log.info(
+                "%s: time to interactive %.1f ms (%d rows)",
+                self.name,
+                self.interactive * 1000,
+                rows,
+            )
@@ -26,104 +26,122 @@ from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont, QIcon, QColor, QPainter, QPen, QBrush, QTextDocument, QTextCursor, QTextCharFormat
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
 import datetime
-import sqlite3
+import logging
+
+import profiling
+import watchdog
+from background import BackgroundCall, LoadTimer, RowLoader
+from store_core import InsufficientStockError, StoreError, cart, catalog, client, storage
+from store_core.journal import SalesJournal
+from store_core.checkout import change_due
+from store_core.db import create_schema
 
 # --- Database Setup ---
 DATABASE_PATH = "store.db"
+# Client mode: with STORE_SERVICE set the till talks to store_core.service instead
+service = client.from_env()
 
 def create_database():
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS items (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            quantity INTEGER NOT NULL
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME NOT NULL,
-            items TEXT NOT NULL,
-            total REAL NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
+    if service is None:
+        create_schema(DATABASE_PATH)
 
 # --- Helper Functions ---
 
 def get_item_by_id(item_id):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM items WHERE id = ?", (item_id,))
-    item = cursor.fetchone()
-    conn.close()
-    return item
+    if service is not None:
+        return service.get_item(item_id)
+    return catalog.get_item(DATABASE_PATH, item_id)
 
 def update_item_quantity(item_id, new_quantity):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE items SET quantity = ? WHERE id = ?", (new_quantity, item_id))
-    conn.commit()
-    conn.close()
+    if service is not None:
+        service.update_field(item_id, "quantity", new_quantity)
+    else:
+        catalog.set_quantity(DATABASE_PATH, item_id, new_quantity)
 
 # --- Cashier App Functions ---
 
 def load_products():
-    products = {}
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM items")
-    for row in cursor.fetchall():
-        products[row[0]] = {
-            'id': row[0],
-            'name': row[1],
-            'price': row[2],
-            'quantity': row[3]
-        }
-    conn.close()
-    return products
+    if service is not None:
+        return service.load_products()
+    return catalog.load_products(DATABASE_PATH)
 
 def save_products(self):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    for id, product in self.products.items():
-        cursor.execute("UPDATE items SET quantity=? WHERE id=?", (product['quantity'], id))
-    conn.commit()
-    conn.close()
+    """Refreshes the till's stock figures from the database.
+
+    Sales still waiting in this till's journal are not in the database yet,
+    so they are taken off again.
+    """
+    if service is not None:
+        quantities = service.load_quantities()
+    else:
+        quantities = catalog.load_quantities(DATABASE_PATH)
+        for id, sold in self.sales_journal.pending_quantities().items():
+            if id in quantities:
+                quantities[id] -= sold
+    for id, quantity in quantities.items():
+        if id in self.products:
+            self.products[id]['quantity'] = quantity
+
+def product_label(product):
+    return f"{product['id']}. {product['name']} - EG{product['price']:.2f} (Quantity: {product['quantity']})"
 
 def display_products(self):
     self.products_list.clear()
+    self.listing_all_products = True
     for id, product in self.products.items():
-        item = QListWidgetItem(f"{product['id']}. {product['name']} - EG{product['price']:.2f} (Quantity: {product['quantity']})")
+        item = QListWidgetItem(product_label(product))
         self.products_list.addItem(item)
 
+def start_loading_products(self):
+    """Fills the product list from a worker thread, one chunk at a time."""
+    if service is not None:
+        self.products_loader = BackgroundCall(service.list_items, parent=self)
+        self.products_loader.result.connect(self.add_loaded_products)
+        self.products_loader.result.connect(lambda rows: self.finish_loading_products(len(rows)))
+        self.products_loader.error.connect(lambda message: QMessageBox.warning(self, "Error", message))
+        self.products_loader.start()
+        return
+    self.products_loader = RowLoader(DATABASE_PATH, "SELECT * FROM items", parent=self)
+    self.products_loader.chunk.connect(self.add_loaded_products)
+    self.products_loader.done.connect(self.finish_loading_products)
+    self.products_loader.error.connect(lambda message: QMessageBox.warning(self, "Error", message))
+    self.products_loader.start()
+
+def add_loaded_products(self, rows):
+    for row in rows:
+        self.products[row[0]] = catalog.product_from_row(row)
+        # Searches made while loading keep their results on screen
+        if self.listing_all_products:
+            self.products_list.addItem(QListWidgetItem(product_label(self.products[row[0]])))
+    self.load_timer.mark_first_paint()
+
+def finish_loading_products(self, count):
+    self.products_loader = None
+    self.load_timer.mark_interactive(count)
+
 def add_to_cart(self):
     selected_item = self.products_list.currentItem()
     if selected_item:
         try:
             product_id = int(selected_item.text().split(".")[0])
             quantity, ok = QInputDialog.getInt(self, "Quantity", "Enter quantity:")
-            if ok and quantity > 0:
-                if self.products[product_id]['quantity'] >= quantity:
-                    self.cart[product_id] = self.cart.get(product_id, 0) + quantity
-                    self.products[product_id]['quantity'] -= quantity
-                    self.cart_list.addItem(QListWidgetItem(f"{self.products[product_id]['name']} x {quantity}"))
-                    self.display_products()
-                else:
-                    QMessageBox.warning(self, "Warning", f"Insufficient quantity for {self.products[product_id]['name']}. Only {self.products[product_id]['quantity']} available.")
-            else:
-                QMessageBox.warning(self, "Error", "Invalid quantity. Please enter a positive number.")
+            if not ok:
+                quantity = 0  # Treated as an invalid quantity, as before
+            try:
+                cart.add_to_cart(self.cart, self.products, product_id, quantity)
+            except InsufficientStockError as exc:
+                QMessageBox.warning(self, "Warning", str(exc))
+                return
+            except StoreError as exc:
+                QMessageBox.warning(self, "Error", str(exc))
+                return
+            self.cart_list.addItem(QListWidgetItem(f"{self.products[product_id]['name']} x {quantity}"))
+            self.display_products()
         except ValueError:
             QMessageBox.warning(self, "Error", "Invalid ID. Please enter a number.")
 
 def calculate_total(self):
-    total = 0
-    for product_id, quantity in self.cart.items():
-        total += self.products[product_id]['price'] * quantity
+    total = cart.cart_total(self.cart, self.products)
     self.total_label.setText(f"Total: EG {total:.2f}")
     return total
 
@@ -137,28 +155,64 @@ def checkout(self):
 
     if total > 0:
         payment_amount, ok = QInputDialog.getDouble(self, "Payment", "Enter payment amount:", decimals=2)
-        if ok and payment_amount >= total:
-            change = payment_amount - total
-            QMessageBox.information(self, "Checkout", f"Thank you for your purchase! \nChange: EG {change:.2f}")
-            self.save_sales(total, payment_amount)
-            self.clear_cart()
-            self.save_products()
-            self.show_receipt(total, change)
-        else:
+        if not ok:
             QMessageBox.warning(self, "Error", "Insufficient payment.")
+            return
+        try:
+            total, change = self.save_sales(total, payment_amount)
+        except StoreError as exc:
+            QMessageBox.warning(self, "Error", str(exc))
+            return
+        except OSError as exc:  # The sales journal could not be written; the cart is kept
+            QMessageBox.warning(self, "Error", f"The sale could not be saved: {exc}")
+            return
+        QMessageBox.information(self, "Checkout", f"Thank you for your purchase! \nChange: EG {change:.2f}")
+        self.clear_cart()
+        self.save_products()
+        self.show_receipt(total, change)
     else:
         QMessageBox.information(self, "Checkout", "Cart is empty.")
 
 def save_sales(self, total, payment_amount):
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    items_str = ', '.join(f"{self.products[product_id]['name']} x {quantity}" for product_id, quantity in self.cart.items())
-    cursor.execute("INSERT INTO sales (timestamp, items, total) VALUES (?, ?, ?)", 
-                  (timestamp, items_str, total))
-    conn.commit()
-    conn.close()
-
+    """Records the sale; returns the (total, change) it was recorded with."""
+    if service is not None:
+        # Priced by the service from the database, not from this till's copy
+        _, total, change = service.checkout(self.cart, payment_amount)
+        return total, change
+    change = change_due(total, payment_amount)
+    # Stored in the database in the background; see store_core.journal
+    self.sales_journal.record(self.cart, self.products, total)
+    return total, change
+
+def show_receipt(self, total, change):
+    dialog = QDialog(self)
+    dialog.setWindowTitle("Receipt")
+    receipt = QTextEdit(dialog)
+    receipt.setReadOnly(True)
+    receipt.setPlainText(
+        f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        f"Total: EG {total:.2f}\n"
+        f"Paid: EG {total + change:.2f}\n"
+        f"Change: EG {change:.2f}\n\n"
+        "Thank you for your purchase!"
+    )
+    print_button = QPushButton("Print", dialog)
+    print_button.clicked.connect(lambda: print_receipt(dialog, receipt.document()))
+    close_button = QPushButton("Close", dialog)
+    close_button.clicked.connect(dialog.accept)
+    buttons_layout = QHBoxLayout()
+    buttons_layout.addWidget(print_button)
+    buttons_layout.addWidget(close_button)
+    layout = QVBoxLayout()
+    layout.addWidget(receipt)
+    layout.addLayout(buttons_layout)
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+def print_receipt(parent, document):
+    printer = QPrinter()
+    if QPrintDialog(printer, parent).exec_() == QDialog.Accepted:
+        document.print_(printer)
         
 def search_by_id(self):
     search_id = self.id_search_entry.text()
@@ -166,7 +220,8 @@ def search_by_id(self):
         search_id = int(search_id)
         if search_id in self.products:
             self.products_list.clear()
-            item = QListWidgetItem(f"{self.products[search_id]['id']}. {self.products[search_id]['name']} - EG{self.products[search_id]['price']:.2f} (Quantity: {self.products[search_id]['quantity']})")
+            self.listing_all_products = False
+            item = QListWidgetItem(product_label(self.products[search_id]))
             self.products_list.addItem(item)
         else:
             QMessageBox.information(self, "Search Result", "Product not found.")
@@ -177,9 +232,10 @@ def search_by_name(self):
     search_name = self.name_search_entry.text()
     found = False
     self.products_list.clear()
+    self.listing_all_products = False
     for id, product in self.products.items():
         if search_name.lower() in product['name'].lower():
-            item = QListWidgetItem(f"{product['id']}. {product['name']} - EG{product['price']:.2f} (Quantity: {product['quantity']})")
+            item = QListWidgetItem(product_label(product))
             self.products_list.addItem(item)
             found = True
     if not found:
@@ -188,11 +244,24 @@ def search_by_name(self):
 # --- Main Window Setup ---
 
 class CashierApp(QWidget):
+    # Slots timed by the UI stall watchdog (watchdog.py)
+    TIMED_SLOTS = (
+        "search_by_id",
+        "search_by_name",
+        "add_to_cart",
+        "clear_cart",
+        "checkout",
+        "add_loaded_products",
+    )
+
     def __init__(self):
         super().__init__()
 
+        self.load_timer = LoadTimer("Cashier")
         create_database()
-        self.products = load_products()
+        self.sales_journal = SalesJournal(DATABASE_PATH) if service is None else None
+        self.products = {}  # Filled in the background, see start_loading_products
+        self.listing_all_products = True
         self.cart = {}
 
         self.setWindowTitle("Cashier App")
@@ -250,7 +319,6 @@ class CashierApp(QWidget):
 
         self.products_list = QListWidget(products_frame)  # Class attribute
         self.products_list.setFont(QFont("Arial", 10))
-        self.display_products()
 
         products_layout = QVBoxLayout()
         products_layout.addWidget(products_label)
@@ -345,6 +413,8 @@ class CashierApp(QWidget):
         # Add spacing between frames
         main_layout.setSpacing(10)
 
+        self.start_loading_products()
+
     # --- Slot Functions ---
     def search_by_id(self):
         search_by_id(self)
@@ -370,11 +440,34 @@ class CashierApp(QWidget):
     def display_products(self):
         display_products(self)
 
+    def start_loading_products(self):
+        start_loading_products(self)
+
+    def add_loaded_products(self, rows):
+        add_loaded_products(self, rows)
+
+    def finish_loading_products(self, count):
+        finish_loading_products(self, count)
+
     def save_sales(self, total, payment_amount):
-        save_sales(self, total, payment_amount)
+        return save_sales(self, total, payment_amount)
 
-if __name__ == "__main__":
+    def show_receipt(self, total, change):
+        show_receipt(self, total, change)
+
+    def closeEvent(self, event):
+        if self.sales_journal is not None:
+            self.sales_journal.close()
+        super().closeEvent(event)
+
+def main():
+    storage.use_profile("till")
     app = QApplication(sys.argv)
+    watchdog.install_from_env(CashierApp)
     cashier_app = CashierApp()
     cashier_app.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    return app.exec_()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(profiling.run("cashier", main))
@@ -0,0 +1,39 @@
+"""Asking the manager what to do when an edit meets a newer version of an item.
+
+Item edits are saved with the version the item had when it was shown (see
+store_core.catalog.update_item). When someone else, usually a till selling
+stock, has written the item since, the save is refused and this dialog
+shows both versions so the manager can choose.
+"""
+
+from PyQt5.QtWidgets import QMessageBox
+
+FIELDS = (("name", "Name"), ("price", "Price"), ("quantity", "Quantity"))
+
+
+def ask_to_overwrite(parent, conflict, mine):
+    """Returns True if the manager wants ``mine`` saved over the current item.
+
+    ``conflict`` is the ConflictError and ``mine`` maps the edited columns to
+    the values entered. A deleted item cannot be saved; the manager is told
+    and False is returned.
+    """
+    if conflict.current is None:
+        QMessageBox.warning(parent, "Item Changed", str(conflict))
+        return False
+
+    lines = [str(conflict), ""]
+    for (column, label), now in zip(FIELDS, conflict.current[1:4]):
+        line = f"{label}: {now}"
+        if column in mine:
+            line += f"  (yours: {mine[column]})"
+        lines.append(line)
+
+    box = QMessageBox(parent)
+    box.setIcon(QMessageBox.Question)
+    box.setWindowTitle("Item Changed")
+    box.setText("\n".join(lines))
+    save_button = box.addButton("Save Mine", QMessageBox.AcceptRole)
+    box.addButton("Keep Current", QMessageBox.RejectRole)
+    box.exec_()
+    return box.clickedButton() is save_button
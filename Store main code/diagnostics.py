@@ -0,0 +1,110 @@
+"""Diagnostics page of the management app."""
+
+from PyQt5.QtWidgets import (
+    QFileDialog,
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from store_core import querylog
+
+COLUMNS = [
+    ("Statement", "sql"),
+    ("Calls", "count"),
+    ("Total ms", "total_ms"),
+    ("Mean ms", "mean_ms"),
+    ("p95 ms", "p95_ms"),
+    ("Max ms", "max_ms"),
+    ("Rows", "rows"),
+]
+
+
+class QueryStatsPanel(QWidget):
+    """Shows the per-statement SQL statistics collected by querylog."""
+
+    def __init__(self):
+        super().__init__()
+
+        self.info_label = QLabel(self)
+        self.stats_table = QTableWidget(self)
+        self.stats_table.setColumnCount(len(COLUMNS) + 1)
+        self.stats_table.setHorizontalHeaderLabels(
+            [title for title, _ in COLUMNS] + ["Top caller"]
+        )
+        self.stats_table.horizontalHeader().setSectionResizeMode(
+            0, QHeaderView.Stretch
+        )
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stats_table.setSortingEnabled(True)
+
+        refresh_button = QPushButton("Refresh", self)
+        refresh_button.clicked.connect(self.refresh)
+        reset_button = QPushButton("Reset", self)
+        reset_button.clicked.connect(self._reset)
+        save_button = QPushButton("Save JSON...", self)
+        save_button.clicked.connect(self._save)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(save_button)
+        button_layout.addStretch()
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.info_label)
+        layout.addWidget(self.stats_table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+        self.refresh()
+
+    def refresh(self):
+        if querylog.ENABLED:
+            self.info_label.setText(
+                f"Statements slower than {querylog.SLOW_QUERY_MS:g} ms are logged "
+                f"with their query plan to "
+                f"{querylog.SLOW_QUERY_LOG or querylog.SLOW_QUERY_LOG_NAME + ' next to the database'}."
+            )
+        else:
+            self.info_label.setText(
+                "Query statistics are off; set STORE_QUERY_STATS=1 to collect them."
+            )
+
+        rows = querylog.snapshot()
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(len(rows))
+        for row_number, stats in enumerate(rows):
+            for column_number, (_, key) in enumerate(COLUMNS):
+                value = stats[key]
+                cell = QTableWidgetItem()
+                if isinstance(value, float):
+                    cell.setData(0, round(value, 2))
+                else:
+                    cell.setData(0, value)
+                self.stats_table.setItem(row_number, column_number, cell)
+            top_caller = next(iter(stats["callers"]), "")
+            self.stats_table.setItem(
+                row_number, len(COLUMNS), QTableWidgetItem(top_caller)
+            )
+        self.stats_table.setSortingEnabled(True)
+
+    def _reset(self):
+        querylog.reset()
+        self.refresh()
+
+    def _save(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save query statistics", "query_stats.json", "JSON (*.json)"
+        )
+        if path:
+            querylog.dump_stats(path)
+
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
@@ -0,0 +1,206 @@
+"""Built-in profiling for the app entry points.
+
+Run any app with ``--profile MODE`` (or STORE_PROFILE=MODE):
+
+- ``cprofile``: deterministic profile, saved as ``profile.pstats`` (open it
+  with snakeviz, or turn it into a flame graph with flameprof)
+- ``sample``: the GUI thread's stack is sampled every few milliseconds and
+  saved as ``stacks.folded``, the collapsed format read by flamegraph.pl
+  and speedscope
+- ``tracemalloc``: peak traced memory and the allocation sites that held
+  it, saved as ``memory.txt``
+
+Every mode also turns on the UI watchdog, whose per-slot timings are saved
+as ``slots.json``. Everything, plus ``meta.json`` describing the run, goes
+into one zip file (``--profile-out`` / STORE_PROFILE_OUT, default
+``profile-<app>-<time>.zip``) so a field problem can be sent as one file.
+"""
+
+import argparse
+import collections
+import cProfile
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import pstats
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+
+import watchdog
+
+log = logging.getLogger("store.profiling")
+
+MODES = ("cprofile", "sample", "tracemalloc")
+SAMPLE_INTERVAL = 0.005
+
+
+class StackSampler:
+    """Samples one thread's Python stack into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def _run(self):
+        while self._running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class PeakMemoryTracker:
+    """Keeps a tracemalloc snapshot taken near the peak of traced memory."""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.snapshot = None
+        self._snapshot_size = 0
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="peak-memory", daemon=True)
+
+    def start(self):
+        tracemalloc.start(25)
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._check()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def _check(self):
+        current = tracemalloc.get_traced_memory()[0]
+        # Snapshots are costly, so only retake one on 10% growth
+        if current > self._snapshot_size * 1.1:
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def _run(self):
+        while self._running:
+            self._check()
+            time.sleep(self.interval)
+
+    def report(self, limit=30):
+        out = io.StringIO()
+        out.write(f"Peak traced memory: {self.peak / 1024 / 1024:.1f} MiB\n")
+        out.write(f"Snapshot taken at {self._snapshot_size / 1024 / 1024:.1f} MiB\n\n")
+        if self.snapshot is not None:
+            snapshot = self.snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ])
+            out.write("Top allocation sites:\n")
+            for stat in snapshot.statistics("lineno")[:limit]:
+                out.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8} blocks  {stat.traceback[0]}\n")
+            out.write("\nLargest allocation tracebacks:\n")
+            for stat in snapshot.statistics("traceback")[:5]:
+                out.write(f"\n{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                out.write("\n".join(stat.traceback.format(limit=10)) + "\n")
+        return out.getvalue()
+
+
+def _parse_args(app_name):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", choices=MODES, default=os.environ.get("STORE_PROFILE") or None)
+    parser.add_argument("--profile-out", default=os.environ.get("STORE_PROFILE_OUT"))
+    args, rest = parser.parse_known_args(sys.argv[1:])
+    sys.argv[1:] = rest  # Leave the remaining arguments to Qt
+    if args.profile and not args.profile_out:
+        args.profile_out = f"profile-{app_name}-{datetime.datetime.now():%Y%m%d-%H%M%S}.zip"
+    return args
+
+
+def run(app_name, main):
+    """Runs ``main()``, profiled if requested on the command line, and
+    returns its exit code."""
+    args = _parse_args(app_name)
+    if not args.profile:
+        return main()
+
+    os.environ.setdefault("STORE_WATCHDOG", "1")
+    started = time.time()
+    files = {}
+    if args.profile == "cprofile":
+        profiler = cProfile.Profile()
+        exit_code = profiler.runcall(main)
+        profiler.create_stats()
+        files["profile.pstats"] = _pstats_bytes(profiler)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+        files["profile.txt"] = summary.getvalue()
+    elif args.profile == "sample":
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            exit_code = main()
+        finally:
+            sampler.stop()
+        files["stacks.folded"] = sampler.folded()
+    else:
+        tracker = PeakMemoryTracker()
+        tracker.start()
+        try:
+            exit_code = main()
+        finally:
+            tracker.stop()
+        files["memory.txt"] = tracker.report()
+
+    if watchdog.active() is not None:
+        files["slots.json"] = json.dumps(watchdog.active().report(), indent=2)
+    files["meta.json"] = json.dumps(
+        {
+            "app": app_name,
+            "mode": args.profile,
+            "argv": sys.argv,
+            "started": datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+            "duration_s": round(time.time() - started, 3),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        indent=2,
+    )
+    with zipfile.ZipFile(args.profile_out, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for name, data in files.items():
+            bundle.writestr(name, data)
+    log.info("Profile written to %s", os.path.abspath(args.profile_out))
+    return exit_code
+
+
+def _pstats_bytes(profiler):
+    # pstats can only dump to a path, so go through a temporary file
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "profile.pstats")
+        profiler.dump_stats(path)
+        with open(path, "rb") as f:
+            return f.read()
@@ -0,0 +1,130 @@
+"""Restock page of the management app: demand forecasts and reorder points."""
+
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import (
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from background import BackgroundCall
+from store_core import forecast
+
+COLUMNS = [
+    ("ID", "id"),
+    ("Item", "name"),
+    ("In Stock", "quantity"),
+    ("Sold/Day (7d)", "velocity_7"),
+    ("Sold/Day (28d)", "velocity_28"),
+    ("Forecast/Day", "forecast"),
+    ("Reorder Point", "reorder_point"),
+    ("Days of Cover", "days_of_cover"),
+    ("Reorder", "reorder"),
+]
+REORDER_COLOR = QColor("#fde2e1")
+
+
+class SortKeyItem(QTableWidgetItem):
+    """A cell that sorts by a key instead of its text."""
+
+    def __init__(self, text, key):
+        super().__init__(text)
+        self.key = key
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+def _cell(key, value):
+    if key == "days_of_cover":
+        if value is None:  # Nothing sold, so the stock lasts indefinitely
+            return SortKeyItem("-", float("inf"))
+        return SortKeyItem(f"{value:.1f}", value)
+    if key == "reorder":
+        return SortKeyItem("Yes" if value else "", value)
+    if isinstance(value, float):
+        return SortKeyItem(f"{value:.2f}", value)
+    if isinstance(value, int):
+        return SortKeyItem(str(value), value)
+    return SortKeyItem(value, value.lower())
+
+
+class ReplenishmentPanel(QWidget):
+    """Shows every item's sales velocity, forecast, reorder point and cover.
+
+    ``load_forecast`` returns the rows of store_core.forecast.forecast_items;
+    it runs on a worker thread whenever the page is shown.
+    """
+
+    def __init__(self, load_forecast):
+        super().__init__()
+        self.load_forecast = load_forecast
+        self._loader = None
+
+        self.info_label = QLabel(
+            f"Forecast from the last {forecast.WINDOW_DAYS} days of sales; reorder "
+            f"points cover a {forecast.LEAD_TIME_DAYS:g}-day lead time plus safety stock. "
+            "Click a column to sort.",
+            self,
+        )
+        self.info_label.setWordWrap(True)
+        self.forecast_table = QTableWidget(self)
+        self.forecast_table.setColumnCount(len(COLUMNS))
+        self.forecast_table.setHorizontalHeaderLabels([title for title, _ in COLUMNS])
+        self.forecast_table.horizontalHeader().setSectionResizeMode(
+            1, QHeaderView.Stretch
+        )
+        self.forecast_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.forecast_table.setSortingEnabled(True)
+
+        self.refresh_button = QPushButton("Refresh", self)
+        self.refresh_button.clicked.connect(self.refresh)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addStretch()
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.info_label)
+        layout.addWidget(self.forecast_table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def refresh(self):
+        if self._loader is not None and self._loader.isRunning():
+            return
+        self.refresh_button.setEnabled(False)
+        self.refresh_button.setText("Loading...")
+        self._loader = BackgroundCall(self.load_forecast, parent=self)
+        self._loader.result.connect(self._show_forecast)
+        self._loader.error.connect(self._on_load_failed)
+        self._loader.start()
+
+    def _done_loading(self):
+        self.refresh_button.setEnabled(True)
+        self.refresh_button.setText("Refresh")
+
+    def _show_forecast(self, rows):
+        self._done_loading()
+        self.forecast_table.setSortingEnabled(False)
+        self.forecast_table.setRowCount(len(rows))
+        for row_number, row in enumerate(rows):
+            for column_number, (_, key) in enumerate(COLUMNS):
+                cell = _cell(key, row[key])
+                if row["reorder"]:
+                    cell.setBackground(REORDER_COLOR)
+                self.forecast_table.setItem(row_number, column_number, cell)
+        self.forecast_table.setSortingEnabled(True)
+
+    def _on_load_failed(self, message):
+        self._done_loading()
+        self.info_label.setText(f"Could not compute the forecast: {message}")
+
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
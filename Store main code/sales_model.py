@@ -0,0 +1,63 @@
+"""A list model that pages sales in as the view scrolls."""
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from store_core.analytics import format_sale_row
+
+
+class SalesListModel(QAbstractListModel):
+    """The sales of one period, fetched a page at a time.
+
+    ``fetch_page(after, limit)`` must return the next ``limit`` rows
+    (id, timestamp, items, total) after the (timestamp, id) key ``after``,
+    or from the start when ``after`` is None; see
+    analytics.fetch_sales_page. The view asks for the next page through
+    canFetchMore/fetchMore when it scrolls near the end. Rows are kept as
+    the tuples SQLite returns and only the ones on screen are formatted,
+    so a year of sales costs no more to show than a day.
+    """
+
+    PAGE_SIZE = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._fetch_page = None
+        self._exhausted = True
+
+    def set_source(self, fetch_page):
+        """Shows the rows of ``fetch_page`` from the top (None to clear)."""
+        self.beginResetModel()
+        self._rows = []
+        self._fetch_page = fetch_page
+        self._exhausted = fetch_page is None
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def clear(self):
+        self.set_source(None)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return format_sale_row(self._rows[index.row()])
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self._exhausted:
+            return
+        last = self._rows[-1] if self._rows else None
+        page = self._fetch_page((last[1], last[0]) if last else None, self.PAGE_SIZE)
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
@@ -0,0 +1,56 @@
+"""GUI-free core of the store apps.
+
+The PyQt windows in ``cashier.py``, ``Managment.py`` and ``Inventory.py`` only
+collect input and show results; everything else lives here and can be used
+without a display:
+
+- ``db``: connections and schema
+- ``storage``: journal mode, cache and checkpoint settings per app
+- ``writer``: the single writer thread that group-commits every change
+- ``catalog``: item validation, lookup and edits
+- ``cart``: cart bookkeeping and pricing
+- ``checkout``: recording completed sales
+- ``stock``: the stock ledger of every sale, restock and adjustment, with
+  periodic checkpoints for stock on any date
+- ``journal``: a till's fsync'd sales journal, flushed to the database in the
+  background
+- ``analytics``: loading, filtering and summarising sales, and basket
+  analysis of the items bought together
+- ``archive``: closed years of sales moved to read-only yearly files and
+  attached again when a query needs them
+- ``branches``: sales reports across several branches' databases, computed
+  per branch in worker processes and merged
+- ``backup``: online backups that copy the live database in small steps,
+  verified, rotated and scheduled
+- ``maintenance``: statistics, incremental vacuum and a space and
+  fragmentation report, run while the database is idle
+- ``snapshot``: a copy of the sales and items for reports, refreshed
+  incrementally, with reporting indexes and precomputed columns
+- ``forecast``: sales velocity, demand forecasts, reorder points and days
+  of cover for every item
+- ``report_cache``: sales reports kept between requests and brought up to
+  date with only the sales added since
+- ``service`` / ``client``: a local JSON service that owns the database, and
+  the client the apps use in client mode (STORE_SERVICE)
+
+Errors meant for the user are raised as ``StoreError`` subclasses whose
+message can be shown as is.
+"""
+
+from store_core.errors import (
+    ConflictError,
+    DuplicateNameError,
+    InsufficientStockError,
+    PaymentError,
+    StoreError,
+    ValidationError,
+)
+
+__all__ = [
+    "ConflictError",
+    "DuplicateNameError",
+    "InsufficientStockError",
+    "PaymentError",
+    "StoreError",
+    "ValidationError",
+]
@@ -0,0 +1,263 @@
+"""Loading, filtering and summarising sales."""
+
+import datetime
+import heapq
+from collections import Counter
+
+from store_core.archive import attach_archives
+from store_core.db import TIMESTAMP_FORMAT, connect
+
+# Pairs bought together in fewer sales than this share are left out of
+# basket rules; their lift is mostly noise
+MIN_PAIR_SUPPORT = 0.001
+BASKET_RANKINGS = ("lift", "support", "confidence")
+
+
+def period_filter(year, month, day):
+    """Returns (sql, params) selecting the sales of a period.
+
+    Empty parts match anything, as in filter_sales. When the year is known
+    the period becomes a timestamp range, which the sales_timestamp index
+    can serve; other parts are compared as text.
+    """
+    clauses = []
+    params = []
+    try:
+        if year:
+            if month:
+                start = datetime.datetime(int(year), int(month), int(day) if day else 1)
+                if day:
+                    end = start + datetime.timedelta(days=1)
+                elif start.month == 12:
+                    end = start.replace(year=start.year + 1, month=1)
+                else:
+                    end = start.replace(month=start.month + 1)
+            else:
+                start = datetime.datetime(int(year), 1, 1)
+                end = start.replace(year=start.year + 1)
+            clauses.append("timestamp >= ? AND timestamp < ?")
+            params += [start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)]
+        elif month:
+            clauses.append("substr(timestamp, 6, 2) = ?")
+            params.append(f"{int(month):02d}")
+        if day and not (year and month):
+            clauses.append("substr(timestamp, 9, 2) = ?")
+            params.append(f"{int(day):02d}")
+    except ValueError:
+        return "0", []  # No such date, e.g. 31 February
+    return " AND ".join(clauses) or "1", params
+
+
+def load_sales(database_path, year="", month="", day=""):
+    """Loads the sales of a period (default: all) as dicts with parsed timestamps.
+
+    Archived years are read from their archives; see archive.attach_archives.
+    """
+    sales = []
+    where, params = period_filter(year, month, day)
+    conn = connect(database_path)
+    source = attach_archives(conn, database_path, year)
+    for row in conn.execute(f"SELECT * FROM {source} WHERE {where}", params):
+        sales.append(
+            {
+                "id": row[0],
+                "timestamp": datetime.datetime.strptime(row[1], TIMESTAMP_FORMAT),
+                "items": row[2],
+                "total": row[3],
+            }
+        )
+    conn.close()
+    return sales
+
+
+def filter_sales(sales, year, month, day):
+    """Keeps the sales in the given period; empty parts match anything."""
+    filtered_sales = []
+    for sale in sales:
+        if year and sale["timestamp"].year != int(year):
+            continue
+        if month and sale["timestamp"].month != int(month):
+            continue
+        if day and sale["timestamp"].day != int(day):
+            continue
+        filtered_sales.append(sale)
+    return filtered_sales
+
+
+def fetch_sales_page(database_path, year, month, day, after=None, limit=500):
+    """Returns up to ``limit`` sales of a period as (id, timestamp, items, total) rows.
+
+    Rows come in (timestamp, id) order, starting after the (timestamp, id)
+    key ``after``. Unlike OFFSET, seeking to the key costs the same on the
+    last page as on the first.
+    """
+    where, params = period_filter(year, month, day)
+    if after is not None:
+        where += " AND (timestamp, id) > (?, ?)"
+        params += list(after)
+    conn = connect(database_path)
+    source = attach_archives(conn, database_path, year)
+    rows = conn.execute(
+        f"SELECT id, timestamp, items, total FROM {source} WHERE {where} ORDER BY timestamp, id LIMIT ?",
+        [*params, limit],
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def parse_sale_items(items):
+    """Splits a sales.items string into (name, quantity) pairs."""
+    lines = []
+    for item in items.split(", "):
+        item_name, quantity = item.split(" x ")
+        lines.append((item_name, int(quantity)))
+    return lines
+
+
+def summarize_sales(sales):
+    """Returns the totals shown by the sales analysis report."""
+    total_sales = sum(sale["total"] for sale in sales)
+    item_counts = {}
+    for sale in sales:
+        for item_name, quantity in parse_sale_items(sale["items"]):
+            item_counts[item_name] = item_counts.get(item_name, 0) + quantity
+    return {
+        "count": len(sales),
+        "total_sales": total_sales,
+        "average_sale": total_sales / len(sales) if sales else 0.0,
+        "item_counts": item_counts,
+    }
+
+
+def merge_summaries(first, second):
+    """Combines the summaries of two disjoint sets of sales."""
+    count = first["count"] + second["count"]
+    total_sales = first["total_sales"] + second["total_sales"]
+    item_counts = dict(first["item_counts"])
+    for item_name, quantity in second["item_counts"].items():
+        item_counts[item_name] = item_counts.get(item_name, 0) + quantity
+    return {
+        "count": count,
+        "total_sales": total_sales,
+        "average_sale": total_sales / count if count else 0.0,
+        "item_counts": item_counts,
+    }
+
+
+def summarize_days(sales):
+    """Sales count and revenue per day ("YYYY-MM-DD"), in date order.
+
+    Sales need a "day" key; see report_cache.
+    """
+    days = {}
+    for sale in sales:
+        count, total = days.get(sale["day"], (0, 0.0))
+        days[sale["day"]] = (count + 1, total + sale["total"])
+    return {day: {"count": count, "total": total} for day, (count, total) in sorted(days.items())}
+
+
+def merge_days(first, second):
+    """Combines two per-day series of disjoint sales."""
+    days = dict(first)
+    for day, values in second.items():
+        if day in days:
+            days[day] = {key: days[day][key] + values[key] for key in ("count", "total")}
+        else:
+            days[day] = values
+    return dict(sorted(days.items()))
+
+
+def summarize_baskets(sales):
+    """Counts which items are bought together, for basket_rules.
+
+    Returns {"baskets": number of sales, "items": {item: sales with it},
+    "pairs": {item: {other: sales with both}}}. Each pair is counted once,
+    under the name that sorts first, and only pairs that occur are kept, so
+    the matrix stays as sparse as the sales.
+    """
+    items = Counter()
+    pairs = {}
+    for sale in sales:
+        names = sorted({item_name for item_name, _ in parse_sale_items(sale["items"])})
+        items.update(names)
+        for index in range(len(names) - 1):
+            row = pairs.get(names[index])
+            if row is None:
+                row = pairs[names[index]] = Counter()
+            row.update(names[index + 1:])
+    return {"baskets": len(sales), "items": dict(items), "pairs": {name: dict(row) for name, row in pairs.items()}}
+
+
+def merge_baskets(first, second):
+    """Combines the basket counts of two disjoint sets of sales."""
+    items = Counter(first["items"])
+    items.update(second["items"])
+    pairs = dict(first["pairs"])
+    for name, row in second["pairs"].items():
+        merged = Counter(pairs.get(name, {}))
+        merged.update(row)
+        pairs[name] = dict(merged)
+    return {"baskets": first["baskets"] + second["baskets"], "items": dict(items), "pairs": pairs}
+
+
+def basket_rules(baskets, top=20, by="lift", min_support=MIN_PAIR_SUPPORT):
+    """The ``top`` pairs of items bought together, ranked ``by`` one of BASKET_RANKINGS.
+
+    For a pair (first, second) bought together in ``count`` of N sales:
+    support is count / N, confidence is the share of sales with ``first``
+    that also have ``second`` (reverse_confidence the other way round) and
+    lift is how much more often they go together than by chance. Returns
+    {"baskets": N, "rules": [...]}.
+    """
+    total = baskets["baskets"]
+    items = baskets["items"]
+    min_count = max(1, min_support * total)
+    if by not in BASKET_RANKINGS:
+        raise ValueError(f"Unknown ranking: {by}")
+
+    def rules():
+        for name, row in baskets["pairs"].items():
+            for other, count in row.items():
+                if count < min_count:
+                    continue
+                # The direction with the higher confidence leads
+                first, second = (other, name) if items[other] < items[name] else (name, other)
+                yield {
+                    "first": first,
+                    "second": second,
+                    "count": count,
+                    "support": count / total,
+                    "confidence": count / items[first],
+                    "reverse_confidence": count / items[second],
+                    "lift": count * total / (items[first] * items[second]),
+                }
+
+    return {"baskets": total, "rules": heapq.nlargest(top, rules(), key=lambda rule: (rule[by], rule["count"]))}
+
+
+def format_basket_rules(report):
+    if not report["rules"]:
+        return "No items are bought together often enough in this period."
+    results_str = f"Bought Together ({report['baskets']} sales):\n"
+    for rule in report["rules"]:
+        results_str += (
+            f"{rule['first']} + {rule['second']}: {rule['count']} sales ({rule['support']:.1%}), "
+            f"{rule['confidence']:.0%} of {rule['first']} sales, lift {rule['lift']:.2f}\n"
+        )
+    return results_str
+
+
+def format_summary(summary):
+    results_str = f"Total Sales: EG {summary['total_sales']:.2f}\nAverage Sale: EG {summary['average_sale']:.2f}\n\nSales per Item:\n"
+    for item, count in summary["item_counts"].items():
+        results_str += f"{item}: {count}\n"
+    return results_str
+
+
+def format_sale(sale):
+    return f"{sale['timestamp'].strftime(TIMESTAMP_FORMAT)} - {sale['items']} - EG {sale['total']:.2f}"
+
+
+def format_sale_row(row):
+    """format_sale for a fetch_sales_page row; the timestamp is already text."""
+    return f"{row[1]} - {row[2]} - EG {row[3]:.2f}"
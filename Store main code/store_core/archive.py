@@ -0,0 +1,224 @@
+"""Yearly archives of old sales.
+
+store.db keeps the sales of the current year. ``archive_closed_years`` moves
+every earlier year into a file of its own next to it
+(``<database>.sales-<year>.db``). The archive is built in a temporary file,
+written in id order, vacuumed, made read-only and renamed into place; only
+then are the year's rows deleted from store.db, in small writer batches so
+checkout never waits long. A crash at any point leaves either the old state
+or a complete archive whose rows are still in store.db as well; queries
+ignore those (see below) and the next run deletes them.
+
+Readers never open archives themselves: ``attach_archives`` attaches the
+archives a period needs to a connection, read-only and immutable, and
+returns a table expression to select from in place of ``sales``. Rows of an
+archived year that are still in store.db are skipped if their id is in the
+archive; rows with a higher id (a till journal replayed late) are included
+and picked up by the next archiving run, which then rebuilds that year's
+archive.
+
+SQLite attaches at most 10 databases to a connection, so a query that
+spans every year (a month without a year) works for up to ten archived
+years.
+
+Run it with ``python -m store_core.archive --database store.db``.
+"""
+
+import argparse
+import datetime
+import glob
+import logging
+import os
+import re
+import sqlite3
+from urllib.parse import quote
+
+from store_core import storage
+from store_core.db import TIMESTAMP_FORMAT, connect
+from store_core.writer import write
+
+DELETE_CHUNK = 5000  # rows per writer transaction
+COLUMNS = "id, timestamp, items, total, journal_key"
+
+logger = logging.getLogger("store.archive")
+
+
+def archive_path(database_path, year):
+    return f"{database_path}.sales-{int(year)}.db"
+
+
+def archived_years(database_path):
+    """The years that have an archive next to ``database_path``."""
+    years = []
+    for path in glob.glob(glob.escape(database_path) + ".sales-*.db"):
+        match = re.search(r"\.sales-(\d{4})\.db$", path)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def archived_keys(database_path, entries):
+    """The journal keys of ``entries`` whose sale is in an archive.
+
+    ``entries`` are journal entries (see ``journal``); only the archives of
+    the years they were made in are opened.
+    """
+    keys_by_year = {}
+    for entry in entries:
+        keys_by_year.setdefault(int(entry["timestamp"][:4]), []).append(entry["key"])
+    found = set()
+    for year in set(keys_by_year) & set(archived_years(database_path)):
+        conn = sqlite3.connect(_read_only_uri(archive_path(database_path, year)), uri=True)
+        try:
+            for key in keys_by_year[year]:  # One seek each in sales_journal_key
+                if conn.execute("SELECT 1 FROM sales WHERE journal_key = ?", (key,)).fetchone():
+                    found.add(key)
+        finally:
+            conn.close()
+    return found
+
+
+def _year_range(year):
+    start = datetime.datetime(int(year), 1, 1)
+    return start.strftime(TIMESTAMP_FORMAT), start.replace(year=start.year + 1).strftime(TIMESTAMP_FORMAT)
+
+
+def _read_only_uri(path):
+    return "file:" + quote(os.path.abspath(path)) + "?mode=ro&immutable=1"
+
+
+def attach_archives(conn, database_path, year=""):
+    """Attaches the archives a period needs; returns what to select from.
+
+    The result is ``sales`` when no archive is involved, so queries on the
+    current year cost nothing extra. Otherwise it is a UNION ALL of
+    store.db and the archives with the same columns as ``sales``. Must be
+    called outside a transaction.
+    """
+    years = archived_years(database_path)
+    if year:
+        try:
+            years = [archived for archived in years if archived == int(year)]
+        except ValueError:
+            years = []
+    if not years:
+        return "sales"
+
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    hot_filters = []
+    archives = []
+    for archived in years:
+        schema = f"sales_{archived}"
+        if schema not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (_read_only_uri(archive_path(database_path, archived)),))
+        start, end = _year_range(archived)
+        hot_filters.append(
+            f"NOT (timestamp >= '{start}' AND timestamp < '{end}'"
+            f" AND id <= (SELECT coalesce(max(id), 0) FROM {schema}.sales))"
+        )
+        archives.append(f"SELECT {COLUMNS} FROM {schema}.sales")
+    hot = f"SELECT {COLUMNS} FROM main.sales WHERE " + " AND ".join(hot_filters)
+    return "(" + " UNION ALL ".join([hot, *archives]) + ")"
+
+
+def _delete_archived(conn, start, end, max_id, limit):
+    return conn.execute(
+        "DELETE FROM sales WHERE id IN"
+        " (SELECT id FROM sales WHERE timestamp >= ? AND timestamp < ? AND id <= ? LIMIT ?)",
+        (start, end, max_id, limit),
+    ).rowcount
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Directories cannot be fsync'd on every platform
+    finally:
+        os.close(fd)
+
+
+def archive_year(database_path, year):
+    """Moves the sales of ``year`` out of store.db; returns how many moved."""
+    start, end = _year_range(year)
+    path = archive_path(database_path, year)
+    building = path + ".tmp"
+    if os.path.exists(building):
+        os.remove(building)  # Left by an interrupted run
+
+    conn = sqlite3.connect(building, uri=True)
+    try:
+        # A throwaway file until it is renamed, so no journal is needed
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(
+            "CREATE TABLE sales (id INTEGER PRIMARY KEY, timestamp DATETIME NOT NULL,"
+            " items TEXT NOT NULL, total REAL NOT NULL, journal_key TEXT)"
+        )
+        archived_max_id = 0
+        if os.path.exists(path):
+            conn.execute("ATTACH DATABASE ? AS old", (_read_only_uri(path),))
+            conn.execute(f"INSERT INTO sales SELECT {COLUMNS} FROM old.sales ORDER BY id")
+            archived_max_id = conn.execute("SELECT coalesce(max(id), 0) FROM sales").fetchone()[0]
+            conn.commit()
+            conn.execute("DETACH DATABASE old")
+        conn.execute("ATTACH DATABASE ? AS hot", (os.path.abspath(database_path),))
+        moved = conn.execute(
+            f"INSERT INTO sales SELECT {COLUMNS} FROM hot.sales"
+            " WHERE timestamp >= ? AND timestamp < ? AND id > ? ORDER BY id",
+            (start, end, archived_max_id),
+        ).rowcount
+        conn.commit()
+        conn.execute("DETACH DATABASE hot")
+        max_id = conn.execute("SELECT coalesce(max(id), 0) FROM sales").fetchone()[0]
+        if moved:
+            conn.execute("CREATE INDEX sales_timestamp ON sales (timestamp)")
+            conn.execute("CREATE INDEX sales_journal_key ON sales (journal_key)")
+            conn.commit()
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    if moved:
+        _fsync(building)
+        os.chmod(building, 0o444)
+        if os.path.exists(path):
+            os.chmod(path, 0o644)  # Windows will not replace a read-only file
+        os.replace(building, path)
+        _fsync(os.path.dirname(os.path.abspath(path)))
+    else:
+        os.remove(building)
+
+    # Whatever store.db still holds of the year up to max_id is in the archive
+    while max_id and write(database_path, _delete_archived, start, end, max_id, DELETE_CHUNK) == DELETE_CHUNK:
+        pass
+    return moved
+
+
+def archive_closed_years(database_path, today=None):
+    """Archives every year before the current one; returns {year: rows moved}."""
+    current_year_start = _year_range((today or datetime.date.today()).year)[0]
+    conn = connect(database_path)
+    years = [
+        row[0]
+        for row in conn.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 4) FROM sales WHERE timestamp < ?", (current_year_start,)
+        )
+    ]
+    conn.close()
+    return {int(year): archive_year(database_path, year) for year in years}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.archive", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    storage.use_profile("back_office")
+    for year, moved in archive_closed_years(args.database).items():
+        logger.info("%d: %d sales moved to %s", year, moved, archive_path(args.database, year))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Online backups of store.db while the tills keep selling.
+
+``backup`` copies the live database with SQLite's backup API into
+``backups/`` next to it. The copy is taken from one read snapshot, so it is
+exactly the database as of the moment it started. In WAL mode a reader never
+blocks a writer, and writes committed meanwhile do not make the copy start
+over. The pages are copied STEP_PAGES at a time with a short sleep in
+between, so the backup takes only a small share of the disk from the tills.
+
+The copy is switched out of WAL mode, checked with ``PRAGMA integrity_check``
+and only then renamed to ``<name>-<YYYYmmdd-HHMMSS>.db``. The newest KEEP
+copies are kept and older ones removed. Sales archives (see ``archive``)
+never change once written, so each is copied into the folder once.
+
+Each run returns a report with its duration and the longest single step.
+The longest step is the longest time the snapshot was being read without a
+pause, i.e. the worst stall the copy itself could cause. The
+``checkout-load --backup`` benchmark measures the effect on real tills.
+
+``backup_if_due`` is the scheduler: the management app and the service call
+it periodically and it backs up when the newest copy is older than
+STORE_BACKUP_INTERVAL_H hours (default 24).
+
+Run it by hand with ``python -m store_core.backup --database store.db``.
+"""
+
+import argparse
+import datetime
+import glob
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+from store_core import archive, errors, storage
+from store_core.db import connect
+
+STEP_PAGES = 256  # 1 MiB with 4 KiB pages
+STEP_SLEEP = 0.01  # seconds between steps
+KEEP = 7
+BACKUP_INTERVAL = float(os.environ.get("STORE_BACKUP_INTERVAL_H", "24")) * 3600  # seconds
+
+logger = logging.getLogger("store.backup")
+
+
+class BackupError(errors.StoreError):
+    """A backup copy failed its integrity check."""
+
+
+def backup_dir_for(database_path):
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)), "backups")
+
+
+def _stem(database_path):
+    return os.path.splitext(os.path.basename(database_path))[0]
+
+
+def list_backups(database_path, backup_dir=None):
+    """Paths of the backups of ``database_path``, oldest first."""
+    backup_dir = backup_dir or backup_dir_for(database_path)
+    pattern = re.compile(re.escape(_stem(database_path)) + r"-\d{8}-\d{6}\.db$")
+    paths = glob.glob(os.path.join(glob.escape(backup_dir), "*.db"))
+    return sorted(path for path in paths if pattern.match(os.path.basename(path)))
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Directories cannot be fsync'd on every platform
+    finally:
+        os.close(fd)
+
+
+def _copy_archives(database_path, backup_dir):
+    for year in archive.archived_years(database_path):
+        path = archive.archive_path(database_path, year)
+        target = os.path.join(backup_dir, os.path.basename(path))
+        stat = os.stat(path)
+        if os.path.exists(target):
+            copied = os.stat(target)
+            if (copied.st_size, copied.st_mtime) == (stat.st_size, stat.st_mtime):
+                continue
+            os.chmod(target, 0o644)
+        shutil.copy2(path, target + ".tmp")
+        os.replace(target + ".tmp", target)
+
+
+def backup(database_path, backup_dir=None, keep=KEEP, pages=STEP_PAGES, sleep=STEP_SLEEP):
+    """Backs up the live database; returns a report of the run.
+
+    Raises BackupError, and keeps no copy, if the copy is not intact.
+    """
+    started = time.perf_counter()
+    backup_dir = backup_dir or backup_dir_for(database_path)
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(backup_dir, f"{_stem(database_path)}-{stamp}.db")
+    building = target + ".tmp"
+    if os.path.exists(building):
+        os.remove(building)
+
+    steps = []
+    step_started = time.perf_counter()
+
+    def progress(status, remaining, total):
+        nonlocal step_started
+        steps.append((time.perf_counter() - step_started, total))
+        time.sleep(sleep)
+        step_started = time.perf_counter()
+
+    source = connect(database_path)
+    destination = sqlite3.connect(building)
+    try:
+        # Pin one snapshot for the whole copy; without it every commit by a
+        # till would restart the backup from the first page.
+        source.isolation_level = None
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        try:
+            source.backup(destination, pages=pages, progress=progress)
+        finally:
+            source.execute("COMMIT")
+        copied = time.perf_counter()
+        # A standalone copy: no -wal/-shm files next to it
+        destination.execute("PRAGMA journal_mode = DELETE")
+        problems = [row[0] for row in destination.execute("PRAGMA integrity_check")]
+    finally:
+        destination.close()
+        source.close()
+    if problems != ["ok"]:
+        os.remove(building)
+        raise BackupError(f"The backup of {database_path} failed its integrity check: {problems[0]}")
+    checked = time.perf_counter()
+
+    _fsync(building)
+    os.replace(building, target)
+    _fsync(backup_dir)
+    _copy_archives(database_path, backup_dir)
+    removed = list_backups(database_path, backup_dir)[:-keep] if keep else []
+    for path in removed:
+        os.remove(path)
+
+    return {
+        "path": target,
+        "pages": steps[-1][1] if steps else 0,
+        "bytes": os.path.getsize(target),
+        "steps": len(steps),
+        "duration": time.perf_counter() - started,
+        "copy_time": copied - started,
+        "check_time": checked - copied,
+        "longest_step": max((duration for duration, _ in steps), default=0.0),
+        "removed": removed,
+    }
+
+
+def backup_if_due(database_path, backup_dir=None, interval=BACKUP_INTERVAL, keep=KEEP):
+    """Backs up when the newest backup is older than ``interval`` seconds.
+
+    Returns the report, or None when no backup was due.
+    """
+    backups = list_backups(database_path, backup_dir)
+    if backups and time.time() - os.path.getmtime(backups[-1]) < interval:
+        return None
+    report = backup(database_path, backup_dir, keep)
+    logger.info(
+        "backed up %s to %s in %.1f s (%d steps, longest %.0f ms)",
+        database_path,
+        report["path"],
+        report["duration"],
+        report["steps"],
+        report["longest_step"] * 1000,
+    )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.backup", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    parser.add_argument("--dir", help="where backups go (default: backups/ next to the database)")
+    parser.add_argument("--keep", type=int, default=KEEP, help="number of backups to keep")
+    args = parser.parse_args(argv)
+    storage.use_profile("back_office")
+    report = backup(args.database, args.dir, args.keep)
+    print(f"{report['path']}: {report['bytes']} bytes in {report['duration']:.2f} s")
+    print(
+        f"copy {report['copy_time']:.2f} s in {report['steps']} steps (longest {report['longest_step'] * 1000:.1f} ms), "
+        f"integrity check {report['check_time']:.2f} s"
+    )
+    for path in report["removed"]:
+        print(f"removed {path}")
+
+
+if __name__ == "__main__":
+    main()
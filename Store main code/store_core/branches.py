@@ -0,0 +1,144 @@
+"""Consolidated sales reports across the branches' databases.
+
+Each shop keeps its own store.db. Head office lists them in STORE_BRANCHES
+(paths or glob patterns separated by the platform's path separator, ``:``
+or ``;``), and ``consolidate`` reports on all of them together.
+
+Every branch is read in a worker process, one per CPU core, through the
+same report cache the single-store reports use (see ``report_cache``). A
+worker returns only partial aggregates for its branch: the summary
+(revenue, sale count, units per item) and the per-day series. The parent
+merges them with the same functions the cache uses to fold in new sales,
+so a consolidated report equals the report of one database holding all the
+branches' sales.
+
+Workers stay alive between reports, and so do their caches. Each worker is
+a pool of its own and a branch always goes to the same one, so asking again
+only reads the sales added since, as it does for a single store.
+
+From the command line::
+
+    python -m store_core.branches --year 2024 shop-a/store.db shop-b/store.db
+"""
+
+import argparse
+import atexit
+import glob
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+from store_core import analytics, report_cache, storage
+
+DEFAULT_REPORTS = ("summary", "daily")
+
+_workers = []  # single-process pools; branch i runs in _workers[i % len]
+_workers_lock = threading.Lock()
+
+
+def branches_from_env():
+    """The branch databases named in STORE_BRANCHES, in order."""
+    paths = []
+    for entry in os.environ.get("STORE_BRANCHES", "").split(os.pathsep):
+        if not entry:
+            continue
+        matches = sorted(glob.glob(entry)) if glob.has_magic(entry) else [entry]
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def branch_name(database_path):
+    """A short name for a branch: its folder, or its file name without .db."""
+    folder, name = os.path.split(os.path.abspath(database_path))
+    stem = os.path.splitext(name)[0]
+    return os.path.basename(folder) if stem == "store" else stem
+
+
+def branch_report(database_path, year="", month="", day="", reports=DEFAULT_REPORTS):
+    """Partial aggregates for one branch; runs in a worker process."""
+    return {report: report_cache.get_report(database_path, report, year, month, day) for report in reports}
+
+
+def _start_workers(count):
+    with _workers_lock:
+        if len(_workers) != count:
+            for worker in _workers:
+                worker.shutdown()
+            # spawn, not fork: the apps run Qt and writer threads
+            context = multiprocessing.get_context("spawn")
+            _workers[:] = [ProcessPoolExecutor(1, mp_context=context) for _ in range(count)]
+        return list(_workers)
+
+
+def shutdown():
+    """Stops the worker processes."""
+    with _workers_lock:
+        for worker in _workers:
+            worker.shutdown()
+        _workers.clear()
+
+
+atexit.register(shutdown)
+
+
+def consolidate(database_paths, year="", month="", day="", workers=None, reports=DEFAULT_REPORTS):
+    """Reports on the sales of every branch in a period, together.
+
+    Returns {"branches": {name: partial}} plus each of ``reports`` (names in
+    report_cache.REPORTS) merged across the branches; by default "summary"
+    and the per-day series "daily". ``workers`` defaults to one per core;
+    with one worker (or one branch) everything runs in this process.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(database_paths)) or 1
+    period = (year, month, day)
+    if workers == 1:
+        partials = [branch_report(path, *period, reports) for path in database_paths]
+    else:
+        pool = _start_workers(workers)
+        futures = [
+            pool[index % workers].submit(branch_report, path, *period, reports)
+            for index, path in enumerate(database_paths)
+        ]
+        partials = [future.result() for future in futures]
+
+    consolidated = {"branches": {branch_name(path): partial for path, partial in zip(database_paths, partials)}}
+    for report in reports:
+        compute, merge = report_cache.REPORTS[report]
+        consolidated[report] = reduce(merge, (partial[report] for partial in partials), compute([]))
+    return consolidated
+
+
+def format_consolidated(report):
+    """The consolidated summary followed by each branch's revenue."""
+    text = analytics.format_summary(report["summary"])
+    text += "\nRevenue per Branch:\n"
+    for name, partial in report["branches"].items():
+        text += f"{name}: EG {partial['summary']['total_sales']:.2f} ({partial['summary']['count']} sales)\n"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.branches", description=__doc__.splitlines()[0])
+    parser.add_argument("databases", nargs="*", help="branch databases (default: STORE_BRANCHES)")
+    parser.add_argument("--year", default="")
+    parser.add_argument("--month", default="")
+    parser.add_argument("--day", default="")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--daily", action="store_true", help="also print the per-day series")
+    args = parser.parse_args(argv)
+    paths = args.databases or branches_from_env()
+    if not paths:
+        parser.error("no branch databases given and STORE_BRANCHES is not set")
+    storage.use_profile("back_office")
+    report = consolidate(paths, args.year, args.month, args.day, args.workers)
+    print(format_consolidated(report), end="")
+    if args.daily:
+        print("\nPer Day:")
+        for day, values in report["daily"].items():
+            print(f"{day}: EG {values['total']:.2f} ({values['count']} sales)")
+
+
+if __name__ == "__main__":
+    main()
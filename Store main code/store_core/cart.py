@@ -0,0 +1,30 @@
+"""Cart bookkeeping and pricing.
+
+A cart is a plain dict of {product id: quantity} and ``products`` the
+{id: product dict} catalog the till works from (see catalog.load_products).
+"""
+
+from store_core.errors import InsufficientStockError, ValidationError
+
+
+def add_to_cart(cart, products, product_id, quantity):
+    """Adds ``quantity`` of a product, reserving it from the local stock."""
+    if quantity <= 0:
+        raise ValidationError("Invalid quantity. Please enter a positive number.")
+    product = products[product_id]
+    if product['quantity'] < quantity:
+        raise InsufficientStockError(product['name'], product['quantity'])
+    cart[product_id] = cart.get(product_id, 0) + quantity
+    product['quantity'] -= quantity
+
+
+def cart_total(cart, products):
+    total = 0
+    for product_id, quantity in cart.items():
+        total += products[product_id]['price'] * quantity
+    return total
+
+
+def describe_cart(cart, products):
+    """Returns the cart as stored in sales.items: "name x qty, name x qty"."""
+    return ', '.join(f"{products[product_id]['name']} x {quantity}" for product_id, quantity in cart.items())
@@ -0,0 +1,237 @@
+"""Items: validation, lookup and edits."""
+
+import sqlite3
+
+from store_core import stock
+from store_core.db import connect
+from store_core.errors import ConflictError, DuplicateNameError, ValidationError
+from store_core.writer import write
+
+# Columns of the items table that can be edited in place, with their types
+EDITABLE_COLUMNS = {"name": str, "price": float, "quantity": int}
+# Ids per DELETE; SQLite before 3.32 allows at most 999 parameters
+DELETE_CHUNK = 500
+
+
+def validate_item(name, price, quantity):
+    """Checks form input for an item and returns it as (name, price, quantity).
+
+    ``price`` and ``quantity`` may be strings as typed; both must be positive.
+    """
+    if not all([name, price, quantity]):
+        raise ValidationError("Please fill all fields.")
+    try:
+        price = float(price)
+        if price <= 0:
+            raise ValueError
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError
+    except ValueError:
+        raise ValidationError("Invalid price or quantity format. Must be positive.")
+    return name, price, quantity
+
+
+def list_items(database_path):
+    """Returns every item row, ordered by id.
+
+    Rows are (id, name, price, quantity, version).
+    """
+    conn = connect(database_path)
+    items = conn.execute("SELECT * FROM items ORDER BY id").fetchall()
+    conn.close()
+    return items
+
+
+def search_items(database_path, term):
+    """Returns the items whose name contains ``term`` or whose id is ``term``."""
+    conn = connect(database_path)
+    items = conn.execute(
+        "SELECT * FROM items WHERE name LIKE ? OR id = ?",
+        (f"%{term}%", term),
+    ).fetchall()
+    conn.close()
+    return items
+
+
+def get_item(database_path, item_id):
+    conn = connect(database_path)
+    item = conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone()
+    conn.close()
+    return item
+
+
+def product_from_row(row):
+    return {'id': row[0], 'name': row[1], 'price': row[2], 'quantity': row[3]}
+
+
+def load_products(database_path):
+    """Returns every item as a product dict keyed by id."""
+    conn = connect(database_path)
+    products = {row[0]: product_from_row(row) for row in conn.execute("SELECT * FROM items")}
+    conn.close()
+    return products
+
+
+def load_quantities(database_path):
+    """Returns the current stock of every item as {id: quantity}."""
+    conn = connect(database_path)
+    quantities = dict(conn.execute("SELECT id, quantity FROM items"))
+    conn.close()
+    return quantities
+
+
+def add_item(database_path, name, price, quantity):
+    """Validates and inserts one item; returns its id."""
+    name, price, quantity = validate_item(name, price, quantity)
+
+    def insert(conn):
+        try:
+            cursor = conn.execute(
+                "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
+                (name, price, quantity),
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateNameError(name)
+        stock.record_moves(conn, [(cursor.lastrowid, quantity, "restock")])
+        return cursor.lastrowid
+
+    return write(database_path, insert)
+
+
+def add_items(database_path, items):
+    """Inserts already validated (name, price, quantity) rows in one transaction.
+
+    Nothing is inserted if any name is taken.
+    """
+    def insert(conn):
+        moves = []
+        for name, price, quantity in items:
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?)",
+                    (name, price, quantity),
+                )
+            except sqlite3.IntegrityError:
+                raise DuplicateNameError(
+                    name,
+                    f"An item with the name '{name}' already exists in the database.",
+                )
+            moves.append((cursor.lastrowid, quantity, "restock"))
+        stock.record_moves(conn, moves)
+
+    write(database_path, insert)
+
+
+def _update_row(conn, assignments, params, item_id, version):
+    """Updates one item and bumps its version; returns the new version.
+
+    With ``version`` the row is only written if it still has that version,
+    so a form never overwrites changes made after it was filled in (such
+    as stock sold at a till). Raises ConflictError otherwise.
+
+    A change of quantity goes into the stock ledger as a restock or an
+    adjustment.
+    """
+    before = conn.execute("SELECT quantity FROM items WHERE id = ?", (item_id,)).fetchone()
+    sql = f"UPDATE items SET {assignments}, version = version + 1 WHERE id = ?"
+    params = [*params, item_id]
+    if version is not None:
+        sql += " AND version = ?"
+        params.append(version)
+    if not conn.execute(sql, params).rowcount and version is not None:
+        raise ConflictError(conn.execute("SELECT * FROM items WHERE id = ?", (item_id,)).fetchone())
+    row = conn.execute("SELECT version, quantity FROM items WHERE id = ?", (item_id,)).fetchone()
+    if row is None:
+        return None
+    change = row[1] - before[0]
+    if change:
+        stock.record_moves(conn, [(item_id, change, stock.reason_for(change))])
+    return row[0]
+
+
+def update_item(database_path, item_id, name, price, quantity, version=None):
+    """Validates and saves every field of an item; returns its new version.
+
+    Pass the ``version`` the item had when it was loaded to refuse the
+    write (ConflictError) if it has changed since.
+    """
+    name, price, quantity = validate_item(name, price, quantity)
+
+    def update(conn):
+        try:
+            return _update_row(conn, "name = ?, price = ?, quantity = ?", (name, price, quantity), item_id, version)
+        except sqlite3.IntegrityError:
+            raise DuplicateNameError(name)
+
+    return write(database_path, update)
+
+
+def update_field(database_path, item_id, column, value, version=None):
+    """Saves a single edited column ("name", "price" or "quantity").
+
+    ``version`` works as for update_item; returns the new version.
+    """
+    try:
+        value = EDITABLE_COLUMNS[column](value)
+    except ValueError:
+        raise ValidationError("Invalid data format.")
+
+    def update(conn):
+        try:
+            # column is one of EDITABLE_COLUMNS, never user text
+            return _update_row(conn, f"{column} = ?", (value,), item_id, version)
+        except sqlite3.IntegrityError:
+            raise DuplicateNameError(value)
+
+    return write(database_path, update)
+
+
+def set_quantity(database_path, item_id, quantity):
+    write(database_path, _update_row, "quantity = ?", (quantity,), item_id, None)
+
+
+def delete_item(database_path, item_id):
+    def delete(conn):
+        conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+        stock.forget_items(conn, [item_id])
+
+    write(database_path, delete)
+
+
+def delete_items(database_path, item_ids):
+    """Deletes many items in one transaction; returns how many were deleted."""
+    try:
+        item_ids = [int(item_id) for item_id in item_ids]
+    except ValueError:
+        raise ValidationError("Invalid item id.")
+
+    def delete(conn):
+        deleted = 0
+        for start in range(0, len(item_ids), DELETE_CHUNK):
+            chunk = item_ids[start:start + DELETE_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            deleted += conn.execute(f"DELETE FROM items WHERE id IN ({placeholders})", chunk).rowcount
+            stock.forget_items(conn, chunk)
+        return deleted
+
+    return write(database_path, delete)
+
+
+def renumber_ids(database_path):
+    """Closes the gaps left by deleted items so ids run 1..n again.
+
+    Returns True if there are items left.
+    """
+    def renumber(conn):
+        ids = conn.execute("SELECT id FROM items ORDER BY id").fetchall()
+        if ids:
+            for i, (id,) in enumerate(ids):
+                if i + 1 != id:
+                    conn.execute("UPDATE items SET id = ?, version = version + 1 WHERE id = ?", (i + 1, id))
+                    stock.renumber_item(conn, id, i + 1)
+            max_id = len(ids)
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'items'", (max_id,))
+        return bool(ids)
+
+    return write(database_path, renumber)
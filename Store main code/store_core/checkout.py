@@ -0,0 +1,49 @@
+"""Recording completed sales."""
+
+import datetime
+
+from store_core import stock
+from store_core.cart import describe_cart
+from store_core.db import TIMESTAMP_FORMAT
+from store_core.errors import InsufficientStockError, PaymentError
+from store_core.writer import write
+
+
+def change_due(total, payment_amount):
+    if payment_amount < total:
+        raise PaymentError("Insufficient payment.")
+    return payment_amount - total
+
+
+def record_sale(database_path, cart, products, total, timestamp=None):
+    """Stores a sale and takes its items out of stock in one transaction.
+
+    Stock is decremented in the database rather than overwritten from the
+    till's copy, so sales made at the same time on other tills are kept.
+    Raises InsufficientStockError, storing nothing, if an item has sold out
+    since the till loaded it. The stock ledger gets a "sale" move per item.
+    Returns the new sale id once it is on disk.
+    """
+    if timestamp is None:
+        timestamp = datetime.datetime.now()
+
+    def insert(conn):
+        stamp = timestamp.strftime(TIMESTAMP_FORMAT)
+        cursor = conn.execute(
+            "INSERT INTO sales (timestamp, items, total) VALUES (?, ?, ?)",
+            (stamp, describe_cart(cart, products), total),
+        )
+        for product_id, quantity in cart.items():
+            updated = conn.execute(
+                "UPDATE items SET quantity = quantity - ?, version = version + 1 WHERE id = ? AND quantity >= ?",
+                (quantity, product_id, quantity),
+            ).rowcount
+            if not updated:
+                row = conn.execute("SELECT quantity FROM items WHERE id = ?", (product_id,)).fetchone()
+                raise InsufficientStockError(products[product_id]['name'], row[0] if row else 0)
+        stock.record_moves(
+            conn, [(product_id, -quantity, "sale") for product_id, quantity in cart.items()], stamp, cursor.lastrowid
+        )
+        return cursor.lastrowid
+
+    return write(database_path, insert)
@@ -0,0 +1,199 @@
+"""Client for ``service``, used by the apps in client mode.
+
+Set STORE_SERVICE to ``host:port`` or ``unix:/path/to/socket`` and the
+cashier and management windows send their reads and writes to the service
+instead of opening store.db. Methods return the same shapes as the
+store_core functions they stand in for (item rows as tuples, sales with
+datetime timestamps) and raise the same StoreError subclasses.
+
+Each thread keeps its own keep-alive connection, so the GUI thread and
+background loaders can call the client at the same time.
+"""
+
+import datetime
+import http.client
+import json
+import os
+import socket
+import threading
+from urllib.parse import urlencode
+
+from store_core import catalog, errors
+from store_core.db import TIMESTAMP_FORMAT
+
+
+class ServiceError(errors.StoreError):
+    """The service could not be reached or did not understand the request."""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def error_from_payload(payload):
+    """Rebuilds the StoreError described by ``service.error_payload``."""
+    name = payload.get("error")
+    message = payload.get("message", "")
+    if name == "InsufficientStockError":
+        return errors.InsufficientStockError(payload["name"], payload["available"])
+    if name == "DuplicateNameError":
+        return errors.DuplicateNameError(payload["name"], message)
+    if name == "ConflictError":
+        return errors.ConflictError(_item(payload["current"]))
+    cls = getattr(errors, name or "", None)
+    if isinstance(cls, type) and issubclass(cls, errors.StoreError):
+        return cls(message)
+    return ServiceError(message or f"Store service error: {name}")
+
+
+def _item(row):
+    return tuple(row) if row is not None else None
+
+
+def _sale(sale):
+    return dict(sale, timestamp=datetime.datetime.strptime(sale["timestamp"], TIMESTAMP_FORMAT))
+
+
+def _period(year, month, day):
+    query = urlencode({key: value for key, value in (("year", year), ("month", month), ("day", day)) if value})
+    return "?" + query if query else ""
+
+
+class StoreClient:
+    def __init__(self, address, timeout=30):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.address.startswith("unix:"):
+                conn = UnixHTTPConnection(self.address[len("unix:"):], self.timeout)
+            else:
+                host, _, port = self.address.rpartition(":")
+                conn = http.client.HTTPConnection(host or "127.0.0.1", int(port), timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method, path, body=None, missing_ok=False):
+        """Sends one request and returns the decoded JSON reply.
+
+        With ``missing_ok`` a 404 returns None instead of raising.
+        """
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        # A kept-alive connection may have been dropped by the service. Reads are
+        # retried once on a new connection; writes are not, so a sale the
+        # service did record is never sent twice.
+        attempts = 2 if method == "GET" else 1
+        for attempt in range(attempts):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read() or b"{}")
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as exc:
+                conn.close()
+                self._local.conn = None
+                if attempt == attempts - 1:
+                    raise ServiceError(f"Cannot reach the store service at {self.address}: {exc}")
+        if response.status == 404 and missing_ok:
+            return None
+        if response.status != 200:
+            raise error_from_payload(payload)
+        return payload
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Catalog ---
+
+    def list_items(self):
+        return [_item(row) for row in self.request("GET", "/items")["items"]]
+
+    def search_items(self, term):
+        return [_item(row) for row in self.request("GET", "/items?" + urlencode({"q": term}))["items"]]
+
+    def get_item(self, item_id):
+        payload = self.request("GET", f"/items/{int(item_id)}", missing_ok=True)
+        return _item(payload["item"]) if payload else None
+
+    def load_products(self):
+        return {row[0]: catalog.product_from_row(row) for row in self.list_items()}
+
+    def load_quantities(self):
+        return {int(item_id): quantity for item_id, quantity in self.request("GET", "/quantities")["quantities"].items()}
+
+    def add_item(self, name, price, quantity):
+        return self.request("POST", "/items", {"name": name, "price": price, "quantity": quantity})["id"]
+
+    def add_items(self, items):
+        self.request("POST", "/items/batch", {"items": [list(item) for item in items]})
+
+    def update_item(self, item_id, name, price, quantity, version=None):
+        body = {"name": name, "price": price, "quantity": quantity, "version": version}
+        return self.request("PUT", f"/items/{item_id}", body)["version"]
+
+    def update_field(self, item_id, column, value, version=None):
+        body = {"column": column, "value": value, "version": version}
+        return self.request("PATCH", f"/items/{item_id}", body)["version"]
+
+    def delete_item(self, item_id):
+        self.request("DELETE", f"/items/{item_id}")
+
+    def delete_items(self, item_ids):
+        return self.request("POST", "/items/delete", {"ids": [int(item_id) for item_id in item_ids]})["deleted"]
+
+    def renumber_ids(self):
+        return self.request("POST", "/items/renumber")["items_left"]
+
+    # --- Cart and checkout ---
+
+    def price_cart(self, cart):
+        return self.request("POST", "/cart/price", {"cart": cart})["total"]
+
+    def checkout(self, cart, payment_amount):
+        """Records a sale priced by the service; returns (sale_id, total, change)."""
+        result = self.request("POST", "/checkout", {"cart": cart, "payment": payment_amount})
+        return result["sale_id"], result["total"], result["change"]
+
+    # --- Sales ---
+
+    def load_sales(self, year="", month="", day=""):
+        return [_sale(sale) for sale in self.request("GET", "/sales" + _period(year, month, day))["sales"]]
+
+    def fetch_sales_page(self, year, month, day, after=None, limit=500):
+        query = {key: value for key, value in (("year", year), ("month", month), ("day", day)) if value}
+        if after is not None:
+            query["after_timestamp"], query["after_id"] = after
+        query["limit"] = limit
+        return [tuple(row) for row in self.request("GET", "/sales/page?" + urlencode(query))["rows"]]
+
+    def sales_summary(self, year="", month="", day=""):
+        return self.request("GET", "/sales/summary" + _period(year, month, day))["summary"]
+
+    def forecast_items(self):
+        return self.request("GET", "/forecast")["items"]
+
+    def sales_basket_rules(self, year="", month="", day="", top=20, by="lift"):
+        query = {key: value for key, value in (("year", year), ("month", month), ("day", day)) if value}
+        query.update(top=top, by=by)
+        return self.request("GET", "/sales/baskets?" + urlencode(query))
+
+
+def from_env():
+    """Returns a StoreClient for STORE_SERVICE, or None to use store.db directly."""
+    address = os.environ.get("STORE_SERVICE")
+    return StoreClient(address) if address else None
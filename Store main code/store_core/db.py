@@ -0,0 +1,154 @@
+"""Database connections and schema.
+
+Every part of the apps opens ``store.db`` through ``connect`` so connection
+settings (see ``storage``) are the same everywhere.
+"""
+
+import datetime
+import sqlite3
+
+from store_core import querylog, storage
+
+# How sales.timestamp is stored
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def connect(database_path):
+    """Opens a connection configured with the current storage profile.
+
+    URI filenames are enabled so sales archives can be attached read-only
+    (see ``archive``); plain paths are opened as before.
+    """
+    timeout = storage.current_profile()["busy_timeout"] / 1000
+    if querylog.ENABLED:
+        conn = sqlite3.connect(database_path, timeout=timeout, uri=True, factory=querylog.InstrumentedConnection)
+    else:
+        conn = sqlite3.connect(database_path, timeout=timeout, uri=True)
+    storage.configure(conn, database_path)
+    return conn
+
+
+def create_schema(database_path):
+    """Creates the items and sales tables if they don't exist."""
+    conn = connect(database_path)
+    if conn.execute("SELECT 1 FROM sqlite_master").fetchone() is None:
+        # A new database frees deleted pages on request (see maintenance);
+        # in WAL mode the setting only takes effect through a VACUUM.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # Bumped by every write to the row; see catalog.update_item
+    _add_column(conn, "items", "version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME NOT NULL,
+            items TEXT NOT NULL,
+            total REAL NOT NULL,
+            journal_key TEXT
+        )
+    """)
+    _add_column(conn, "sales", "journal_key TEXT")
+    create_sales_count(conn)
+    # Serves period filters and (timestamp, id) paging; see analytics
+    conn.execute("CREATE INDEX IF NOT EXISTS sales_timestamp ON sales (timestamp)")
+    # Lets a till replay its sales journal without storing a sale twice
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS sales_journal_key ON sales (journal_key)"
+    )
+    # Small named values shared by every process; see maintenance
+    conn.execute("CREATE TABLE IF NOT EXISTS store_meta (name TEXT PRIMARY KEY, value)")
+    # The stock ledger; see stock
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_moves (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            timestamp DATETIME NOT NULL,
+            reason TEXT NOT NULL,
+            change INTEGER NOT NULL,
+            sale_id INTEGER
+        )
+    """)
+    # An item's moves after a checkpoint, without visiting the table
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS stock_moves_item ON stock_moves (item_id, id, timestamp, change)"
+    )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            item_id INTEGER NOT NULL,
+            timestamp DATETIME NOT NULL,
+            move_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (item_id, timestamp, move_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS stock_checkpoints_timestamp ON stock_checkpoints (timestamp, move_id)"
+    )
+    # Items from before the ledger start from their stock as of now; every
+    # move so far is already in their quantity
+    conn.execute(
+        "INSERT INTO stock_checkpoints (item_id, timestamp, move_id, quantity)"
+        " SELECT id, ?, (SELECT coalesce(max(id), 0) FROM stock_moves), quantity FROM items"
+        " WHERE NOT EXISTS (SELECT 1 FROM stock_checkpoints)",
+        (datetime.datetime.now().strftime(TIMESTAMP_FORMAT),),
+    )
+    conn.commit()
+    conn.close()
+
+
+def create_sales_count(conn):
+    """Keeps the number of ``sales`` rows in the one-row ``sales_count`` table.
+
+    Triggers keep it right whoever inserts or deletes, so reading the count
+    is one row instead of a walk over a whole index (see report_cache).
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sales_count (id INTEGER PRIMARY KEY CHECK (id = 1), row_count INTEGER NOT NULL)"
+    )
+    # Triggers first: a sale stored before the row exists is in the count below
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS sales_count_insert AFTER INSERT ON sales"
+        " BEGIN UPDATE sales_count SET row_count = row_count + 1; END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS sales_count_delete AFTER DELETE ON sales"
+        " BEGIN UPDATE sales_count SET row_count = row_count - 1; END"
+    )
+    conn.execute("INSERT OR IGNORE INTO sales_count (id, row_count) SELECT 1, count(*) FROM sales")
+    conn.commit()
+
+
+def _add_column(conn, table, column):
+    """Adds a column that databases made by older versions lack."""
+    name = column.split()[0]
+    if name in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+        return
+    try:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+    except sqlite3.OperationalError as exc:
+        if "duplicate column" not in str(exc):  # Another app added it first
+            raise
+
+
+def checkpoint(database_path, mode="PASSIVE", busy_timeout=None):
+    """Checkpoints the WAL of ``database_path``; see storage.checkpoint.
+
+    ``busy_timeout`` (milliseconds) overrides the profile's, for callers
+    that would rather give up than wait for the tills.
+    """
+    conn = connect(database_path)
+    try:
+        if busy_timeout is not None:
+            conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        return storage.checkpoint(conn, mode)
+    finally:
+        conn.close()
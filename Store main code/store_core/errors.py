@@ -0,0 +1,48 @@
+"""Errors raised by the store core.
+
+The message of every error is written for the person at the till or in the
+back office, so the GUI can show ``str(exc)`` directly.
+"""
+
+
+class StoreError(Exception):
+    """Base class for errors the user can act on."""
+
+
+class ValidationError(StoreError):
+    """Input that cannot be stored, such as a negative price."""
+
+
+class DuplicateNameError(StoreError):
+    """An item with the same name already exists."""
+
+    def __init__(self, name, message="An item with that name already exists."):
+        super().__init__(message)
+        self.name = name
+
+
+class InsufficientStockError(StoreError):
+    """Not enough units of an item to sell."""
+
+    def __init__(self, name, available):
+        super().__init__(f"Insufficient quantity for {name}. Only {available} available.")
+        self.name = name
+        self.available = available
+
+
+class PaymentError(StoreError):
+    """The payment does not cover the total."""
+
+
+class ConflictError(StoreError):
+    """An item was changed by someone else after it was loaded.
+
+    ``current`` is the item row as it is now, or None if it was deleted.
+    """
+
+    def __init__(self, current):
+        if current is None:
+            super().__init__("This item has been deleted by someone else.")
+        else:
+            super().__init__("This item was changed by someone else after you opened it.")
+        self.current = current
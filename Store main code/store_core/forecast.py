@@ -0,0 +1,174 @@
+"""Demand forecasts, reorder points and days of cover for every item.
+
+``forecast_items`` reads the units each item sold per day over the last
+WINDOW_DAYS days and, per item:
+
+- velocity over the last 7 and 28 days (VELOCITY_WINDOWS), in units a day
+- a forecast of daily demand by simple exponential smoothing of the daily
+  series (SMOOTHING is the weight of the newest day)
+- a reorder point: the forecast demand over the supplier's lead time
+  (STORE_LEAD_TIME_DAYS, default 7) plus safety stock of SERVICE_LEVEL_Z
+  times the spread of the daily forecast errors over the lead time. An
+  item first sold on the last day has no errors yet; its spread is taken
+  as the square root of its demand, as for Poisson-distributed sales
+- days of cover: how long the stock lasts at the forecast demand
+
+The daily series come from the analytics copy (see ``snapshot``), whose
+``sale_lines`` table already holds the units per item and day, with one
+indexed range query for the whole window. Until the copy exists they are
+read from the sales themselves. An item's series starts at its first sale
+in the window, so a new item is not averaged over days before it was sold.
+Items are matched to their sales by name.
+
+From the command line::
+
+    python -m store_core.forecast --database store.db --sort days_of_cover
+"""
+
+import argparse
+import datetime
+import math
+import os
+
+from store_core import analytics, snapshot, storage
+from store_core.archive import attach_archives
+from store_core.db import TIMESTAMP_FORMAT, connect
+
+WINDOW_DAYS = 56
+VELOCITY_WINDOWS = (7, 28)
+SMOOTHING = 0.2
+LEAD_TIME_DAYS = float(os.environ.get("STORE_LEAD_TIME_DAYS", "7"))
+SERVICE_LEVEL_Z = 1.65  # Safety stock for about 95% of lead times without running out
+
+COLUMNS = (
+    "id",
+    "name",
+    "quantity",
+    "velocity_7",
+    "velocity_28",
+    "forecast",
+    "reorder_point",
+    "days_of_cover",
+    "reorder",
+)
+
+
+def daily_units(database_path, start, end):
+    """Units sold per item and day from ``start`` to ``end`` (dates, inclusive).
+
+    Returns ({item name: [units on start, ..., units on end]}, path read),
+    where the path is the analytics copy once it exists.
+    """
+    days = (end - start).days + 1
+    series = {}
+    path = snapshot.reporting_path(database_path, up_to_date=True)
+    conn = connect(path)
+    try:
+        if path != database_path:
+            rows = conn.execute(
+                "SELECT day, item_name, sum(quantity) FROM sale_lines WHERE day >= ? AND day <= ?"
+                " GROUP BY day, item_name",
+                (start.isoformat(), end.isoformat()),
+            )
+        else:
+            source = attach_archives(conn, database_path)
+            end_time = datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time())
+            sales = conn.execute(
+                f"SELECT substr(timestamp, 1, 10), items FROM {source} WHERE timestamp >= ? AND timestamp < ?",
+                (start.strftime(TIMESTAMP_FORMAT), end_time.strftime(TIMESTAMP_FORMAT)),
+            )
+            rows = (
+                (day, item_name, quantity)
+                for day, items in sales
+                for item_name, quantity in analytics.parse_sale_items(items)
+            )
+        for day, item_name, quantity in rows:
+            index = (datetime.date.fromisoformat(day) - start).days
+            item_series = series.get(item_name)
+            if item_series is None:
+                item_series = series[item_name] = [0] * days
+            item_series[index] += quantity
+    finally:
+        conn.close()
+    return series, path
+
+
+def _forecast(series, quantity, lead_time, alpha):
+    """Velocities, forecast, reorder point and cover of one item's daily series."""
+    first_sale = next((index for index, units in enumerate(series) if units), None)
+    if first_sale is None:
+        return {
+            **{f"velocity_{days}": 0.0 for days in VELOCITY_WINDOWS},
+            "forecast": 0.0,
+            "reorder_point": 0,
+            "days_of_cover": None,
+            "reorder": False,
+        }
+    series = series[first_sale:]
+    velocities = {f"velocity_{days}": sum(series[-days:]) / min(days, len(series)) for days in VELOCITY_WINDOWS}
+
+    level = series[0]
+    squared_errors = 0.0
+    for units in series[1:]:
+        error = units - level
+        squared_errors += error * error
+        level += alpha * error
+    if len(series) > 1:
+        spread = math.sqrt(squared_errors / (len(series) - 1))
+    else:  # One day of history: Poisson spread; see the module docstring
+        spread = math.sqrt(level)
+    reorder_point = math.ceil(level * lead_time + SERVICE_LEVEL_Z * spread * math.sqrt(lead_time))
+    return {
+        **velocities,
+        "forecast": level,
+        "reorder_point": reorder_point,
+        "days_of_cover": quantity / level if level > 0 else None,
+        "reorder": quantity <= reorder_point,
+    }
+
+
+def forecast_items(database_path, today=None, window=WINDOW_DAYS, lead_time=LEAD_TIME_DAYS, alpha=SMOOTHING):
+    """Forecasts every item; returns one dict per item with the keys in COLUMNS.
+
+    The window ends the day before ``today`` (default: the current date), so
+    a day still in progress does not pull the forecast down.
+    """
+    today = today or datetime.date.today()
+    end = today - datetime.timedelta(days=1)
+    start = today - datetime.timedelta(days=window)
+    series, path = daily_units(database_path, start, end)
+    conn = connect(path)
+    try:
+        items = conn.execute("SELECT id, name, quantity FROM items ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    no_sales = [0] * window
+    return [
+        {"id": item_id, "name": name, "quantity": quantity, **_forecast(series.get(name, no_sales), quantity, lead_time, alpha)}
+        for item_id, name, quantity in items
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.forecast", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    parser.add_argument("--sort", choices=COLUMNS, default="days_of_cover")
+    parser.add_argument("--reorder", action="store_true", help="only the items at or below their reorder point")
+    args = parser.parse_args(argv)
+    storage.use_profile("back_office")
+    rows = forecast_items(args.database)
+    if args.reorder:
+        rows = [row for row in rows if row["reorder"]]
+    rows.sort(key=lambda row: (row[args.sort] is None, row[args.sort] or 0))
+    print(f"{'id':>6}  {'item':<30} {'stock':>7} {'7d/day':>7} {'28d/day':>7} {'fcst':>7} {'reorder':>7} {'cover':>7}")
+    for row in rows:
+        cover = "-" if row["days_of_cover"] is None else f"{row['days_of_cover']:.1f}"
+        print(
+            f"{row['id']:>6}  {row['name'][:30]:<30} {row['quantity']:>7} {row['velocity_7']:>7.2f}"
+            f" {row['velocity_28']:>7.2f} {row['forecast']:>7.2f} {row['reorder_point']:>7} {cover:>7}"
+            f"{'  reorder' if row['reorder'] else ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""A till's local journal of completed sales.
+
+A checkout is final once its line is in the journal: ``record`` appends the
+sale to a file next to the database, fsyncs it and returns without touching
+store.db. A background thread then stores journaled sales in ``sales`` and
+takes them out of stock in ``items``, a batch per transaction through the
+``writer``. If the database is locked or missing, the thread keeps the
+entries and tries again later, so checkout latency does not depend on the
+database at all.
+
+Every entry carries a unique key that is stored in ``sales.journal_key``.
+A batch skips keys that are already there, or in the archive of the sale's
+year (see ``archive``), so replaying a journal after a crash, even one cut
+short halfway through a flush, never stores a sale twice. The file is emptied once everything in it is in the database.
+
+Each till holds an exclusive lock on its own file
+(``<database>.till-<n>.journal``). On start a till also replays the journals
+of tills that are no longer running. A line that cannot be read back, from
+disk damage or a hand edit, is logged and copied to ``<journal>.bad`` for
+someone to look at; the rest of the journal is replayed.
+"""
+
+import atexit
+import datetime
+import errno
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+from store_core import stock
+from store_core.archive import archived_keys
+from store_core.cart import describe_cart
+from store_core.db import TIMESTAMP_FORMAT
+from store_core.writer import write
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FLUSH_INTERVAL = float(os.environ.get("STORE_JOURNAL_FLUSH_S", "0.5"))  # seconds
+RETRY_INTERVAL = 5.0  # seconds, after the database could not be written
+BATCH_SIZE = 500
+ENTRY_FIELDS = ("key", "timestamp", "items", "total", "cart")
+
+logger = logging.getLogger("store.journal")
+
+
+def _try_lock(file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _open_locked(path):
+    """Opens ``path`` for appending if no other till holds it, else None.
+
+    Unbuffered, so a failed write leaves nothing behind to be written later.
+    """
+    file = open(path, "a+b", buffering=0)
+    if _try_lock(file):
+        return file
+    file.close()
+    return None
+
+
+def _parse_entry(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:  # Also UnicodeDecodeError
+        return None
+    if not isinstance(entry, dict) or any(field not in entry for field in ENTRY_FIELDS):
+        return None
+    if not isinstance(entry["cart"], dict):
+        return None
+    return entry
+
+
+def _set_aside(path, lines):
+    """Appends unreadable journal lines to ``<journal>.bad``."""
+    with open(path + ".bad", "ab") as bad:
+        bad.write(b"".join(line + b"\n" for line in lines))
+        bad.flush()
+        os.fsync(bad.fileno())
+
+
+def read_entries(file):
+    """Returns the entries in a journal and drops a torn last line.
+
+    A line without its newline was cut off by a crash before its fsync
+    returned, so that sale was never acknowledged. Complete lines that do
+    not parse are set aside (see ``_set_aside``) and skipped.
+    """
+    file.seek(0)
+    data = file.read()
+    complete = data.rfind(b"\n") + 1
+    if complete < len(data):
+        file.truncate(complete)
+        os.fsync(file.fileno())
+    entries = []
+    bad_lines = []
+    for line in data[:complete].splitlines():
+        if not line.strip():
+            continue
+        entry = _parse_entry(line)
+        if entry is None:
+            bad_lines.append(line)
+        else:
+            entries.append(entry)
+    if bad_lines:
+        logger.error("%d unreadable lines in %s set aside in %s.bad", len(bad_lines), file.name, file.name)
+        _set_aside(file.name, bad_lines)
+        if not entries:  # Nothing left to flush, which would empty the file
+            file.truncate(0)
+            os.fsync(file.fileno())
+    return entries
+
+
+def apply_entries(conn, entries, database_path):
+    """Writer job: stores the journaled sales that are not stored yet.
+
+    Stock is decremented without a floor; the goods have already left the
+    store, so a negative quantity is the honest record of an oversell.
+    Returns how many sales were new.
+    """
+    # Archiving deletes from store.db through the writer too, and only once
+    # the archive is in place, so a sale is always in one or the other here
+    archived = archived_keys(database_path, entries)
+    applied = 0
+    for entry in entries:
+        if entry["key"] in archived:
+            continue
+        if conn.execute("SELECT 1 FROM sales WHERE journal_key = ?", (entry["key"],)).fetchone():
+            continue
+        sale_id = conn.execute(
+            "INSERT INTO sales (timestamp, items, total, journal_key) VALUES (?, ?, ?, ?)",
+            (entry["timestamp"], entry["items"], entry["total"], entry["key"]),
+        ).lastrowid
+        cart = [(int(product_id), quantity) for product_id, quantity in entry["cart"].items()]
+        conn.executemany(
+            "UPDATE items SET quantity = quantity - ?, version = version + 1 WHERE id = ?",
+            [(quantity, product_id) for product_id, quantity in cart],
+        )
+        # Items deleted since the sale have no stock left to move
+        ids = [product_id for product_id, _ in cart]
+        placeholders = ", ".join("?" * len(ids))
+        existing = {row[0] for row in conn.execute(f"SELECT id FROM items WHERE id IN ({placeholders})", ids)}
+        stock.record_moves(
+            conn,
+            [(product_id, -quantity, "sale") for product_id, quantity in cart if product_id in existing],
+            entry["timestamp"],
+            sale_id,
+        )
+        applied += 1
+    return applied
+
+
+class SalesJournal:
+    def __init__(self, database_path, flush_interval=FLUSH_INTERVAL):
+        self.database_path = database_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()  # Guards the file and _pending
+        self._flush_lock = threading.Lock()
+        self._file = None
+        number = 1
+        while self._file is None:
+            self.path = f"{database_path}.till-{number}.journal"
+            self._file = _open_locked(self.path)
+            number += 1
+        self._pending = read_entries(self._file)
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="store-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, cart, products, total, timestamp=None):
+        """Journals a completed sale and returns its key once it is on disk.
+
+        Raises OSError, with the journal as it was, if the sale could not be
+        written (e.g. the disk is full).
+        """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        entry = {
+            "key": uuid.uuid4().hex,
+            "timestamp": timestamp.strftime(TIMESTAMP_FORMAT),
+            "items": describe_cart(cart, products),
+            "total": total,
+            "cart": {str(product_id): quantity for product_id, quantity in cart.items()},
+        }
+        line = json.dumps(entry).encode() + b"\n"
+        with self._lock:
+            size = self._file.seek(0, os.SEEK_END)
+            try:
+                if self._file.write(line) != len(line):
+                    raise OSError(errno.ENOSPC, "short write to the sales journal", self.path)
+                os.fsync(self._file.fileno())
+            except OSError:
+                # A partial line would run into the next sale's line
+                try:
+                    self._file.truncate(size)
+                except OSError:
+                    pass
+                raise
+            self._pending.append(entry)
+        return entry["key"]
+
+    def pending_quantities(self):
+        """Units per item sold by this till but not yet taken out of ``items``."""
+        quantities = {}
+        with self._lock:
+            for entry in self._pending:
+                for product_id, quantity in entry["cart"].items():
+                    quantities[int(product_id)] = quantities.get(int(product_id), 0) + quantity
+        return quantities
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Stores everything journaled so far; raises if the database fails."""
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._pending)
+            for start in range(0, len(entries), BATCH_SIZE):
+                write(self.database_path, apply_entries, entries[start:start + BATCH_SIZE], self.database_path)
+            with self._lock:
+                del self._pending[:len(entries)]
+                if not self._pending:
+                    self._file.truncate(0)
+                    os.fsync(self._file.fileno())
+
+    def replay_orphans(self):
+        """Stores the journals of tills that are not running any more."""
+        for path in sorted(glob.glob(glob.escape(self.database_path) + ".till-*.journal")):
+            if path == self.path:
+                continue
+            file = _open_locked(path)
+            if file is None:
+                continue  # That till is running and flushes its own journal
+            try:
+                entries = read_entries(file)
+                for start in range(0, len(entries), BATCH_SIZE):
+                    write(self.database_path, apply_entries, entries[start:start + BATCH_SIZE], self.database_path)
+                file.truncate(0)
+                os.fsync(file.fileno())
+            finally:
+                file.close()
+
+    def close(self):
+        """Stops the background thread and makes a last attempt to flush."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self.flush()
+        except (sqlite3.Error, OSError) as exc:
+            logger.warning("%d journaled sales left in %s: %s", self.pending_count(), self.path, exc)
+        self._file.close()
+
+    def _run(self):
+        try:
+            self.replay_orphans()
+        except (sqlite3.Error, OSError, ValueError) as exc:
+            logger.warning("could not replay other tills' journals: %s", exc)
+        wait = self.flush_interval
+        while not self._closed:
+            # Sales made while waiting are stored together in one batch
+            self._wake.wait(wait)
+            if self._closed:
+                break
+            if not self.pending_count():
+                continue
+            try:
+                self.flush()
+                wait = self.flush_interval
+            except (sqlite3.Error, OSError) as exc:  # OSError: emptying the journal failed
+                logger.warning("journal flush failed, retrying in %.0f s: %s", RETRY_INTERVAL, exc)
+                wait = RETRY_INTERVAL
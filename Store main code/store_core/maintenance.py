@@ -0,0 +1,294 @@
+"""Keeping store.db fast and compact while nobody is using it.
+
+Deleting items and years of inserts leave the file with free pages, half
+empty pages and tables scattered across it, and without statistics the
+query planner guesses. ``run_maintenance`` does, in order:
+
+- ``PRAGMA optimize``, or a full ``ANALYZE`` (bounded by
+  ``analysis_limit``) the first time, when there are no statistics yet
+- a one-time ``VACUUM`` that switches the database to incremental
+  auto-vacuum, or a full ``VACUUM`` when more than VACUUM_SLACK of the file
+  is unused space inside pages or more than VACUUM_FRAGMENTATION of its
+  pages are out of order, which rebuilds it compact and in order
+- otherwise ``PRAGMA incremental_vacuum`` in VACUUM_CHUNK page steps until
+  the free pages are gone, stopping early when activity resumes
+
+Everything but VACUUM goes through the writer. VACUUM cannot run inside a
+transaction and holds the write lock while it runs. Tills in local mode keep
+selling into their journals meanwhile, but it is only done when idle.
+
+``Maintainer`` decides when. It counts the database as busy while any
+connection, in any process, commits (``PRAGMA data_version`` changes) and
+while the app reports user activity through ``note_activity``. The app
+calls ``tick`` every minute or so. Once nothing has happened for IDLE_AFTER
+seconds it runs maintenance, at most once every MAINTENANCE_INTERVAL. The
+time of the last run is kept in store.db (``store_meta``) and claimed
+through the writer before a run, so the limit holds across restarts and
+between the management app and the service. New sales or user input
+during the run make it stop after the current step.
+
+``space_report`` describes the file: its size, free pages, unused bytes
+inside pages and how fragmented the tables are (the share of pages that do
+not follow the previous page of the same table). The last two need SQLite's
+dbstat table and are None without it.
+
+Run it by hand with ``python -m store_core.maintenance --database store.db``.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from store_core import storage
+from store_core.db import checkpoint, connect
+from store_core.writer import write
+
+MAINTENANCE_INTERVAL = float(os.environ.get("STORE_MAINTENANCE_INTERVAL_H", "24")) * 3600  # seconds
+IDLE_AFTER = 120  # seconds without commits or user input
+VACUUM_CHUNK = 256  # pages per incremental_vacuum step
+VACUUM_SLACK = 0.25  # share of unused space that warrants a full VACUUM
+VACUUM_FRAGMENTATION = 0.5  # share of out-of-order pages that does too
+ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+LAST_RUN = "maintenance_last_run"  # store_meta name; seconds since the epoch
+
+logger = logging.getLogger("store.maintenance")
+
+
+def space_report(database_path):
+    """Size, free space and fragmentation of the database file."""
+    conn = connect(database_path)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        try:
+            unused_bytes = conn.execute("SELECT coalesce(sum(unused), 0) FROM dbstat").fetchone()[0]
+            out_of_order = conn.execute(
+                "SELECT count(*) FROM ("
+                " SELECT pageno, lag(pageno) OVER (PARTITION BY name ORDER BY path) AS previous FROM dbstat"
+                ") WHERE previous IS NOT NULL AND pageno != previous + 1"
+            ).fetchone()[0]
+            fragmentation = out_of_order / pages if pages else 0.0
+        except sqlite3.OperationalError:  # SQLite built without dbstat
+            unused_bytes = fragmentation = None
+    finally:
+        conn.close()
+    return {
+        "bytes": pages * page_size,
+        "pages": pages,
+        "free_pages": free_pages,
+        "free_bytes": free_pages * page_size,
+        "unused_bytes": unused_bytes,
+        "fragmentation": fragmentation,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+    }
+
+
+def _optimize(conn):
+    """Writer job: refreshes planner statistics; returns True if it ran ANALYZE."""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+        conn.execute("ANALYZE")
+        return True
+    conn.execute("PRAGMA optimize")
+    return False
+
+
+def _vacuum_step(conn, pages):
+    """Writer job: frees up to ``pages`` pages; returns the free pages left."""
+    # incremental_vacuum frees one page per step of the statement, and
+    # sqlite3 steps a PRAGMA without result columns only once
+    for _ in range(pages):
+        conn.execute("PRAGMA incremental_vacuum(1)")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _vacuum(database_path):
+    conn = connect(database_path)
+    try:
+        conn.isolation_level = None
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")  # Takes effect with the VACUUM
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def _claim_run(conn, now, interval):
+    """Writer job: records a run at ``now`` unless one started within ``interval``.
+
+    Returns False, recording nothing, if another run was too recent.
+    """
+    row = conn.execute("SELECT value FROM store_meta WHERE name = ?", (LAST_RUN,)).fetchone()
+    if row is not None and now - row[0] < interval:
+        return False
+    conn.execute("INSERT OR REPLACE INTO store_meta (name, value) VALUES (?, ?)", (LAST_RUN, now))
+    return True
+
+
+def last_run(database_path):
+    """When maintenance last ran on the database (time.time()), or None."""
+    conn = connect(database_path)
+    try:
+        row = conn.execute("SELECT value FROM store_meta WHERE name = ?", (LAST_RUN,)).fetchone()
+    finally:
+        conn.close()
+    return None if row is None else row[0]
+
+
+def run_maintenance(database_path, still_idle=lambda: True):
+    """Analyses and compacts the database; returns a report of the run.
+
+    ``still_idle`` is asked before each expensive step; when it returns
+    False the run stops and the report says it was interrupted.
+    """
+    started = time.perf_counter()
+    before = space_report(database_path)
+    analyzed = write(database_path, _optimize)
+    vacuumed = False
+    interrupted = False
+
+    slack = (before["unused_bytes"] or 0) / before["bytes"] if before["bytes"] else 0.0
+    scattered = (before["fragmentation"] or 0.0) > VACUUM_FRAGMENTATION
+    if before["auto_vacuum"] == "none" or slack > VACUUM_SLACK or scattered:
+        if still_idle():
+            _vacuum(database_path)
+            vacuumed = True
+        else:
+            interrupted = True
+    else:
+        free_pages = before["free_pages"]
+        while free_pages:
+            if not still_idle():
+                interrupted = True
+                break
+            free_pages = write(database_path, _vacuum_step, VACUUM_CHUNK)
+    checkpoint(database_path)  # The file only shrinks once the WAL is checkpointed
+
+    after = space_report(database_path)
+    return {
+        "before": before,
+        "after": after,
+        "reclaimed_bytes": before["bytes"] - after["bytes"],
+        "analyzed": analyzed,
+        "vacuumed": vacuumed,
+        "interrupted": interrupted,
+        "duration": time.perf_counter() - started,
+    }
+
+
+class Maintainer:
+    """Runs ``run_maintenance`` when the database has been idle for a while."""
+
+    def __init__(self, database_path, interval=MAINTENANCE_INTERVAL, idle_after=IDLE_AFTER):
+        self.database_path = database_path
+        self.interval = interval
+        self.idle_after = idle_after
+        self._lock = threading.Lock()
+        # Only ever asked for PRAGMA data_version, which changes whenever
+        # another connection commits; tick() may run on any thread.
+        self._watch = sqlite3.connect(database_path, check_same_thread=False)
+        self._data_version = None
+        self._last_activity = time.monotonic()
+        self._stopping = False
+        self.last_report = None
+
+    def note_activity(self):
+        """Called by the app on user input and requests."""
+        self._last_activity = time.monotonic()
+
+    def stop(self):
+        """Ends a run in progress after its current step; no more runs start."""
+        self._stopping = True
+
+    def _poll(self):
+        version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._last_activity = time.monotonic()
+
+    def _max_sale_id(self):
+        return self._watch.execute("SELECT coalesce(max(id), 0) FROM sales").fetchone()[0]
+
+    def tick(self):
+        """Runs maintenance if it is due and the database is idle.
+
+        Returns the report of the run, or None if nothing was done.
+        """
+        with self._lock:
+            if self._stopping:
+                return None
+            self._poll()
+            now = time.monotonic()
+            if now - self._last_activity < self.idle_after:
+                return None
+            previous = last_run(self.database_path)
+            if previous is not None and time.time() - previous < self.interval:
+                return None
+            # Another process may have started a run since
+            if not write(self.database_path, _claim_run, time.time(), self.interval):
+                return None
+
+            # The run's own writes change data_version, so during the run
+            # new sales and user input are what count as activity.
+            max_sale_id = self._max_sale_id()
+
+            def still_idle():
+                return not self._stopping and self._last_activity <= now and self._max_sale_id() == max_sale_id
+
+            report = run_maintenance(self.database_path, still_idle)
+            self._poll()
+            self._last_activity = now  # Not activity: the run's own commits
+            self.last_report = report
+        logger.info(
+            "maintenance of %s: %d KiB reclaimed, %d free pages left, fragmentation %s%s (%.1f s)",
+            self.database_path,
+            report["reclaimed_bytes"] // 1024,
+            report["after"]["free_pages"],
+            "n/a" if report["after"]["fragmentation"] is None else f"{report['after']['fragmentation']:.0%}",
+            ", interrupted" if report["interrupted"] else "",
+            report["duration"],
+        )
+        return report
+
+    def close(self):
+        with self._lock:  # Waits for a run in progress
+            self._watch.close()
+
+
+def _describe(report):
+    lines = [
+        f"size {report['bytes'] // 1024} KiB in {report['pages']} pages, {report['free_pages']} free",
+        f"auto_vacuum {report['auto_vacuum']}",
+    ]
+    if report["unused_bytes"] is not None:
+        lines.append(f"unused inside pages {report['unused_bytes'] // 1024} KiB, fragmentation {report['fragmentation']:.0%}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.maintenance", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    parser.add_argument("--report", action="store_true", help="only describe the file, change nothing")
+    args = parser.parse_args(argv)
+    storage.use_profile("back_office")
+    if args.report:
+        print("\n".join(_describe(space_report(args.database))))
+        return
+    write(args.database, _claim_run, time.time(), 0)
+    report = run_maintenance(args.database)
+    print("before: " + "; ".join(_describe(report["before"])))
+    print("after:  " + "; ".join(_describe(report["after"])))
+    print(
+        f"reclaimed {report['reclaimed_bytes'] // 1024} KiB in {report['duration']:.2f} s"
+        f" (analyze: {'full' if report['analyzed'] else 'optimize'}, vacuum: {'full' if report['vacuumed'] else 'incremental'})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Per-statement timing and a slow-query log for every SQL call.
+
+When enabled, ``db.connect`` hands out ``InstrumentedConnection`` objects,
+so every statement the apps run is timed from ``execute`` until its last row has
+been fetched (time spent between fetches, e.g. filling a widget, is not
+counted). For each statement the module records the duration, the rows
+returned or changed and the first caller outside ``store_core``.
+
+Statements slower than the threshold are written to the slow-query log as
+JSON lines together with their ``EXPLAIN QUERY PLAN``. Rolling statistics
+per statement are available from ``snapshot()`` and ``dump_stats()`` and
+shown in the management app's Diagnostics page.
+
+Instrumented cursors wrap every fetch, so this is off unless asked for.
+Settings come from the environment:
+
+- STORE_QUERY_STATS=1 turns instrumentation on
+- STORE_SLOW_QUERY_MS is the slow-query threshold (default 200)
+- STORE_SLOW_QUERY_LOG is the slow-query log file (default slow_queries.log
+  in the folder of the database the statement ran on)
+- STORE_QUERY_STATS_FILE, if set, receives dump_stats() when the app exits
+"""
+
+import atexit
+import collections
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+ENABLED = os.environ.get("STORE_QUERY_STATS", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("STORE_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.environ.get("STORE_SLOW_QUERY_LOG")  # None: next to the database
+SLOW_QUERY_LOG_NAME = "slow_queries.log"
+
+# Durations kept per statement for the rolling percentiles
+WINDOW = 1000
+
+slow_log = logging.getLogger("store.slow_query")
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_lock = threading.Lock()
+_stats = {}
+_slow_handlers = {}  # log path -> FileHandler
+
+
+def normalize(sql):
+    """Returns the statement key: whitespace collapsed, IN (?, ?, ...) folded."""
+    sql = " ".join(sql.split())
+    return re.sub(r"\bIN \(\?(?:, ?\?)+\)", "IN (?, ...)", sql, flags=re.IGNORECASE)
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not os.path.abspath(filename).startswith(_PACKAGE_DIR):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class _StatementStats:
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.recent = collections.deque(maxlen=WINDOW)
+        self.callers = collections.Counter()
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000,
+            "max_ms": self.max * 1000,
+            "p50_ms": recent[len(recent) // 2] * 1000,
+            "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000,
+            "rows": self.rows,
+            "callers": dict(self.callers.most_common(5)),
+        }
+
+
+def slow_log_path(database_path):
+    """The slow-query log of statements run on ``database_path``."""
+    if SLOW_QUERY_LOG:
+        return SLOW_QUERY_LOG
+    if database_path.startswith("file:"):
+        database_path = unquote(urlsplit(database_path).path)
+    if not database_path or database_path == ":memory:":
+        return SLOW_QUERY_LOG_NAME
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)), SLOW_QUERY_LOG_NAME)
+
+
+def _log_slow(conn, message):
+    path = slow_log_path(getattr(conn, "database_path", ""))
+    with _lock:
+        handler = _slow_handlers.get(path)
+        if handler is None:
+            handler = _slow_handlers[path] = logging.FileHandler(path)
+    handler.handle(slow_log.makeRecord(slow_log.name, logging.WARNING, __file__, 0, message, None, None))
+
+
+def _record(conn, sql, params, duration, rows, caller):
+    key = normalize(sql)
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = _StatementStats(key)
+        stats.count += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+        stats.rows += max(rows, 0)
+        stats.recent.append(duration)
+        stats.callers[caller] += 1
+
+    if duration * 1000 >= SLOW_QUERY_MS and not key.upper().startswith("EXPLAIN"):
+        try:
+            plan = [row[-1] for row in sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as exc:
+            plan = [f"unavailable: {exc}"]
+        _log_slow(conn, json.dumps({
+            "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "caller": caller,
+            "sql": key,
+            "plan": plan,
+        }))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement once its results are consumed."""
+
+    _pending = None
+
+    def _start(self, sql, params, started, caller):
+        self._finish()
+        self._pending = [sql, params, time.perf_counter() - started, 0, caller]
+        if self.description is None:
+            # Not a query: nothing to fetch, the statement is complete
+            self._pending[3] = self.rowcount
+            self._finish()
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            _record(self.connection, *pending)
+
+    def _fetched(self, started, rows, exhausted):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += rows
+            if exhausted:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._start(sql, parameters, started, _caller())
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._finish()
+        _record(self.connection, sql, (), time.perf_counter() - started, self.rowcount, _caller())
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Statements read with a single fetchone() end when the cursor goes
+        try:
+            self._finish()
+        except sqlite3.Error:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, and execute shortcuts, are instrumented."""
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.database_path = os.fsdecode(database)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def snapshot():
+    """Returns the statistics of every statement, slowest total first."""
+    with _lock:
+        rows = [stats.as_dict() for stats in _stats.values()]
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def dump_stats(path):
+    """Writes snapshot() to ``path`` as JSON."""
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "slow_query_ms": SLOW_QUERY_MS,
+                "statements": snapshot(),
+            },
+            f,
+            indent=2,
+        )
+
+
+if os.environ.get("STORE_QUERY_STATS_FILE"):
+    atexit.register(lambda: dump_stats(os.environ["STORE_QUERY_STATS_FILE"]))
@@ -0,0 +1,147 @@
+"""Sales reports remembered between requests.
+
+Asking for the same report twice, for example pressing Analyze again, should
+not read the period's sales again. ``ReportCache`` keeps each result under
+(report, year, month, day) together with the point in the sales table it was
+computed at: the highest ``sales.id`` and the row count, which together act
+as the data version. The row count is kept in ``sales_count`` by triggers
+(see ``db.create_sales_count``), so checking the version costs two
+single-row reads however many sales there are.
+
+Sales are only ever appended, so when new sales arrive the ids above the
+stored watermark are exactly what is new. A stale entry is brought up to
+date by reading only those rows that fall in its period and merging them into
+the stored result, which for the current day or month is a handful of rows.
+Entries for other periods are checked the same way when next asked for and
+usually just move their watermark. If rows disappeared instead (the count
+does not add up), the entry is computed again from scratch.
+
+Reports must be mergeable: ``REPORTS`` maps a name to ``(compute, merge)``
+where ``compute(sales)`` summarises a list of sales and ``merge(a, b)``
+combines two results.
+
+At most MAX_ENTRIES results are kept, the least recently used going first.
+Reports with large results have a smaller limit of their own in
+REPORT_LIMITS: a basket result holds a count for every pair of items
+bought together, which for a big catalog runs to millions of entries.
+"""
+
+import os
+import sqlite3
+import threading
+
+from store_core import analytics
+from store_core.archive import attach_archives
+from store_core.db import connect
+
+REPORTS = {
+    "summary": (analytics.summarize_sales, analytics.merge_summaries),
+    "daily": (analytics.summarize_days, analytics.merge_days),
+    "baskets": (analytics.summarize_baskets, analytics.merge_baskets),
+}
+MAX_ENTRIES = 256
+REPORT_LIMITS = {"baskets": 4}  # entries per report, on top of MAX_ENTRIES
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _row_count(conn):
+    try:
+        return conn.execute("SELECT row_count FROM sales_count").fetchone()[0]
+    except sqlite3.OperationalError:  # A database create_schema has not upgraded yet
+        return conn.execute("SELECT count(*) FROM sales").fetchone()[0]
+
+
+def _read_sales(conn, source, where, params, after_id, up_to_id):
+    rows = conn.execute(
+        f"SELECT items, total, substr(timestamp, 1, 10) FROM {source} WHERE {where} AND id > ? AND id <= ?",
+        [*params, after_id, up_to_id],
+    )
+    return [{"items": items, "total": total, "day": day} for items, total, day in rows]
+
+
+class ReportCache:
+    def __init__(self, database_path, max_entries=MAX_ENTRIES):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (result, max_id, row_count); oldest use first
+        self._lock = threading.Lock()  # Guards _entries, _computing and stats
+        self._computing = {}  # key -> Lock held while that key is computed
+        self.stats = {"hits": 0, "updates": 0, "misses": 0}
+
+    def get(self, report, year="", month="", day=""):
+        """Returns ``report`` for a period, computing only what changed."""
+        compute, merge = REPORTS[report]
+        key = (report, year, month, day)
+        where, params = analytics.period_filter(year, month, day)
+        with self._lock:
+            key_lock = self._computing.setdefault(key, threading.Lock())
+        # A request waits only for one computing the same report and period,
+        # and then finds its result up to date
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            conn = connect(self.database_path)
+            try:
+                source = attach_archives(conn, self.database_path, year)
+                conn.execute("BEGIN")  # One snapshot for the watermark and the rows
+                # max(id) is one seek to the end of the table
+                max_id = conn.execute("SELECT coalesce(max(id), 0) FROM sales").fetchone()[0]
+                row_count = _row_count(conn)
+                if entry is not None and entry[1:] == (max_id, row_count):
+                    outcome = "hits"
+                    result = entry[0]
+                elif entry is not None and self._only_appended(conn, entry, max_id, row_count):
+                    outcome = "updates"
+                    result = merge(entry[0], compute(_read_sales(conn, source, where, params, entry[1], max_id)))
+                else:
+                    outcome = "misses"
+                    result = compute(_read_sales(conn, source, where, params, 0, max_id))
+                conn.rollback()
+            finally:
+                conn.close()
+            with self._lock:
+                self.stats[outcome] += 1
+                self._entries.pop(key, None)  # Re-inserted as the most recently used
+                self._entries[key] = (result, max_id, row_count)
+                self._evict(report)
+            return result
+
+    def _evict(self, report):
+        """Drops the least recently used entries over the limits."""
+        limit = REPORT_LIMITS.get(report)
+        if limit is not None:
+            same_report = [key for key in self._entries if key[0] == report]
+            for key in same_report[:-limit]:
+                del self._entries[key]
+                self._computing.pop(key, None)
+        while len(self._entries) > self.max_entries:
+            self._computing.pop(next(iter(self._entries)), None)
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _only_appended(conn, entry, max_id, row_count):
+        _, old_max_id, old_row_count = entry
+        if max_id < old_max_id:
+            return False
+        added = conn.execute("SELECT count(*) FROM sales WHERE id > ?", (old_max_id,)).fetchone()[0]
+        return row_count - old_row_count == added
+
+
+def cache_for(database_path):
+    """Returns the shared ReportCache for ``database_path``."""
+    key = os.path.abspath(database_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ReportCache(database_path)
+        return cache
+
+
+def get_report(database_path, report, year="", month="", day=""):
+    return cache_for(database_path).get(report, year, month, day)
@@ -0,0 +1,451 @@
+"""A local JSON service that owns store.db.
+
+Tills and the back office can run against this instead of opening the file
+themselves (set STORE_SERVICE, see ``client``). It speaks plain HTTP/1.1
+with JSON bodies over TCP or a Unix socket:
+
+    GET    /items[?q=term]        item rows, or the rows matching a search
+    GET    /items/<id>            one item row
+    GET    /quantities            {id: quantity}
+    POST   /items                 {"name", "price", "quantity"} -> {"id"}
+    POST   /items/batch           {"items": [[name, price, quantity], ...]}
+    PUT    /items/<id>            {"name", "price", "quantity"[, "version"]} -> {"version"}
+    PATCH  /items/<id>            {"column", "value"[, "version"]} -> {"version"}
+    DELETE /items/<id>
+    POST   /items/delete          {"ids": [id, ...]} -> {"deleted"}
+    POST   /items/renumber        -> {"items_left"}
+    POST   /cart/price            {"cart": {id: quantity}} -> {"total", "items"}
+    POST   /checkout              {"cart", "payment"} -> {"sale_id", "total", "change"}
+    GET    /sales[?year=&month=&day=]
+    GET    /sales/page?year=&month=&day=[&after_timestamp=&after_id=]&limit=
+                                  -> {"rows": [[id, timestamp, items, total], ...]}
+    GET    /sales/summary[?year=&month=&day=]
+    GET    /sales/baskets[?year=&month=&day=&top=&by=]
+                                  -> {"baskets", "rules": [...]}; see analytics.basket_rules
+    GET    /forecast              {"items": [...]}; see forecast.forecast_items
+
+Prices and stock always come from the database, never from the caller.
+A StoreError comes back as 409 with {"error": class name, "message", ...}
+so the client can raise the same error. The handlers are the store_core
+functions run on a thread pool; writes meet in the ``writer``, so sales from
+every lane are group-committed together. The /sales routes read the
+analytics copy of the database, refreshed every minute (see ``snapshot``).
+
+Run it with ``python -m store_core.service --database store.db``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from store_core import analytics, backup, catalog, forecast, report_cache, snapshot, stock, storage
+from store_core.maintenance import Maintainer
+from store_core.cart import cart_total, describe_cart
+from store_core.checkout import change_due, record_sale
+from store_core.db import TIMESTAMP_FORMAT, checkpoint, create_schema
+from store_core.errors import (
+    ConflictError,
+    DuplicateNameError,
+    InsufficientStockError,
+    StoreError,
+    ValidationError,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+MAX_PAGE_SIZE = 5000  # rows per /sales/page request
+CHECKPOINT_INTERVAL = 60  # seconds; see storage
+BACKUP_CHECK_INTERVAL = 15 * 60  # seconds; see backup.backup_if_due
+MAINTENANCE_CHECK_INTERVAL = 60  # seconds; see maintenance.Maintainer
+STOCK_CHECK_INTERVAL = 15 * 60  # seconds; see stock.checkpoint_if_due
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+logger = logging.getLogger("store.service")
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error_payload(exc):
+    """Describes a StoreError so ``client`` can raise it again."""
+    payload = {"error": type(exc).__name__, "message": str(exc)}
+    if isinstance(exc, (DuplicateNameError, InsufficientStockError)):
+        payload["name"] = exc.name
+    if isinstance(exc, InsufficientStockError):
+        payload["available"] = exc.available
+    if isinstance(exc, ConflictError):
+        payload["current"] = exc.current
+    return payload
+
+
+def sale_to_json(sale):
+    return dict(sale, timestamp=sale["timestamp"].strftime(TIMESTAMP_FORMAT))
+
+
+def _cart_from_json(data):
+    try:
+        return {int(product_id): int(quantity) for product_id, quantity in data.items()}
+    except (AttributeError, TypeError, ValueError):
+        raise BadRequest("cart must map item ids to quantities")
+
+
+def _field(body, name):
+    try:
+        return body[name]
+    except (KeyError, TypeError):
+        raise BadRequest(f"missing field: {name}")
+
+
+def _number(value, name, kind=int):
+    """``value`` as an int (or ``kind``), or BadRequest naming the field."""
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be a number")
+    if not math.isfinite(number):
+        raise BadRequest(f"{name} must be a number")
+    return number
+
+
+class StoreService:
+    def __init__(self, database_path, maintainer=None):
+        self.database_path = database_path
+        self.maintainer = maintainer  # Told about every request; see maintenance
+        self.routes = [
+            ("GET", r"/items", self.list_items),
+            ("POST", r"/items", self.add_item),
+            ("POST", r"/items/batch", self.add_items),
+            ("POST", r"/items/delete", self.delete_items),
+            ("POST", r"/items/renumber", self.renumber_ids),
+            ("GET", r"/items/(\d+)", self.get_item),
+            ("PUT", r"/items/(\d+)", self.update_item),
+            ("PATCH", r"/items/(\d+)", self.update_field),
+            ("DELETE", r"/items/(\d+)", self.delete_item),
+            ("GET", r"/quantities", self.load_quantities),
+            ("POST", r"/cart/price", self.price_cart),
+            ("POST", r"/checkout", self.checkout),
+            ("GET", r"/sales", self.sales),
+            ("GET", r"/sales/summary", self.sales_summary),
+            ("GET", r"/sales/baskets", self.sales_baskets),
+            ("GET", r"/sales/page", self.sales_page),
+            ("GET", r"/forecast", self.forecast_items),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in self.routes]
+
+    # --- Handlers (run on worker threads) ---
+
+    def list_items(self, query, body):
+        if query.get("q"):
+            return {"items": catalog.search_items(self.database_path, query["q"])}
+        return {"items": catalog.list_items(self.database_path)}
+
+    def get_item(self, query, body, item_id):
+        item = catalog.get_item(self.database_path, int(item_id))
+        if item is None:
+            raise NotFound(f"no item {item_id}")
+        return {"item": item}
+
+    def load_quantities(self, query, body):
+        return {"quantities": catalog.load_quantities(self.database_path)}
+
+    def add_item(self, query, body):
+        item_id = catalog.add_item(
+            self.database_path, _field(body, "name"), _field(body, "price"), _field(body, "quantity")
+        )
+        return {"id": item_id}
+
+    def add_items(self, query, body):
+        try:
+            items = [catalog.validate_item(*item) for item in _field(body, "items")]
+        except TypeError:
+            raise BadRequest("items must be a list of [name, price, quantity]")
+        catalog.add_items(self.database_path, items)
+        return {"count": len(items)}
+
+    def update_item(self, query, body, item_id):
+        version = catalog.update_item(
+            self.database_path,
+            int(item_id),
+            _field(body, "name"),
+            _field(body, "price"),
+            _field(body, "quantity"),
+            body.get("version"),
+        )
+        return {"version": version}
+
+    def update_field(self, query, body, item_id):
+        column = _field(body, "column")
+        if column not in catalog.EDITABLE_COLUMNS:
+            raise BadRequest(f"column cannot be edited: {column}")
+        version = catalog.update_field(self.database_path, int(item_id), column, _field(body, "value"), body.get("version"))
+        return {"version": version}
+
+    def delete_item(self, query, body, item_id):
+        catalog.delete_item(self.database_path, int(item_id))
+        return {}
+
+    def delete_items(self, query, body):
+        try:
+            return {"deleted": catalog.delete_items(self.database_path, _field(body, "ids"))}
+        except (TypeError, ValueError):
+            raise BadRequest("ids must be a list of item ids")
+
+    def renumber_ids(self, query, body):
+        return {"items_left": catalog.renumber_ids(self.database_path)}
+
+    def _products_for(self, cart):
+        products = {}
+        for product_id in cart:
+            row = catalog.get_item(self.database_path, product_id)
+            if row is None:
+                raise ValidationError(f"Unknown item id {product_id}.")
+            products[product_id] = catalog.product_from_row(row)
+        return products
+
+    def price_cart(self, query, body):
+        cart = _cart_from_json(_field(body, "cart"))
+        products = self._products_for(cart)
+        return {"total": cart_total(cart, products), "items": describe_cart(cart, products)}
+
+    def checkout(self, query, body):
+        cart = _cart_from_json(_field(body, "cart"))
+        if not cart:
+            raise ValidationError("Cart is empty.")
+        products = self._products_for(cart)
+        total = cart_total(cart, products)
+        change = change_due(total, _number(_field(body, "payment"), "payment", float))
+        sale_id = record_sale(self.database_path, cart, products, total)
+        return {"sale_id": sale_id, "total": total, "change": change}
+
+    # Sales reports read the analytics copy; see snapshot
+
+    def _filtered_sales(self, query):
+        return analytics.load_sales(
+            snapshot.reporting_path(self.database_path), query.get("year", ""), query.get("month", ""), query.get("day", "")
+        )
+
+    def sales(self, query, body):
+        return {"sales": [sale_to_json(sale) for sale in self._filtered_sales(query)]}
+
+    def sales_summary(self, query, body):
+        summary = report_cache.get_report(
+            snapshot.reporting_path(self.database_path, up_to_date=True),
+            "summary",
+            query.get("year", ""),
+            query.get("month", ""),
+            query.get("day", ""),
+        )
+        return {"summary": summary}
+
+    def sales_baskets(self, query, body):
+        baskets = report_cache.get_report(
+            snapshot.reporting_path(self.database_path, up_to_date=True),
+            "baskets",
+            query.get("year", ""),
+            query.get("month", ""),
+            query.get("day", ""),
+        )
+        try:
+            return analytics.basket_rules(baskets, _number(query.get("top", 20), "top"), query.get("by", "lift"))
+        except ValueError as exc:
+            raise BadRequest(str(exc))
+
+    def sales_page(self, query, body):
+        after = None
+        if "after_timestamp" in query:
+            after = (query["after_timestamp"], _number(query.get("after_id", 0), "after_id"))
+        # A negative LIMIT would mean no limit to SQLite
+        limit = min(max(_number(query.get("limit", 500), "limit"), 1), MAX_PAGE_SIZE)
+        rows = analytics.fetch_sales_page(
+            snapshot.reporting_path(self.database_path),
+            query.get("year", ""),
+            query.get("month", ""),
+            query.get("day", ""),
+            after,
+            limit,
+        )
+        return {"rows": rows}
+
+    def forecast_items(self, query, body):
+        return {"items": forecast.forecast_items(self.database_path)}
+
+    # --- HTTP ---
+
+    def route(self, method, path):
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                if route_method == method:
+                    return handler, match.groups()
+                allowed = True
+        if allowed:
+            raise BadRequest(f"{method} not allowed on {path}")
+        raise NotFound(path)
+
+    async def respond(self, method, target, body):
+        """Returns (status, payload) for one request."""
+        if self.maintainer is not None:
+            self.maintainer.note_activity()
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            handler, args = self.route(method, url.path)
+            data = json.loads(body) if body else {}
+            payload = await asyncio.get_running_loop().run_in_executor(None, handler, query, data, *args)
+            return 200, payload
+        except StoreError as exc:
+            return 409, error_payload(exc)
+        except NotFound as exc:
+            return 404, {"error": "NotFound", "message": str(exc)}
+        except (BadRequest, json.JSONDecodeError) as exc:
+            return 400, {"error": "BadRequest", "message": str(exc)}
+        except Exception:
+            logger.exception("%s %s failed", method, target)
+            return 500, {"error": "InternalError", "message": "The store service failed; see its log."}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.respond(method, target, body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        """Starts listening; returns the asyncio server."""
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def _checkpoint_periodically(database_path):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        try:
+            await loop.run_in_executor(None, checkpoint, database_path)
+        except Exception:
+            logger.exception("checkpoint of %s failed", database_path)
+
+
+async def _backup_periodically(database_path, backup_dir):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, backup.backup_if_due, database_path, backup_dir)
+        except Exception:
+            logger.exception("scheduled backup of %s failed", database_path)
+        await asyncio.sleep(BACKUP_CHECK_INTERVAL)
+
+
+async def _checkpoint_stock_periodically(database_path):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, stock.checkpoint_if_due, database_path)
+        except Exception:
+            logger.exception("stock checkpoint of %s failed", database_path)
+        await asyncio.sleep(STOCK_CHECK_INTERVAL)
+
+
+async def _refresh_snapshot_periodically(database_path):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, snapshot.refresh, database_path)
+        except Exception:
+            logger.exception("refreshing the analytics copy of %s failed", database_path)
+        await asyncio.sleep(snapshot.SYNC_INTERVAL)
+
+
+async def _maintain_periodically(maintainer):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(MAINTENANCE_CHECK_INTERVAL)
+        try:
+            await loop.run_in_executor(None, maintainer.tick)
+        except Exception:
+            logger.exception("maintenance of %s failed", maintainer.database_path)
+
+
+async def serve(database_path, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, backup_dir=None):
+    create_schema(database_path)
+    maintainer = Maintainer(database_path)
+    server = await StoreService(database_path, maintainer).start(host, port, unix_path)
+    for sock in server.sockets:
+        logger.info("store service for %s listening on %s", database_path, sock.getsockname())
+    tasks = [
+        asyncio.create_task(_checkpoint_periodically(database_path)),
+        asyncio.create_task(_maintain_periodically(maintainer)),
+        asyncio.create_task(_refresh_snapshot_periodically(database_path)),
+        asyncio.create_task(_checkpoint_stock_periodically(database_path)),
+    ]
+    if backup_dir != "":
+        tasks.append(asyncio.create_task(_backup_periodically(database_path, backup_dir)))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+        maintainer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.service", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument(
+        "--backup-dir", help="where scheduled backups go (default: backups/ next to the database; empty to disable)"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    storage.use_profile("back_office")
+    try:
+        asyncio.run(serve(args.database, args.host, args.port, args.unix, args.backup_dir))
+    except KeyboardInterrupt:
+        pass
+    checkpoint(args.database, "TRUNCATE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""A read-only copy of the sales and items for reports.
+
+Reports read a lot of rows, and on store.db they share the file, its cache
+and the disk with the tills' checkouts. ``refresh`` copies what changed
+into a separate database next to it (``<database>.analytics.db``). Reports
+then read that copy and store.db only answers the small refresh queries.
+
+What changed is found by watermark:
+
+- ``sales`` are only ever appended, so each refresh copies the rows whose
+  id is above the highest id copied before. Archived years (see
+  ``archive``) are copied from their archives on the first refresh; rows
+  removed from store.db by archiving stay in the copy.
+- ``items`` are compared whole: rows that differ from the copy's row with
+  the same id are copied again, and items deleted from store.db are
+  deleted from it. The version alone is not enough, since renumbering
+  (``catalog.renumber_ids``) can move an item onto an id whose old item
+  had the same version.
+
+The copy has the same ``sales`` and ``items`` columns as store.db, so
+``analytics`` and ``report_cache`` work on it unchanged. It also has
+columns and tables that reports would otherwise compute on every read:
+
+- ``sales.day`` ("YYYY-MM-DD") and ``sales.units`` (items sold)
+- ``sale_lines``: one row per item of each sale, with the day, indexed by
+  item and day and by day and item
+- ``items.stock_value``: quantity times price
+
+A refresh reads store.db in one read transaction, which in WAL mode never
+blocks a writer, and writes the copy in SYNC_CHUNK sale batches, each
+committed with its watermark. An interrupted refresh resumes where it
+stopped. The first one builds the copy under a temporary name, so reports
+keep reading store.db until the copy is complete (see ``reporting_path``).
+The copy can be deleted at any time; the next refresh rebuilds it.
+
+Run it by hand with ``python -m store_core.snapshot --database store.db``.
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from store_core import analytics, storage
+from store_core.archive import attach_archives
+from store_core.db import connect, create_sales_count
+
+SYNC_CHUNK = 10000  # sales per transaction on the copy
+SYNC_INTERVAL = 60  # seconds between scheduled refreshes
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def snapshot_path(database_path):
+    return f"{database_path}.analytics.db"
+
+
+def create_snapshot_schema(conn, indexes=True):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY,
+            timestamp DATETIME NOT NULL,
+            items TEXT NOT NULL,
+            total REAL NOT NULL,
+            journal_key TEXT,
+            day TEXT NOT NULL,
+            units INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sale_lines (
+            sale_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            stock_value REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS watermarks (name TEXT PRIMARY KEY, value)")
+    create_sales_count(conn)
+    if indexes:
+        # Period filters and (timestamp, id) paging, as on store.db
+        conn.execute("CREATE INDEX IF NOT EXISTS sales_timestamp ON sales (timestamp)")
+        # Daily and per-item series; covering, so they never visit the table
+        conn.execute("CREATE INDEX IF NOT EXISTS sales_day ON sales (day, total, units)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sale_lines_item_day ON sale_lines (item_name, day, quantity)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sale_lines_day ON sale_lines (day, item_name, quantity)")
+        conn.execute("CREATE INDEX IF NOT EXISTS items_name ON items (name)")
+    conn.commit()
+
+
+def _watermark(conn, name, default=0):
+    row = conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+    return default if row is None else row[0]
+
+
+def _set_watermark(conn, name, value):
+    conn.execute("INSERT OR REPLACE INTO watermarks (name, value) VALUES (?, ?)", (name, value))
+
+
+def _copy_sales(conn, rows):
+    sales = []
+    lines = []
+    for sale_id, timestamp, items, total, journal_key in rows:
+        day = timestamp[:10]
+        sale_lines = analytics.parse_sale_items(items)
+        sales.append((sale_id, timestamp, items, total, journal_key, day, sum(quantity for _, quantity in sale_lines)))
+        lines.extend((sale_id, day, item_name, quantity) for item_name, quantity in sale_lines)
+    conn.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?, ?)", sales)
+    conn.executemany("INSERT INTO sale_lines VALUES (?, ?, ?, ?)", lines)
+    _set_watermark(conn, "sales_max_id", sales[-1][0])
+    conn.commit()
+
+
+def _sync_items(conn, live_items):
+    copied = {row[0]: row for row in conn.execute("SELECT id, name, price, quantity, version FROM items")}
+    changed = [
+        (item_id, name, price, quantity, version, price * quantity)
+        for item_id, name, price, quantity, version in live_items
+        if copied.get(item_id) != (item_id, name, price, quantity, version)
+    ]
+    live_ids = {row[0] for row in live_items}
+    removed = [(item_id,) for item_id in copied if item_id not in live_ids]
+    conn.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)", changed)
+    conn.executemany("DELETE FROM items WHERE id = ?", removed)
+    conn.commit()
+    return len(changed), len(removed)
+
+
+def _lock_for(database_path):
+    key = os.path.abspath(database_path)
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def refresh(database_path):
+    """Brings the copy up to date with store.db; returns what was copied."""
+    started = time.perf_counter()
+    path = snapshot_path(database_path)
+    with _lock_for(database_path):
+        building = path if os.path.exists(path) else path + ".tmp"
+        conn = connect(building)
+        # Rebuilt from store.db if lost, so it need not survive a power cut
+        conn.execute("PRAGMA synchronous = NORMAL")
+        live = connect(database_path)
+        try:
+            # Building from scratch: indexing once at the end is cheaper
+            create_snapshot_schema(conn, indexes=building == path)
+            max_id = _watermark(conn, "sales_max_id")
+            # Archives only hold ids the copy has already seen once it exists
+            source = attach_archives(live, database_path) if not max_id else "sales"
+            live.execute("BEGIN")  # One snapshot of store.db for sales and items
+            rows = live.execute(f"SELECT id, timestamp, items, total, journal_key FROM {source} WHERE id > ? ORDER BY id", (max_id,))
+            sales = 0
+            while True:
+                chunk = rows.fetchmany(SYNC_CHUNK)
+                if not chunk:
+                    break
+                _copy_sales(conn, chunk)
+                sales += len(chunk)
+            live_items = live.execute("SELECT id, name, price, quantity, version FROM items").fetchall()
+            live.rollback()
+            items, removed = _sync_items(conn, live_items)
+            _set_watermark(conn, "refreshed_at", time.time())
+            conn.commit()
+            if building != path:
+                create_snapshot_schema(conn)
+                conn.execute("ANALYZE")
+        finally:
+            live.close()
+            conn.close()  # The last connection to close folds its WAL in
+        if building != path:
+            os.replace(building, path)
+    return {
+        "path": path,
+        "sales": sales,
+        "items": items,
+        "removed_items": removed,
+        "duration": time.perf_counter() - started,
+    }
+
+
+def reporting_path(database_path, up_to_date=False):
+    """The database reports should read: the copy once it exists, else store.db.
+
+    With ``up_to_date`` an existing copy is refreshed first, which costs
+    only the sales since the last refresh.
+    """
+    path = snapshot_path(database_path)
+    if not os.path.exists(path):
+        return database_path
+    if up_to_date:
+        refresh(database_path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.snapshot", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    args = parser.parse_args(argv)
+    storage.use_profile("back_office")
+    report = refresh(args.database)
+    print(
+        f"{report['path']}: {report['sales']} sales and {report['items']} items copied, "
+        f"{report['removed_items']} items removed in {report['duration']:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""The stock ledger: every change to an item's stock, and stock on any date.
+
+``items.quantity`` only says what is in stock now. Every write that changes
+it also appends a row to ``stock_moves`` in the same transaction: the item,
+when, why ("sale", "restock" or "adjustment") and by how much. Sales are
+dated with the sale's own timestamp, so a sale a till journaled a moment
+before its flush counts from when it was made. Manual edits that raise a
+quantity are restocks and edits that lower it are adjustments. New items
+arrive as a restock of their opening stock. Deleting an item deletes its
+history, since renumbering (see ``catalog.renumber_ids``) reuses its id.
+
+Replaying every move to answer "what was in stock on 1 March" gets slower
+with every sale, so ``checkpoint_stock`` periodically records the quantity
+of each item that moved since the last checkpoint. ``stock_on`` then costs,
+per item, one seek for the latest checkpoint at or before the date plus an
+indexed scan of the moves after it, at most one checkpoint interval's worth.
+Items that only have checkpoints after the date are worked back from the
+first one. Items that existed before the ledger get an opening checkpoint
+with their stock at that moment (see ``db.create_schema``), and earlier
+dates are answered with that.
+
+The apps call ``checkpoint_if_due`` every so often; it checkpoints when the
+last checkpoint is older than STORE_STOCK_CHECKPOINT_H hours (default 24).
+
+From the command line::
+
+    python -m store_core.stock --database store.db --on "2024-03-01 09:00:00"
+"""
+
+import argparse
+import datetime
+import os
+
+from store_core import storage
+from store_core.db import TIMESTAMP_FORMAT, connect
+from store_core.writer import write
+
+MOVE_REASONS = ("sale", "restock", "adjustment")
+CHECKPOINT_INTERVAL = float(os.environ.get("STORE_STOCK_CHECKPOINT_H", "24")) * 3600  # seconds
+
+
+def _now():
+    return datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def reason_for(change):
+    """The reason of a manual change: restock if it adds stock, else adjustment."""
+    return "restock" if change > 0 else "adjustment"
+
+
+def record_moves(conn, moves, timestamp=None, sale_id=None):
+    """Appends (item_id, change, reason) moves; call it from the writer job that changes the stock."""
+    timestamp = timestamp or _now()
+    conn.executemany(
+        "INSERT INTO stock_moves (item_id, timestamp, reason, change, sale_id) VALUES (?, ?, ?, ?, ?)",
+        [(item_id, timestamp, reason, change, sale_id) for item_id, change, reason in moves],
+    )
+
+
+def forget_items(conn, item_ids):
+    """Writer job part: deletes the history of deleted items."""
+    placeholders = ", ".join("?" * len(item_ids))
+    conn.execute(f"DELETE FROM stock_moves WHERE item_id IN ({placeholders})", item_ids)
+    conn.execute(f"DELETE FROM stock_checkpoints WHERE item_id IN ({placeholders})", item_ids)
+
+
+def renumber_item(conn, old_id, new_id):
+    """Writer job part: moves an item's history to its new id."""
+    conn.execute("UPDATE stock_moves SET item_id = ? WHERE item_id = ?", (new_id, old_id))
+    conn.execute("UPDATE stock_checkpoints SET item_id = ? WHERE item_id = ?", (new_id, old_id))
+
+
+def _take_checkpoints(conn, timestamp):
+    """Writer job: checkpoints every item that moved since the last run.
+
+    Inside the writer's transaction ``items.quantity`` is exactly the sum
+    of the item's moves so far, so the checkpoint is its current quantity.
+    """
+    row = conn.execute("SELECT move_id FROM stock_checkpoints ORDER BY timestamp DESC, move_id DESC LIMIT 1").fetchone()
+    since = row[0] if row else 0
+    max_move_id = conn.execute("SELECT coalesce(max(id), 0) FROM stock_moves").fetchone()[0]
+    if max_move_id == since:
+        return 0
+    return conn.execute(
+        "INSERT OR REPLACE INTO stock_checkpoints (item_id, timestamp, move_id, quantity)"
+        " SELECT id, ?, ?, quantity FROM items WHERE id IN (SELECT DISTINCT item_id FROM stock_moves WHERE id > ?)",
+        (timestamp, max_move_id, since),
+    ).rowcount
+
+
+def checkpoint_stock(database_path):
+    """Checkpoints the items that moved since the last checkpoint; returns how many."""
+    return write(database_path, _take_checkpoints, _now())
+
+
+def checkpoint_if_due(database_path, interval=CHECKPOINT_INTERVAL):
+    """Checkpoints when the last checkpoint is older than ``interval`` seconds.
+
+    Returns how many items were checkpointed, or None when none was due.
+    """
+    conn = connect(database_path)
+    try:
+        last = conn.execute("SELECT max(timestamp) FROM stock_checkpoints").fetchone()[0]
+    finally:
+        conn.close()
+    if last is not None:
+        age = datetime.datetime.now() - datetime.datetime.strptime(last, TIMESTAMP_FORMAT)
+        if age.total_seconds() < interval:
+            return None
+    return checkpoint_stock(database_path)
+
+
+def stock_on(database_path, when):
+    """Returns {item_id: quantity} of every current item as of ``when``.
+
+    ``when`` is a datetime or a timestamp string.
+    """
+    if isinstance(when, datetime.datetime):
+        when = when.strftime(TIMESTAMP_FORMAT)
+    conn = connect(database_path)
+    try:
+        conn.execute("BEGIN")  # Checkpoints and moves from one snapshot
+        # Forward from the latest checkpoint at or before the date: one seek
+        # each into stock_checkpoints, then the item's moves after it
+        latest = (
+            "SELECT {column} FROM stock_checkpoints c WHERE c.item_id = items.id AND c.timestamp <= :when"
+            " ORDER BY c.timestamp DESC, c.move_id DESC LIMIT 1"
+        )
+        rows = conn.execute(
+            "SELECT item_id, quantity + (SELECT coalesce(sum(change), 0) FROM stock_moves m"
+            "  WHERE m.item_id = base.item_id AND m.id > base.move_id AND m.timestamp <= :when)"
+            f" FROM (SELECT id AS item_id, ({latest.format(column='move_id')}) AS move_id,"
+            f" ({latest.format(column='quantity')}) AS quantity FROM items) AS base",
+            {"when": when},
+        ).fetchall()
+        stock = {}
+        backward = []
+        for item_id, quantity in rows:
+            if quantity is None:  # No checkpoint at or before the date
+                backward.append(item_id)
+            else:
+                stock[item_id] = quantity
+        for item_id in backward:
+            first = conn.execute(
+                "SELECT move_id, quantity FROM stock_checkpoints WHERE item_id = ? ORDER BY timestamp, move_id LIMIT 1",
+                (item_id,),
+            ).fetchone()
+            if first is None:  # No checkpoint yet: every move is after none
+                stock[item_id] = _changes(conn, item_id, "timestamp <= ?", (when,))
+                continue
+            move_id, quantity = first
+            stock[item_id] = (
+                quantity
+                - _changes(conn, item_id, "id <= ? AND timestamp > ?", (move_id, when))
+                + _changes(conn, item_id, "id > ? AND timestamp <= ?", (move_id, when))
+            )
+        conn.rollback()
+    finally:
+        conn.close()
+    return stock
+
+
+def _changes(conn, item_id, where, params):
+    return conn.execute(
+        f"SELECT coalesce(sum(change), 0) FROM stock_moves WHERE item_id = ? AND {where}", (item_id, *params)
+    ).fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m store_core.stock", description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="store.db")
+    parser.add_argument("--on", help='print the stock as of "YYYY-mm-dd[ HH:MM:SS]"')
+    parser.add_argument("--checkpoint", action="store_true", help="checkpoint the items that moved now")
+    args = parser.parse_args(argv)
+    storage.use_profile("back_office")
+    if args.checkpoint:
+        print(f"{checkpoint_stock(args.database)} items checkpointed")
+    if args.on:
+        when = args.on if len(args.on) > 10 else args.on + " 23:59:59"
+        conn = connect(args.database)
+        names = dict(conn.execute("SELECT id, name FROM items"))
+        conn.close()
+        for item_id, quantity in sorted(stock_on(args.database, when).items()):
+            print(f"{item_id}. {names.get(item_id, '?')}: {quantity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Connection settings shared by every app that opens store.db.
+
+The database runs in WAL mode so the back office can read while a till
+writes, and a till can write while a long report is reading. Each app picks
+a profile (STORE_DB_PROFILE overrides it):
+
+- ``till``: small cache, short busy timeout; checkout writes must not wait
+  behind anything for long
+- ``back_office``: larger cache and memory map for reports and bulk edits,
+  and a longer busy timeout since nobody is queueing at a counter
+
+Checkpoint policy: SQLite's automatic PASSIVE checkpoint runs on commit
+once the WAL reaches ``wal_autocheckpoint`` pages; it never waits for
+readers. The management app additionally calls ``checkpoint()`` every
+minute from a worker thread and with TRUNCATE when it closes, and
+``journal_size_limit`` shrinks the WAL file back after a checkpoint, so it
+does not keep the size of the largest burst.
+
+WAL needs the database on a local disk; it does not work over a network
+file share.
+"""
+
+import os
+import threading
+
+PROFILES = {
+    "till": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # Durable at each checkpoint, safe in WAL
+        "busy_timeout": 5000,  # ms
+        "cache_size": -8000,  # KiB (negative means size, not pages)
+        "mmap_size": 64 * 1024 * 1024,
+        "wal_autocheckpoint": 1000,  # pages
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "back_office": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 15000,
+        "cache_size": -65536,
+        "mmap_size": 256 * 1024 * 1024,
+        "wal_autocheckpoint": 1000,
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+}
+DEFAULT_PROFILE = "till"
+
+_profile_name = os.environ.get("STORE_DB_PROFILE", DEFAULT_PROFILE)
+_wal_ready = set()
+_wal_lock = threading.Lock()
+
+
+def use_profile(name):
+    """Selects the profile for connections opened from now on.
+
+    STORE_DB_PROFILE, when set, wins over the app's choice.
+    """
+    global _profile_name
+    if name not in PROFILES:
+        raise ValueError(f"unknown storage profile: {name}")
+    _profile_name = os.environ.get("STORE_DB_PROFILE", name)
+
+
+def current_profile():
+    return PROFILES[_profile_name]
+
+
+def configure(conn, database_path):
+    """Applies the current profile to a freshly opened connection."""
+    profile = current_profile()
+    # The journal mode is stored in the file, so set it once per process
+    key = os.path.abspath(database_path)
+    if key not in _wal_ready:
+        with _wal_lock:
+            if key not in _wal_ready:
+                conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}").fetchall()
+                _wal_ready.add(key)
+    for pragma in ("synchronous", "busy_timeout", "cache_size", "mmap_size", "wal_autocheckpoint", "journal_size_limit"):
+        conn.execute(f"PRAGMA {pragma} = {profile[pragma]}").fetchall()
+
+
+def checkpoint(conn, mode="PASSIVE"):
+    """Runs a WAL checkpoint and returns (busy, wal_pages, checkpointed_pages).
+
+    PASSIVE never blocks the tills; TRUNCATE also resets the WAL file and is
+    meant for when the app is closing.
+    """
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
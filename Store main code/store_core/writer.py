@@ -0,0 +1,160 @@
+"""One writer thread per database, with group commit.
+
+Every change to store.db (sales, stock and catalog edits) goes through
+``write``, which hands a function to the database's writer thread and waits
+for it. The writer takes whatever jobs are queued, runs each in its own
+SAVEPOINT inside a single transaction and commits them together, so one
+fsync covers the whole batch. A job that raises is rolled back on its own
+and its caller gets the exception; the rest of the batch still commits.
+
+The writer's connection uses synchronous=FULL, so when ``write`` returns the
+change is on disk. When jobs arrive together, the writer waits up to
+STORE_GROUP_COMMIT_MS (default 1 ms) for more before committing; a lone
+caller is committed straight away.
+
+Jobs are called as ``func(conn, *args)`` and must not commit, roll back or
+call ``write`` themselves.
+
+This serialises writers within one process. Separate apps still share the
+file through SQLite's own lock (see ``storage``).
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from store_core.db import connect
+
+WINDOW_MS = float(os.environ.get("STORE_GROUP_COMMIT_MS", "1"))
+MAX_BATCH = 256
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class Writer:
+    def __init__(self, database_path, window_ms=WINDOW_MS, max_batch=MAX_BATCH):
+        self.database_path = database_path
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.commits = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """Queues ``func(conn, *args)``; the Future resolves once it is committed."""
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def run(self, func, *args):
+        return self.submit(func, *args).result()
+
+    def close(self):
+        """Commits what is queued and stops the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _connect(self):
+        conn = connect(self.database_path)
+        conn.isolation_level = None  # The writer issues BEGIN/COMMIT itself
+        conn.execute("PRAGMA synchronous = FULL").fetchall()
+        return conn
+
+    def _run(self):
+        conn = None
+        last_batch = 0
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                batch = [job]
+                # Only wait for company when callers have been arriving together
+                deadline = time.monotonic() + (self.window if last_batch > 1 else 0)
+                stopping = False
+                while len(batch) < self.max_batch:
+                    try:
+                        remaining = deadline - time.monotonic()
+                        if remaining > 0:
+                            job = self._queue.get(timeout=remaining)
+                        else:
+                            job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stopping = True
+                        break
+                    batch.append(job)
+                if conn is None:
+                    try:
+                        conn = self._connect()
+                    except Exception as exc:  # Database unavailable; try again on the next batch
+                        for future, func, args in batch:
+                            future.set_exception(exc)
+                        continue
+                self._commit(conn, batch)
+                last_batch = len(batch)
+                if stopping:
+                    break
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, func, args in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((True, func(conn, *args)))
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO job")
+                    outcomes.append((False, exc))
+                conn.execute("RELEASE job")
+            conn.execute("COMMIT")
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for future, func, args in batch:
+                future.set_exception(exc)
+            return
+        self.commits += 1
+        self.jobs += len(batch)
+        for (future, func, args), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+def writer_for(database_path):
+    """Returns the writer for ``database_path``, starting it if needed."""
+    key = os.path.abspath(database_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = Writer(database_path)
+        return writer
+
+
+def write(database_path, func, *args):
+    """Runs ``func(conn, *args)`` on the writer and returns its result once durable."""
+    return writer_for(database_path).run(func, *args)
+
+
+def close_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,213 @@
+"""Optional detector for a blocked GUI thread.
+
+Two things are measured while the watchdog runs:
+
+- event-loop latency: a timer on the GUI thread is expected to fire every
+  ``interval_ms``; how late it fires is how long the loop was unable to
+  process input or repaint
+- slot duration: every method a window lists in ``TIMED_SLOTS`` is timed
+  per call
+
+A monitor thread notices when the timer stops firing for longer than
+``threshold_ms`` and captures the GUI thread's Python stack at that moment,
+so the log shows what the till was doing while it hung, not just that it
+did. Per-action histograms are logged when the app quits and can be
+written to JSON.
+
+Enable it with STORE_WATCHDOG=1; STORE_STALL_MS sets the threshold
+(default 250) and STORE_WATCHDOG_FILE a JSON file for the report.
+"""
+
+import collections
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+log = logging.getLogger("store.watchdog")
+
+# Upper bounds of the histogram buckets in milliseconds; a last bucket
+# catches everything slower. 16 ms is one frame at 60 Hz.
+BUCKETS_MS = (16, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_active = None
+
+
+class Histogram:
+    """Bucketed durations plus a window of recent samples for percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = collections.deque(maxlen=2000)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        bucket = 0
+        while bucket < len(BUCKETS_MS) and ms > BUCKETS_MS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.recent.append(ms)
+        self.count += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "p50_ms": recent[len(recent) // 2] if recent else None,
+            "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else None,
+            "max_ms": self.max_ms,
+            "histogram": dict(zip(labels, self.counts)),
+        }
+
+
+class StallWatchdog(QObject):
+    def __init__(self, threshold_ms=250, interval_ms=50):
+        super().__init__()
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.event_loop = Histogram()
+        self.actions = collections.defaultdict(Histogram)
+
+        self._gui_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._last_report = 0.0
+        self._stall_stack = None
+        self._running = False
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._beat)
+        self._monitor_thread = threading.Thread(
+            target=self._monitor, name="stall-watchdog", daemon=True
+        )
+
+    def start(self):
+        self._running = True
+        self._last_beat = time.monotonic()
+        self._timer.start()
+        self._monitor_thread.start()
+
+    def stop(self):
+        self._running = False
+        self._timer.stop()
+
+    def _beat(self):
+        now = time.monotonic()
+        previous = self._last_beat
+        late_ms = max(0.0, (now - previous) * 1000 - self.interval_ms)
+        self._last_beat = now
+        self.event_loop.add(late_ms)
+        # Stalls inside a timed slot have already been reported by it
+        if late_ms >= self.threshold_ms and self._last_report < previous:
+            self._report_stall("event loop", late_ms, "(stack not captured)\n")
+        self._stall_stack = None
+
+    def _monitor(self):
+        while self._running:
+            time.sleep(self.interval_ms / 2000)
+            blocked_ms = (time.monotonic() - self._last_beat) * 1000
+            if blocked_ms >= self.threshold_ms and self._stall_stack is None:
+                frame = sys._current_frames().get(self._gui_thread)
+                if frame is not None:
+                    self._stall_stack = "".join(traceback.format_stack(frame))
+
+    def _report_stall(self, action, ms, fallback_stack):
+        # Prefer the stack the monitor caught while the thread was stuck
+        stack = self._stall_stack or fallback_stack
+        self._stall_stack = None
+        self._last_report = time.monotonic()
+        log.warning("%s blocked the GUI thread for %.0f ms\n%s", action, ms, stack)
+
+    def time_slot(self, name, func):
+        """Wraps a slot so each call is timed under ``name``."""
+        # Qt passes every signal argument (e.g. clicked's "checked") the
+        # wrapper accepts, so only forward as many as the slot takes.
+        parameters = inspect.signature(func).parameters.values()
+        if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+            max_args = None
+        else:
+            max_args = len(parameters) - 1  # Without self
+
+        @functools.wraps(func)
+        def timed(widget, *args):
+            if max_args is not None:
+                args = args[:max_args]
+            started = time.perf_counter()
+            try:
+                return func(widget, *args)
+            finally:
+                ms = (time.perf_counter() - started) * 1000
+                self.actions[name].add(ms)
+                if ms >= self.threshold_ms:
+                    self._report_stall(name, ms, "".join(traceback.format_stack()))
+
+        return timed
+
+    def report(self):
+        return {
+            "threshold_ms": self.threshold_ms,
+            "event_loop": self.event_loop.as_dict(),
+            "actions": {name: histogram.as_dict() for name, histogram in sorted(self.actions.items())},
+        }
+
+    def log_report(self):
+        report = self.report()
+        lines = ["UI responsiveness (ms):"]
+        for name, stats in [("event loop latency", report["event_loop"])] + list(report["actions"].items()):
+            lines.append(
+                f"  {name:40} n={stats['count']:<6} p50={stats['p50_ms'] or 0:8.1f} "
+                f"p95={stats['p95_ms'] or 0:8.1f} max={stats['max_ms']:8.1f}  "
+                + " ".join(f"{label}:{count}" for label, count in stats["histogram"].items() if count)
+            )
+        log.info("\n".join(lines))
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def install(*widget_classes, threshold_ms=250, interval_ms=50):
+    """Starts a watchdog and times the TIMED_SLOTS of each widget class.
+
+    Must be called after the QApplication exists and before the windows
+    are created, because Qt connects to whatever method the class has at
+    that point.
+    """
+    global _active
+    watchdog = StallWatchdog(threshold_ms, interval_ms)
+    for cls in widget_classes:
+        for slot in getattr(cls, "TIMED_SLOTS", ()):
+            setattr(cls, slot, watchdog.time_slot(f"{cls.__name__}.{slot}", getattr(cls, slot)))
+    app = QApplication.instance()
+    app.aboutToQuit.connect(watchdog.stop)
+    app.aboutToQuit.connect(watchdog.log_report)
+    watchdog.start()
+    _active = watchdog
+    return watchdog
+
+
+def install_from_env(*widget_classes):
+    """Calls install() when STORE_WATCHDOG is set; returns the watchdog or None."""
+    if os.environ.get("STORE_WATCHDOG", "0") in ("", "0"):
+        return None
+    watchdog = install(*widget_classes, threshold_ms=float(os.environ.get("STORE_STALL_MS", "250")))
+    if os.environ.get("STORE_WATCHDOG_FILE"):
+        QApplication.instance().aboutToQuit.connect(
+            lambda: watchdog.dump(os.environ["STORE_WATCHDOG_FILE"])
+        )
+    return watchdog
+
+
+def active():
+    """Returns the running watchdog, if any."""
+    return _active
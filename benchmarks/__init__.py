@@ -0,0 +1,15 @@
+"""Reproducible benchmarks for the store apps.
+
+Run ``python -m benchmarks --help`` from the repository root. The apps live
+in ``Store main code/``, which is not a package, so it is put on ``sys.path``
+here for the benchmark modules to import ``cashier`` and ``Managment``.
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Store main code"
+)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
@@ -0,0 +1,181 @@
+"""Command line entry point: ``python -m benchmarks``."""
+
+import argparse
+import datetime
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _database_info(path):
+    conn = sqlite3.connect(path)
+    info = {
+        "path": path,
+        "items": conn.execute("SELECT COUNT(*) FROM items").fetchone()[0],
+        "sales": conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0],
+    }
+    conn.close()
+    return info
+
+
+def cmd_generate(args):
+    from benchmarks.generate import generate_store
+
+    end = datetime.datetime.fromisoformat(args.end) if args.end else None
+    generate_store(args.output, skus=args.skus, sales=args.sales, years=args.years, zipf_s=args.zipf, seed=args.seed, end=end)
+    print(json.dumps(_database_info(args.output)))
+
+
+def _write_report(output, **fields):
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+    }
+    report.update(fields)
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def cmd_run(args):
+    suites = args.suite or ["core", "inventory", "cashier", "sales"]
+    results = {}
+    if "core" in suites:
+        from benchmarks import core_paths
+
+        results.update(core_paths.run(args.database, args.repeat, args.seed))
+    gui_suites = [suite for suite in suites if suite != "core"]
+    if gui_suites:
+        from benchmarks import hot_paths
+
+        results.update(hot_paths.run(args.database, gui_suites, args.repeat, args.seed))
+    _write_report(args.output, database=_database_info(args.database), results=results)
+
+
+def cmd_widgets(args):
+    from benchmarks import widgets
+
+    _write_report(
+        args.output,
+        results=widgets.run(args.widget, args.rows or widgets.ROW_COUNTS),
+    )
+
+
+def cmd_checkout_load(args):
+    from benchmarks import checkout_load
+
+    _write_report(
+        args.output,
+        results=checkout_load.run(
+            args.tills or [1, 2, 4, 8],
+            checkouts=args.checkouts,
+            skus=args.skus,
+            items_per_sale=args.items_per_sale,
+            database=args.database,
+            seed=args.seed,
+            service=args.service,
+            backup=args.backup,
+        ),
+    )
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    for name in sorted(set(baseline) & set(current)):
+        # Hot paths report a median, widget cases populate and repaint times
+        # and load tests their p99 checkout latency
+        if "median" in current[name]:
+            fields = ["median"]
+        elif "latency_p99" in current[name]:
+            fields = ["latency_p99"]
+        else:
+            fields = ["populate", "repaint"]
+        for field in fields:
+            before = baseline[name][field]
+            after = current[name][field]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            label = name if field == "median" else f"{name} {field}"
+            print(f"{label:48} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms  {change:+7.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="build a synthetic store.db")
+    generate.add_argument("output")
+    generate.add_argument("--skus", type=int, default=10_000, help="number of items (up to 1,000,000)")
+    generate.add_argument("--sales", type=int, default=100_000, help="number of sales (up to 10,000,000)")
+    generate.add_argument("--years", type=int, default=3, help="years of history")
+    generate.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--end", help="timestamp of the newest sale (default: midnight today)")
+    generate.set_defaults(func=cmd_generate)
+
+    run = commands.add_parser("run", help="time the hot paths and write JSON")
+    run.add_argument("database")
+    run.add_argument("-o", "--output", help="JSON file to write (default: stdout)")
+    run.add_argument("--suite", action="append", choices=["core", "inventory", "cashier", "sales"], help="only run this suite (repeatable)")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--seed", type=int, default=0)
+    run.set_defaults(func=cmd_run)
+
+    widgets = commands.add_parser("widgets", help="time widget population offscreen and write JSON")
+    widgets.add_argument("-o", "--output", help="JSON file to write (default: stdout)")
+    widgets.add_argument("--widget", action="append", choices=["item_table", "products_list", "sales_listbox"], help="only measure this widget (repeatable)")
+    widgets.add_argument("--rows", type=int, action="append", help="row count to measure (repeatable, default: 1k, 10k, 100k and 1M)")
+    widgets.set_defaults(func=cmd_widgets)
+
+    load = commands.add_parser("checkout-load", help="run concurrent tills against one database")
+    load.add_argument("-o", "--output", help="JSON file to write (default: stdout)")
+    load.add_argument("--tills", type=int, action="append", help="number of concurrent tills (repeatable, default: 1, 2, 4 and 8)")
+    load.add_argument("--checkouts", type=int, default=200, help="checkouts per till")
+    load.add_argument("--items-per-sale", type=int, default=3)
+    load.add_argument("--skus", type=int, default=200, help="catalog size when no database is given")
+    load.add_argument("--database", help="start from a copy of this database instead of a synthetic one")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--service", action="store_true", help="run the tills in client mode against store_core.service")
+    load.add_argument("--backup", action="store_true", help="take online backups back to back while the tills run")
+    load.set_defaults(func=cmd_checkout_load)
+
+    compare = commands.add_parser("compare", help="compare two result files")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10, help="slowdown reported as a regression")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Running the real widgets headlessly."""
+
+import contextlib
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QDialog, QInputDialog, QMessageBox
+
+_app = None
+
+
+def ensure_app():
+    """Returns the QApplication, creating an offscreen one if needed."""
+    global _app
+    _app = QApplication.instance() or QApplication(["benchmarks"])
+    return _app
+
+
+@contextlib.contextmanager
+def quiet_dialogs(quantity=1, payment=None):
+    """Replaces modal dialogs with instant answers.
+
+    ``QInputDialog.getInt`` answers ``quantity`` and ``getDouble`` answers
+    ``payment``, or an amount large enough to cover any cart. Message boxes
+    and dialogs return immediately.
+    """
+    saved = (
+        QMessageBox.information,
+        QMessageBox.warning,
+        QInputDialog.getInt,
+        QInputDialog.getDouble,
+        QDialog.exec_,
+    )
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QInputDialog.getInt = staticmethod(lambda *args, **kwargs: (quantity, True))
+    QInputDialog.getDouble = staticmethod(
+        lambda *args, **kwargs: (payment if payment is not None else 1e12, True)
+    )
+    QDialog.exec_ = lambda self: QDialog.Accepted
+    try:
+        yield
+    finally:
+        (
+            QMessageBox.information,
+            QMessageBox.warning,
+            QInputDialog.getInt,
+            QInputDialog.getDouble,
+            QDialog.exec_,
+        ) = saved
+
+
+def wait_for_loader(widget, attribute):
+    """Blocks until the RowLoader in ``widget.<attribute>`` has delivered."""
+    app = ensure_app()
+    loader = getattr(widget, attribute)
+    while loader is not None:
+        loader.wait()
+        app.processEvents()
+        loader = getattr(widget, attribute)
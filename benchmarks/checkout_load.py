@@ -0,0 +1,268 @@
+"""Several tills checking out against one database at the same time.
+
+Every till is a separate process running a real ``CashierApp`` (offscreen)
+and ringing up sales through ``add_to_cart`` and ``checkout``, exactly as a
+cashier would. ``save_sales`` and ``save_products`` are wrapped with a retry
+on "database is locked" so a busy database costs time instead of ending the
+run; the wrapper counts the retries and the time spent in attempts that
+failed on the lock.
+
+With ``service=True`` the tills run in client mode against a
+``store_core.service`` process on a Unix socket instead of opening the
+database themselves.
+
+Local tills journal their sales (see ``store_core.journal``), so checkout
+latency here is the journal append; each till flushes what is left of its
+journal before it reports.
+
+With ``backup=True`` the parent process takes online backups
+(``store_core.backup``) back to back for as long as the tills run, so the
+latencies can be compared with a run without backups; the report adds the
+backup durations and their longest step.
+
+When all tills are done the stock left in ``items`` is compared with the
+starting stock minus every unit the tills actually sold. Any item where the
+two disagree is a stock-consistency violation (typically a lost update).
+"""
+
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import APP_DIR
+from benchmarks.generate import generate_store
+
+INITIAL_STOCK = 1_000_000
+MAX_RETRIES = 5
+
+
+def _with_retry(func, stats):
+    def call(*args):
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as exc:
+                if "locked" not in str(exc) or attempt == MAX_RETRIES:
+                    raise
+                stats["lock_wait"] += time.perf_counter() - started
+                stats["retries"] += 1
+
+    return call
+
+
+def _till(path, checkouts, items_per_sale, seed, barrier, results, service_address=None):
+    """Body of one till process; puts its stats on ``results``."""
+    from benchmarks._qt import ensure_app, quiet_dialogs, wait_for_loader
+
+    import cashier
+    from store_core.client import StoreClient
+
+    cashier.DATABASE_PATH = path
+    if service_address:
+        cashier.service = StoreClient(service_address)
+    ensure_app()
+    rng = random.Random(seed)
+    stats = {
+        "checkouts": 0,
+        "failed": 0,
+        "retries": 0,
+        "lock_wait": 0.0,
+        "latencies": [],
+        "units_sold": {},
+    }
+    with quiet_dialogs(quantity=1):
+        till = cashier.CashierApp()
+        wait_for_loader(till, "products_loader")
+        row_of = {product_id: row for row, product_id in enumerate(till.products)}
+        product_ids = list(till.products)
+
+        saved = []
+        save_sales = _with_retry(till.save_sales, stats)
+
+        def record_sale(total, payment_amount):
+            save_sales(total, payment_amount)
+            saved.append(dict(till.cart))
+
+        till.save_sales = record_sale
+        till.save_products = _with_retry(till.save_products, stats)
+
+        barrier.wait()
+        for _ in range(checkouts):
+            for product_id in rng.sample(product_ids, items_per_sale):
+                till.products_list.setCurrentRow(row_of[product_id])
+                till.add_to_cart()
+            started = time.perf_counter()
+            try:
+                till.checkout()
+                stats["checkouts"] += 1
+            except sqlite3.OperationalError:
+                stats["failed"] += 1
+                till.clear_cart()
+            stats["latencies"].append(time.perf_counter() - started)
+        if till.sales_journal is not None:
+            till.sales_journal.close()  # Store what is still journaled before the stock check
+
+        for cart in saved:
+            for product_id, quantity in cart.items():
+                stats["units_sold"][product_id] = stats["units_sold"].get(product_id, 0) + quantity
+    results.put(stats)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _start_service(path, socket_path, timeout=10):
+    """Starts store_core.service on ``socket_path`` and waits until it accepts."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "store_core.service", "--database", path, "--unix", socket_path, "--backup-dir", ""],
+        cwd=APP_DIR,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX) as probe:
+                probe.connect(socket_path)
+            return server
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("store service did not start")
+            time.sleep(0.05)
+
+
+def _back_up_until(path, done, reports):
+    from store_core import backup
+
+    backup_dir = os.path.join(os.path.dirname(path), "backups")
+    while not done.is_set():
+        reports.append(backup.backup(path, backup_dir, keep=1))
+
+
+def run_load(path, tills, checkouts, items_per_sale=3, seed=0, service=False, backup=False):
+    """Runs ``tills`` concurrent tills against ``path`` and returns a report."""
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE items SET quantity = ?", (INITIAL_STOCK,))
+    conn.execute("DELETE FROM sales")
+    conn.commit()
+    initial = dict(conn.execute("SELECT id, quantity FROM items"))
+    conn.close()
+
+    server = None
+    service_address = None
+    if service:
+        socket_path = os.path.join(os.path.dirname(path), "store.sock")
+        server = _start_service(path, socket_path)
+        service_address = "unix:" + socket_path
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(tills + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_till,
+            args=(path, checkouts, items_per_sale, seed + number, barrier, results, service_address),
+        )
+        for number in range(tills)
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()  # Every till has loaded its catalog
+    started = time.perf_counter()
+    backups = []
+    if backup:
+        done = threading.Event()
+        backer = threading.Thread(target=_back_up_until, args=(path, done, backups))
+        backer.start()
+    till_stats = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    if backup:
+        done.set()
+        backer.join()
+    for process in processes:
+        process.join()
+    if server is not None:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+    units_sold = {}
+    latencies = []
+    for stats in till_stats:
+        latencies.extend(stats["latencies"])
+        for product_id, quantity in stats["units_sold"].items():
+            units_sold[product_id] = units_sold.get(product_id, 0) + quantity
+
+    conn = sqlite3.connect(path)
+    final = dict(conn.execute("SELECT id, quantity FROM items"))
+    sales_rows = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+    conn.close()
+    violations = 0
+    lost_units = 0
+    for product_id, quantity in initial.items():
+        expected = quantity - units_sold.get(product_id, 0)
+        if final.get(product_id) != expected:
+            violations += 1
+            lost_units += abs(final.get(product_id, 0) - expected)
+
+    completed = sum(stats["checkouts"] for stats in till_stats)
+    report = {
+        "tills": tills,
+        "service": service,
+        "checkouts": completed,
+        "failed_checkouts": sum(stats["failed"] for stats in till_stats),
+        "sales_rows": sales_rows,
+        "elapsed": elapsed,
+        "checkouts_per_sec": completed / elapsed if elapsed else 0.0,
+        "latency_p50": _percentile(latencies, 0.50),
+        "latency_p99": _percentile(latencies, 0.99),
+        "latency_mean": statistics.fmean(latencies) if latencies else None,
+        "lock_wait": sum(stats["lock_wait"] for stats in till_stats),
+        "retries": sum(stats["retries"] for stats in till_stats),
+        "stock_violations": violations,
+        "stock_units_off": lost_units,
+    }
+    if backup:
+        report["backups"] = len(backups)
+        report["backup_duration_mean"] = statistics.fmean(r["duration"] for r in backups) if backups else None
+        report["backup_longest_step"] = max((r["longest_step"] for r in backups), default=None)
+    return report
+
+
+def _copy_database(source_path, target_path):
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    source.backup(target)
+    target.close()
+    source.close()
+
+
+def run(till_counts, checkouts=200, skus=200, items_per_sale=3, database=None, seed=0, service=False, backup=False):
+    """Runs the load test once per till count on a fresh copy of the data."""
+    reports = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        template = os.path.join(workdir, "template.db")
+        if database is None:
+            generate_store(template, skus=skus, sales=0, seed=seed)
+        else:
+            _copy_database(database, template)
+        for tills in till_counts:
+            path = os.path.join(workdir, f"tills-{tills}.db")
+            _copy_database(template, path)
+            options = ",".join(option for option, on in (("service", service), ("backup", backup)) if on)
+            name = f"checkout_load[{options},{tills}]" if options else f"checkout_load[{tills}]"
+            reports[name] = run_load(path, tills, checkouts, items_per_sale, seed, service, backup)
+    return reports
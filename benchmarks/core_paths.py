@@ -0,0 +1,71 @@
+"""Timings for the store_core services, without Qt.
+
+These are the same operations as the GUI hot paths minus the widgets, so
+the two suites together show how much of each path is database and Python
+work and how much is the view.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+
+import benchmarks  # noqa: F401  (puts the app directory on sys.path)
+from benchmarks.hot_paths import _latest_sale, _sample_names, measure
+
+from store_core import analytics, catalog, writer
+from store_core.checkout import record_sale
+
+
+def run(database, repeat=5, seed=0):
+    """Runs the core suite against a copy of ``database``."""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "store.db")
+        shutil.copyfile(database, path)
+
+        term = _sample_names(path, 1, seed)[0].split(" #")[0]
+        results["core.catalog.list_items"] = measure(lambda: catalog.list_items(path), repeat)
+        results["core.catalog.search_items"] = measure(lambda: catalog.search_items(path, term), repeat)
+
+        products = catalog.load_products(path)
+        results["core.catalog.load_products"] = measure(lambda: catalog.load_products(path), repeat)
+        in_stock = [product_id for product_id, product in products.items() if product["quantity"] > 10]
+        rng = random.Random(seed)
+        cart = {}
+
+        def fill_cart():
+            cart.clear()
+            for product_id in rng.sample(in_stock, min(3, len(in_stock))):
+                cart[product_id] = 1
+
+        results["core.checkout.record_sale"] = measure(
+            lambda: record_sale(path, cart, products, 1.0), repeat, setup=fill_cart
+        )
+
+        def concurrent_sales(threads=16, per_thread=25):
+            # One item per sale, spread so stock never runs out mid-run
+            def till(offset):
+                for i in range(per_thread):
+                    product_id = in_stock[(offset + i * threads) % len(in_stock)]
+                    record_sale(path, {product_id: 1}, products, 1.0)
+
+            workers = [threading.Thread(target=till, args=(n,)) for n in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        # 400 sales from 16 threads; shows what group commit buys
+        results["core.checkout.record_sale[16 threads x 25]"] = measure(concurrent_sales, repeat)
+
+        sales = analytics.load_sales(path)
+        latest = _latest_sale(path)
+        year = latest[:4] if latest else ""
+        results["core.analytics.load_sales"] = measure(lambda: analytics.load_sales(path), repeat)
+        results["core.analytics.summarize_sales[year]"] = measure(
+            lambda: analytics.summarize_sales(analytics.filter_sales(sales, year, "", "")), repeat
+        )
+        writer.close_all()
+    return results
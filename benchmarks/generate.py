@@ -0,0 +1,125 @@
+"""Synthetic store.db generator.
+
+Builds a database with the same schema as the apps, ``skus`` items and
+``sales`` sales spread evenly over the last ``years`` years. Item popularity
+follows a Zipf distribution so a few lines sell far more than the long tail,
+like a real shop. The same seed and end date always produce the same file.
+"""
+
+import datetime
+import os
+import random
+import sqlite3
+
+CATEGORIES = [
+    "Shirt", "T-Shirt", "Jeans", "Chinos", "Dress", "Skirt", "Jacket", "Coat",
+    "Sweater", "Hoodie", "Shorts", "Socks", "Scarf", "Hat", "Belt", "Shoes",
+]
+COLORS = [
+    "Black", "White", "Navy", "Grey", "Red", "Green", "Beige", "Brown",
+    "Blue", "Pink", "Olive", "Yellow",
+]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+
+BATCH_SIZE = 50_000
+
+
+def _item_rows(rng, skus):
+    for i in range(1, skus + 1):
+        name = f"{rng.choice(COLORS)} {rng.choice(CATEGORIES)} {rng.choice(SIZES)} #{i}"
+        price = round(min(rng.lognormvariate(5.5, 0.6), 20_000.0), 2)
+        quantity = rng.randint(0, 500)
+        yield (i, name, price, quantity)
+
+
+def _popularity(rng, skus, zipf_s):
+    """Returns (ids, cumulative weights) for Zipf-distributed picks."""
+    ids = list(range(1, skus + 1))
+    rng.shuffle(ids)  # The best sellers are not simply the first ids
+    cum_weights = []
+    running = 0.0
+    for rank in range(1, skus + 1):
+        running += 1.0 / rank ** zipf_s
+        cum_weights.append(running)
+    return ids, cum_weights
+
+
+def _sale_rows(rng, sales, names, prices, ids, cum_weights, years, end):
+    start = end - datetime.timedelta(days=365 * years)
+    span = (end - start).total_seconds()
+    for sale_id in range(1, sales + 1):
+        # Evenly spaced with jitter keeps ids in timestamp order, like the tills
+        offset = span * (sale_id - rng.random()) / sales
+        timestamp = start + datetime.timedelta(seconds=int(offset))
+        lines = {}
+        for item_id in rng.choices(ids, cum_weights=cum_weights, k=min(int(rng.expovariate(0.6)) + 1, 8)):
+            lines[item_id] = lines.get(item_id, 0) + rng.randint(1, 3)
+        total = sum(prices[item_id] * quantity for item_id, quantity in lines.items())
+        items_str = ", ".join(f"{names[item_id]} x {quantity}" for item_id, quantity in lines.items())
+        yield (sale_id, timestamp.strftime("%Y-%m-%d %H:%M:%S"), items_str, round(total, 2))
+
+
+def _insert_batched(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def generate_store(path, skus=10_000, sales=100_000, years=3, zipf_s=1.1, seed=0, end=None):
+    """Writes a synthetic store database to ``path``, replacing any old file.
+
+    ``end`` is the datetime of the newest sale and defaults to midnight today.
+    """
+    if skus < 1:
+        raise ValueError("skus must be at least 1")
+    if end is None:
+        end = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(path)
+    # Durability is pointless while building a throwaway file
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("""
+        CREATE TABLE items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME NOT NULL,
+            items TEXT NOT NULL,
+            total REAL NOT NULL,
+            journal_key TEXT
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX sales_journal_key ON sales (journal_key)")
+
+    items = list(_item_rows(rng, skus))
+    _insert_batched(conn, "INSERT INTO items (id, name, price, quantity) VALUES (?, ?, ?, ?)", items)
+    names = {row[0]: row[1] for row in items}
+    prices = {row[0]: row[2] for row in items}
+    del items
+
+    ids, cum_weights = _popularity(rng, skus, zipf_s)
+    _insert_batched(
+        conn,
+        "INSERT INTO sales (id, timestamp, items, total) VALUES (?, ?, ?, ?)",
+        _sale_rows(rng, sales, names, prices, ids, cum_weights, years, end),
+    )
+    # Built after the bulk insert, which is faster than maintaining it throughout
+    conn.execute("CREATE INDEX sales_timestamp ON sales (timestamp)")
+    conn.commit()
+    conn.close()
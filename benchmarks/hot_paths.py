@@ -0,0 +1,156 @@
+"""Timings for the hot paths of the store apps.
+
+Every benchmark drives the real code (widgets included) against a private
+copy of the database, using the offscreen Qt platform so no display is
+needed.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks._qt import ensure_app, quiet_dialogs, wait_for_loader
+
+import Managment
+import cashier
+
+
+def measure(func, repeat=5, setup=None):
+    """Runs ``func`` ``repeat`` times and returns timing stats in seconds."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "runs": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+
+
+def _use_database(path):
+    Managment.DATABASE_PATH = path
+    cashier.DATABASE_PATH = path
+
+
+def _sample_names(path, count, seed):
+    conn = sqlite3.connect(path)
+    max_id = conn.execute("SELECT MAX(id) FROM items").fetchone()[0] or 0
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        row = conn.execute(
+            "SELECT name FROM items WHERE id >= ? ORDER BY id LIMIT 1",
+            (rng.randint(1, max_id),),
+        ).fetchone()
+        if row:
+            names.append(row[0])
+    conn.close()
+    return names
+
+
+def _latest_sale(path):
+    conn = sqlite3.connect(path)
+    row = conn.execute("SELECT timestamp FROM sales ORDER BY id DESC LIMIT 1").fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def bench_inventory(path, repeat, seed):
+    inventory = Managment.InventoryApp()
+    wait_for_loader(inventory, "_loader")
+
+    def load_items():
+        inventory._load_items()
+        wait_for_loader(inventory, "_loader")
+
+    # A name fragment as typed by a manager looking for one line
+    term = _sample_names(path, 1, seed)[0].split(" #")[0]
+    inventory.search_entry.setText(term)
+
+    results = {
+        "inventory._load_items": measure(load_items, repeat),
+        "inventory._search_items": measure(inventory._search_items, repeat),
+    }
+    inventory.deleteLater()
+    return results
+
+
+def bench_cashier(path, repeat, seed):
+    till = cashier.CashierApp()
+    wait_for_loader(till, "products_loader")
+    rng = random.Random(seed)
+    product_ids = [product_id for product_id, product in till.products.items() if product["quantity"] > 10]
+    if not product_ids:
+        raise RuntimeError("benchmark database has no items in stock")
+
+    term = _sample_names(path, 1, seed)[0].split(" #")[0]
+    till.name_search_entry.setText(term)
+
+    def fill_cart():
+        till.cart.clear()
+        for product_id in rng.sample(product_ids, min(3, len(product_ids))):
+            till.cart[product_id] = 1
+            till.products[product_id]["quantity"] -= 1
+
+    def refill_stock():
+        # Keeps repeated checkouts from running the sampled lines dry
+        for product_id in product_ids:
+            till.products[product_id]["quantity"] = max(till.products[product_id]["quantity"], 10)
+
+    results = {
+        "cashier.search_by_name": measure(till.search_by_name, repeat),
+        "cashier.save_sales": measure(lambda: till.save_sales(till.calculate_total(), 0), repeat, setup=fill_cart),
+        "cashier.save_products": measure(till.save_products, repeat, setup=fill_cart),
+        "cashier.checkout": measure(till.checkout, repeat, setup=lambda: (refill_stock(), fill_cart())),
+    }
+    till.deleteLater()
+    return results
+
+
+def bench_sales(path, repeat, seed):
+    sales = Managment.load_sales_data()
+    latest = _latest_sale(path)
+    year, month = (latest[:4], str(int(latest[5:7]))) if latest else ("", "")
+    return {
+        "sales.load_sales_data": measure(Managment.load_sales_data, repeat),
+        "sales.analyze_sales_data[year]": measure(lambda: Managment.analyze_sales_data(sales, year, "", ""), repeat),
+        "sales.analyze_sales_data[month]": measure(lambda: Managment.analyze_sales_data(sales, year, month, ""), repeat),
+        "sales.load_sales_data[month]": measure(lambda: Managment.load_sales_data(year, month, ""), repeat),
+        "sales.fetch_sales_page[year]": measure(lambda: Managment.fetch_sales_page(year, "", "", None, 500), repeat),
+        # The first call fills the report cache; the rest are repeat requests
+        "sales.load_sales_summary[year]": measure(lambda: Managment.load_sales_summary(year, "", ""), repeat),
+    }
+
+
+SUITES = {
+    "inventory": bench_inventory,
+    "cashier": bench_cashier,
+    "sales": bench_sales,
+}
+
+
+def run(database, suites=None, repeat=5, seed=0):
+    """Runs the selected suites against a copy of ``database``.
+
+    Returns a mapping of benchmark name to timing stats.
+    """
+    ensure_app()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "store.db")
+        shutil.copyfile(database, path)
+        _use_database(path)
+        with quiet_dialogs():
+            for name in suites or SUITES:
+                results.update(SUITES[name](path, repeat, seed))
+    return results
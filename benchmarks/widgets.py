@@ -0,0 +1,133 @@
+"""Population, repaint and memory costs of the big widgets.
+
+Each case fills one real widget with ``rows`` synthetic rows the way the app
+does, then forces a full repaint with ``QWidget.grab()``. Memory is the
+growth of the process resident set size, which, unlike tracemalloc, also
+counts the C++ objects Qt allocates for every item.
+"""
+
+import datetime
+import gc
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks._qt import ensure_app, quiet_dialogs, wait_for_loader
+from benchmarks.hot_paths import _use_database
+
+import Managment
+import cashier
+
+ROW_COUNTS = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def _rss_bytes():
+    # Linux only, like the rest of the headless tooling
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _item_rows(rows):
+    return [(i, f"Item #{i}", 100.0 + i % 997, i % 500, 0) for i in range(1, rows + 1)]
+
+
+def _store_sales(path, rows):
+    """Replaces the sales in ``path`` with ``rows`` synthetic sales."""
+    start = datetime.datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM sales")
+    conn.executemany(
+        "INSERT INTO sales (id, timestamp, items, total) VALUES (?, ?, ?, ?)",
+        (
+            (
+                i,
+                (start + datetime.timedelta(seconds=30 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+                f"Item #{i % 5000} x 1, Item #{i % 777} x 2",
+                250.0,
+            )
+            for i in range(1, rows + 1)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def populate_item_table(rows):
+    inventory = Managment.InventoryApp()
+    wait_for_loader(inventory, "_loader")
+    data = _item_rows(rows)
+    inventory.item_table.setRowCount(0)
+    return inventory, inventory.item_table, lambda: inventory._append_rows(data)
+
+
+def populate_products_list(rows):
+    till = cashier.CashierApp()
+    wait_for_loader(till, "products_loader")
+    till.products = {
+        row[0]: {"id": row[0], "name": row[1], "price": row[2], "quantity": row[3]}
+        for row in _item_rows(rows)
+    }
+    return till, till.products_list, till.display_products
+
+
+def populate_sales_listbox(rows):
+    sales_page = Managment.SalesDataAnalysis()
+    _store_sales(Managment.DATABASE_PATH, rows)
+    # No day filter: the whole period is in the list, paged in as it scrolls
+    return sales_page, sales_page.sales_listbox, lambda: Managment.display_sales_data(
+        sales_page.sales_model, "2024", "", ""
+    )
+
+
+WIDGETS = {
+    "item_table": populate_item_table,
+    "products_list": populate_products_list,
+    "sales_listbox": populate_sales_listbox,
+}
+
+
+def measure_widget(name, rows):
+    """Returns population time, repaint time and memory growth for one case."""
+    app = ensure_app()
+    gc.collect()
+    rss_before = _rss_bytes()
+
+    owner, widget, populate = WIDGETS[name](rows)
+    owner.resize(1024, 768)
+    owner.show()
+    app.processEvents()
+
+    started = time.perf_counter()
+    populate()
+    app.processEvents()
+    populated = time.perf_counter() - started
+
+    started = time.perf_counter()
+    widget.grab()
+    repainted = time.perf_counter() - started
+    rss_after = _rss_bytes()
+
+    owner.close()
+    owner.deleteLater()
+    app.processEvents()
+    return {
+        "rows": rows,
+        "populate": populated,
+        "repaint": repainted,
+        "memory_bytes": rss_after - rss_before,
+    }
+
+
+def run(widgets=None, row_counts=ROW_COUNTS):
+    """Measures every widget at every row count."""
+    ensure_app()
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # The apps read their own (empty) database while the widgets are built
+        _use_database(os.path.join(workdir, "store.db"))
+        with quiet_dialogs():
+            for name in widgets or WIDGETS:
+                for rows in row_counts:
+                    results[f"widgets.{name}[{rows}]"] = measure_widget(name, rows)
+    return results
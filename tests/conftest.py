@@ -0,0 +1,40 @@
+"""Shared fixtures for the store_core tests.
+
+The apps live in ``Store main code/``, which is not a package, so it is put
+on ``sys.path`` here, as ``benchmarks`` does.
+"""
+
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Store main code")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from store_core import catalog  # noqa: E402
+from store_core.db import connect, create_schema  # noqa: E402
+
+ITEMS = [("shirt", 250.0, 30), ("pants", 120.0, 20), ("socks", 15.0, 100)]
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A new store.db with ITEMS, ids 1 to 3."""
+    path = str(tmp_path / "store.db")
+    create_schema(path)
+    catalog.add_items(path, ITEMS)
+    return path
+
+
+def query(database_path, sql, params=()):
+    conn = connect(database_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def quantities(database_path):
+    return dict(query(database_path, "SELECT id, quantity FROM items"))
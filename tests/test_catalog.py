@@ -0,0 +1,38 @@
+import pytest
+
+from conftest import query
+from store_core import ConflictError, catalog
+
+
+def _version(database, item_id):
+    return query(database, "SELECT version FROM items WHERE id = ?", (item_id,))[0][0]
+
+
+def test_update_with_the_loaded_version_succeeds(database):
+    version = _version(database, 1)
+    new_version = catalog.update_item(database, 1, "shirt", 260.0, 30, version)
+    assert new_version == version + 1
+    assert query(database, "SELECT price FROM items WHERE id = 1") == [(260.0,)]
+
+
+def test_update_after_someone_else_changed_the_item_conflicts(database):
+    version = _version(database, 1)
+    catalog.update_field(database, 1, "quantity", 29, version)  # Another user, first
+    with pytest.raises(ConflictError) as raised:
+        catalog.update_item(database, 1, "shirt", 260.0, 30, version)
+    assert raised.value.current[3] == 29
+    assert query(database, "SELECT price, quantity FROM items WHERE id = 1") == [(250.0, 29)]
+
+
+def test_field_update_of_a_deleted_item_conflicts(database):
+    version = _version(database, 2)
+    catalog.delete_item(database, 2)
+    with pytest.raises(ConflictError) as raised:
+        catalog.update_field(database, 2, "price", "99", version)
+    assert raised.value.current is None
+
+
+def test_update_without_a_version_always_writes(database):
+    catalog.update_field(database, 3, "quantity", 90)
+    catalog.update_field(database, 3, "price", "16")
+    assert query(database, "SELECT price, quantity FROM items WHERE id = 3") == [(16.0, 90)]
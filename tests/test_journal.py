@@ -0,0 +1,94 @@
+import datetime
+import json
+
+from conftest import quantities, query
+from store_core import archive, catalog
+from store_core.journal import SalesJournal
+
+
+def _record(journal, database, cart, timestamp=None):
+    products = catalog.load_products(database)
+    total = sum(products[product_id]["price"] * quantity for product_id, quantity in cart.items())
+    return journal.record(cart, products, total, timestamp)
+
+
+def _sales(database):
+    return query(database, "SELECT journal_key FROM sales WHERE journal_key IS NOT NULL ORDER BY id")
+
+
+def _entry(key, cart, timestamp="2026-01-02 10:00:00"):
+    return {"key": key, "timestamp": timestamp, "items": "", "total": 0.0, "cart": cart}
+
+
+def test_flush_stores_sales_and_empties_the_journal(database):
+    journal = SalesJournal(database, flush_interval=3600)
+    keys = [_record(journal, database, {1: 2}), _record(journal, database, {1: 1, 3: 5})]
+    journal.flush()
+    path = journal.path
+    journal.close()
+    assert [key for key, in _sales(database)] == keys
+    assert quantities(database) == {1: 27, 2: 20, 3: 95}
+    with open(path, "rb") as file:
+        assert file.read() == b""
+
+
+def test_replaying_a_flushed_journal_stores_nothing_twice(database):
+    journal = SalesJournal(database, flush_interval=3600)
+    _record(journal, database, {2: 3})
+    with open(journal.path, "rb") as file:
+        lines = file.read()
+    journal.flush()
+    path = journal.path
+    journal.close()
+    # A crash after the flush committed but before the journal was emptied
+    with open(path, "wb") as file:
+        file.write(lines)
+    SalesJournal(database, flush_interval=3600).close()
+    assert len(_sales(database)) == 1
+    assert quantities(database)[2] == 17
+
+
+def test_torn_last_line_is_dropped(database):
+    with open(f"{database}.till-1.journal", "wb") as file:
+        file.write(json.dumps(_entry("whole", {"1": 1})).encode() + b"\n")
+        file.write(b'{"key": "torn", "timest')  # A crash in the middle of a write
+    SalesJournal(database, flush_interval=3600).close()
+    assert [key for key, in _sales(database)] == ["whole"]
+    assert quantities(database)[1] == 29
+    with open(f"{database}.till-1.journal", "rb") as file:
+        assert file.read() == b""
+
+
+def test_orphaned_journal_of_another_till_is_replayed(database):
+    with open(f"{database}.till-7.journal", "wb") as file:
+        file.write(json.dumps(_entry("orphan", {"3": 4})).encode() + b"\n")
+    SalesJournal(database, flush_interval=3600).close()
+    assert [key for key, in _sales(database)] == ["orphan"]
+    assert quantities(database)[3] == 96
+    with open(f"{database}.till-7.journal", "rb") as file:
+        assert file.read() == b""
+
+
+def test_unreadable_lines_are_set_aside(database):
+    with open(f"{database}.till-1.journal", "wb") as file:
+        file.write(b"{not json\n" + json.dumps(_entry("good", {"1": 1})).encode() + b"\n" + b'["no", "fields"]\n')
+    SalesJournal(database, flush_interval=3600).close()
+    assert [key for key, in _sales(database)] == ["good"]
+    with open(f"{database}.till-1.journal.bad", "rb") as file:
+        assert file.read() == b'{not json\n["no", "fields"]\n'
+
+
+def test_replay_skips_sales_already_archived(database):
+    journal = SalesJournal(database, flush_interval=3600)
+    _record(journal, database, {1: 2}, datetime.datetime(2023, 6, 1, 12, 0))
+    with open(journal.path, "rb") as file:
+        lines = file.read()
+    journal.flush()
+    path = journal.path
+    journal.close()
+    assert archive.archive_closed_years(database, datetime.date(2026, 1, 1)) == {2023: 1}
+    with open(path, "wb") as file:
+        file.write(lines)
+    SalesJournal(database, flush_interval=3600).close()
+    assert _sales(database) == []
+    assert quantities(database)[1] == 28
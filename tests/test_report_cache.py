@@ -0,0 +1,61 @@
+import datetime
+
+from conftest import query
+from store_core import report_cache
+from store_core.checkout import record_sale
+from store_core.db import connect
+from store_core.report_cache import ReportCache
+
+
+def _sell(database, cart, day):
+    products = {row[0]: {"name": row[1], "price": row[2], "quantity": row[3]} for row in query(database, "SELECT * FROM items")}
+    total = sum(products[product_id]["price"] * quantity for product_id, quantity in cart.items())
+    record_sale(database, cart, products, total, datetime.datetime(2026, 3, day, 12, 0))
+
+
+def _fresh(database, report, *period):
+    """The report computed from scratch, by a cache that has seen nothing."""
+    return ReportCache(database).get(report, *period)
+
+
+def test_repeat_is_a_hit(database):
+    _sell(database, {1: 1}, 1)
+    cache = ReportCache(database)
+    first = cache.get("summary", "2026", "3")
+    assert cache.get("summary", "2026", "3") == first
+    assert cache.stats == {"hits": 1, "updates": 0, "misses": 1}
+
+
+def test_appended_sales_are_merged(database):
+    _sell(database, {1: 1, 2: 2}, 1)
+    cache = ReportCache(database)
+    for report in report_cache.REPORTS:
+        cache.get(report, "2026", "3")
+    _sell(database, {2: 1, 3: 4}, 2)
+    _sell(database, {1: 3}, 2)
+    for report in report_cache.REPORTS:
+        assert cache.get(report, "2026", "3") == _fresh(database, report, "2026", "3")
+    assert cache.stats["updates"] == len(report_cache.REPORTS)
+
+
+def test_deleted_sales_are_computed_again(database):
+    _sell(database, {1: 1}, 1)
+    _sell(database, {2: 1}, 2)
+    cache = ReportCache(database)
+    cache.get("summary", "2026", "3")
+    conn = connect(database)
+    conn.execute("DELETE FROM sales WHERE id = (SELECT min(id) FROM sales)")
+    conn.commit()
+    conn.close()
+    assert cache.get("summary", "2026", "3") == _fresh(database, "summary", "2026", "3")
+    assert cache.stats["misses"] == 2
+
+
+def test_sales_count_follows_inserts_and_deletes(database):
+    for day in (1, 2, 3):
+        _sell(database, {3: 1}, day)
+    conn = connect(database)
+    conn.execute("DELETE FROM sales WHERE id = 2")
+    conn.commit()
+    conn.close()
+    assert query(database, "SELECT row_count FROM sales_count") == query(database, "SELECT count(*) FROM sales")
@@ -0,0 +1,44 @@
+import datetime
+
+from conftest import query
+from store_core import catalog, stock
+from store_core.checkout import record_sale
+from store_core.db import TIMESTAMP_FORMAT
+
+
+def _sell(database, cart, when):
+    products = catalog.load_products(database)
+    total = sum(products[product_id]["price"] * quantity for product_id, quantity in cart.items())
+    record_sale(database, cart, products, total, when)
+
+
+def _replayed(database, when):
+    """The stock on ``when``: today's quantity minus every later move."""
+    stamp = when.strftime(TIMESTAMP_FORMAT)
+    later = dict(
+        query(database, "SELECT item_id, sum(change) FROM stock_moves WHERE timestamp > ? GROUP BY item_id", (stamp,))
+    )
+    return {item_id: quantity - later.get(item_id, 0) for item_id, quantity in query(database, "SELECT id, quantity FROM items")}
+
+
+def test_stock_on_matches_a_replay_of_every_move(database):
+    now = datetime.datetime.now().replace(microsecond=0)
+    days = [now - datetime.timedelta(days=offset) for offset in (5, 4, 3, 2, 1)]
+    _sell(database, {1: 2, 3: 10}, days[0])
+    stock.checkpoint_stock(database)
+    _sell(database, {2: 1}, days[1])
+    catalog.update_field(database, 2, "quantity", 40)  # A restock
+    stock.checkpoint_stock(database)
+    _sell(database, {1: 1, 2: 5}, days[3])
+    for when in [*days, now, now - datetime.timedelta(days=30)]:
+        assert stock.stock_on(database, when) == _replayed(database, when), when
+
+
+def test_stock_before_the_first_checkpoint_is_worked_back(database):
+    when = datetime.datetime.now() + datetime.timedelta(seconds=-1)
+    catalog.add_item(database, "hat", "30", "8")  # No checkpoint yet
+    item_id = query(database, "SELECT id FROM items WHERE name = 'hat'")[0][0]
+    stock.checkpoint_stock(database)
+    _sell(database, {item_id: 3}, datetime.datetime.now())
+    assert stock.stock_on(database, when)[item_id] == 0
+    assert stock.stock_on(database, datetime.datetime.now() + datetime.timedelta(seconds=5))[item_id] == 5